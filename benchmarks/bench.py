@@ -0,0 +1,316 @@
+"""
+DotKeeper 基准测试。
+
+在临时目录中生成合成的 dotfiles 仓库和目标主目录（N 个包 × M 个文件，可配置目录深度以及
+LINKED / MISSING / ORPHAN / CONFLICT 的比例），分别计时扫描、同步规划、执行计划、备份 .config、
+Diff 和 Web 接口，并以 JSON 输出耗时、吞吐量和峰值内存，便于在不同提交之间比较。
+
+用法:
+    python benchmarks/bench.py --packages 20 --files 200 --depth 3 --repeat 3 --output bench.json
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import urllib.parse
+import urllib.request
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from core.config import AppConfig
+from core.executor import Executor, OperationPlan
+from core.service import DotfilesService
+from core.utils.diff import DiffViewer
+
+STATES = ("linked", "missing", "orphan", "conflict")
+DEFAULT_MIX = "linked=0.4,missing=0.3,orphan=0.1,conflict=0.2"
+
+def parse_mix(text: str) -> Dict[str, float]:
+    """解析 'linked=0.4,missing=0.3,...'，返回归一化后的比例。"""
+    mix = {state: 0.0 for state in STATES}
+    for part in text.split(","):
+        if not part.strip():
+            continue
+        state, _, weight = part.partition("=")
+        state = state.strip().lower()
+        if state not in mix:
+            raise ValueError(f"Unknown state in mix / 未知的状态: {state}")
+        mix[state] = float(weight)
+    total = sum(mix.values())
+    if total <= 0:
+        raise ValueError("State mix must not be empty / 状态比例不能全为 0")
+    return {state: weight / total for state, weight in mix.items()}
+
+def generate_tree(root: Path, packages: int, files: int, depth: int, mix: Dict[str, float],
+                  seed: int = 0, config_files: int = 500) -> Dict[str, int]:
+    """
+    在 root 下生成 dots/（dotfiles 仓库）和 home/（目标根目录），返回各状态的文件数。
+    每个包的文件分布在最多 depth 层的子目录中；home/.config 中另外生成 config_files 个文件供备份测试使用。
+    """
+    rng = random.Random(seed)
+    dots = root / "dots"
+    home = root / "home"
+    dots.mkdir(parents=True)
+    home.mkdir(parents=True)
+    states = list(mix)
+    weights = [mix[s] for s in states]
+    counts = {state: 0 for state in STATES}
+
+    for p in range(packages):
+        package = dots / f"pkg{p:04d}"
+        for f in range(files):
+            level = rng.randint(0, depth)
+            parts = [f".p{p:04d}"] + [f"d{rng.randint(0, 3)}" for _ in range(level)] + [f"f{f:05d}.conf"]
+            rel = Path(*parts)
+            source = package / rel
+            source.parent.mkdir(parents=True, exist_ok=True)
+            source.write_text(f"# {rel}\n" + "key = value\n" * rng.randint(1, 20))
+
+            state = rng.choices(states, weights)[0]
+            counts[state] += 1
+            target = home / rel
+            if state == "missing":
+                continue
+            target.parent.mkdir(parents=True, exist_ok=True)
+            if state == "linked":
+                os.symlink(os.path.relpath(source, target.parent), target)
+            elif state == "orphan":
+                os.symlink(os.path.relpath(package / "gone" / rel, target.parent), target)
+            else:
+                target.write_text(f"# local copy of {rel}\n")
+
+    config = home / ".config"
+    for i in range(config_files):
+        path = config / f"app{i % 25:02d}" / f"file{i:05d}.ini"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(f"[section]\nvalue = {i}\n" * rng.randint(1, 50))
+    return counts
+
+class Bench:
+    """收集各项基准的结果。"""
+    def __init__(self, repeat: int, only: Optional[List[str]] = None):
+        """初始化；only 非空时只运行名称在其中的基准。"""
+        self.repeat = repeat
+        self.only = set(only or [])
+        self.results: Dict[str, dict] = {}
+
+    def run(self, name: str, fn: Callable[[], object], items: int, setup: Callable[[], object] = None) -> None:
+        """
+        运行 fn repeat 次并记录最短/中位耗时；再在 tracemalloc 下运行一次记录峰值内存。
+        setup 在每次运行前调用（不计入耗时），用于恢复被修改的目录树。
+        """
+        if self.only and name not in self.only:
+            return
+        timings = []
+        for _ in range(self.repeat):
+            if setup:
+                setup()
+            start = time.perf_counter()
+            fn()
+            timings.append(time.perf_counter() - start)
+
+        if setup:
+            setup()
+        tracemalloc.start()
+        try:
+            fn()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        timings.sort()
+        best = timings[0]
+        self.results[name] = {
+            "items": items,
+            "best_seconds": round(best, 6),
+            "median_seconds": round(timings[len(timings) // 2], 6),
+            "items_per_second": round(items / best, 1) if best > 0 else None,
+            "peak_traced_bytes": peak,
+        }
+        print(f"{name:<28} {best * 1000:10.2f} ms  {self.results[name]['items_per_second'] or 0:>12} items/s",
+              file=sys.stderr)
+
+def fetch(url: str) -> bytes:
+    """GET 请求并读取完整响应体。"""
+    request = urllib.request.Request(url, headers={"Accept-Encoding": "gzip"})
+    with urllib.request.urlopen(request) as response:
+        return response.read()
+
+def git_commit() -> Optional[str]:
+    """当前提交（不在 git 仓库中时为 None）。"""
+    try:
+        out = subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True, timeout=5)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return out.stdout.strip() or None
+
+def run_benchmarks(args) -> dict:
+    """生成合成目录树，运行所有基准并返回结果。"""
+    mix = parse_mix(args.mix)
+    base = Path(tempfile.mkdtemp(prefix="dotkeeper-bench-"))
+    try:
+        pristine = base / "pristine"
+        counts = generate_tree(pristine, args.packages, args.files, args.depth, mix, args.seed, args.config_files)
+        work = base / "work"
+        total_files = args.packages * args.files
+
+        def reset() -> None:
+            """用原始目录树覆盖工作目录（保留符号链接）。"""
+            if work.exists():
+                shutil.rmtree(work)
+            shutil.copytree(pristine, work, symlinks=True)
+
+        reset()
+
+        def make_service(use_index: bool = False) -> DotfilesService:
+            config = AppConfig(dotfiles_dir=str(work / "dots"), target_root=str(work / "home"),
+                               scan_workers=args.scan_workers, apply_workers=args.apply_workers,
+                               use_index=use_index, cache_dir=str(base / "cache"), use_journal=False)
+            return DotfilesService(config)
+
+        bench = Bench(args.repeat, args.only)
+        service = make_service()
+        bench.run("scan_packages", service.scan_packages, total_files)
+
+        indexed = make_service(use_index=True)
+        indexed.scan_packages()
+        bench.run("scan_packages_indexed", indexed.scan_packages, total_files)
+
+        packages = service.scan_packages()
+
+        def plan_all() -> OperationPlan:
+            plan = OperationPlan()
+            for pkg in packages:
+                for op in service.deploy(pkg):
+                    plan.add(op)
+            return plan
+
+        bench.run("sync_plan", plan_all, total_files)
+        plan_ops = len(plan_all().operations)
+
+        # 执行前需要恢复目录树并重新规划（计划依赖当前状态）
+        state = {}
+
+        def prepare_apply() -> None:
+            reset()
+            fresh = make_service()
+            state["plan"] = OperationPlan([op for pkg in fresh.scan_packages() for op in fresh.deploy(pkg)])
+
+        bench.run("executor_run", lambda: Executor.run(state["plan"], dry_run=False,
+                                                        workers=args.apply_workers), plan_ops,
+                  setup=prepare_apply)
+
+        reset()
+        service = make_service()
+        backup_root = work / "home" / ".dotfiles_backup"
+
+        def reset_backups() -> None:
+            if backup_root.exists():
+                shutil.rmtree(backup_root)
+
+        def backup(mode: str) -> None:
+            plan, _ = service.backup_config_dir(mode=mode)
+            service.execute(plan, dry_run=False)
+
+        bench.run("backup_config_copy", lambda: backup("copy"), args.config_files, setup=reset_backups)
+        bench.run("backup_config_archive", lambda: backup("archive"), args.config_files, setup=reset_backups)
+        reset_backups()
+        backup("incremental")
+        # 同一秒内的快照名称相同，增量快照在单独的目录中计时
+        bench.run("backup_config_incremental", lambda: backup("incremental"), args.config_files,
+                  setup=lambda: time.sleep(1.05))
+
+        diff_dir = base / "diff"
+        diff_dir.mkdir()
+        left, right = diff_dir / "left.conf", diff_dir / "right.conf"
+        lines = [f"option_{i} = {i}\n" for i in range(args.diff_lines)]
+        left.write_text("".join(lines))
+        for i in range(0, len(lines), 50):
+            lines[i] = f"option_{i} = changed\n"
+        right.write_text("".join(lines))
+        bench.run("get_diff", lambda: DiffViewer.get_diff(left, right, max_bytes=0, max_lines=0), args.diff_lines)
+
+        bench_web(bench, make_service(), packages, left, right)
+
+        return {
+            "commit": git_commit(),
+            "python": sys.version.split()[0],
+            "params": {"packages": args.packages, "files": args.files, "depth": args.depth,
+                       "mix": mix, "states": counts, "repeat": args.repeat, "seed": args.seed,
+                       "scan_workers": args.scan_workers, "apply_workers": args.apply_workers,
+                       "config_files": args.config_files, "diff_lines": args.diff_lines},
+            "results": bench.results,
+            # 整个进程的常驻内存峰值（Linux 上单位为 KiB）
+            "max_rss_kib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        }
+    finally:
+        shutil.rmtree(base, ignore_errors=True)
+
+def bench_web(bench: Bench, service: DotfilesService, packages, left: Path, right: Path) -> None:
+    """在随机端口启动 Web 服务器（不监视文件系统）并计时各 API。"""
+    from gui.web_server import DotfilesHandler, ReusableThreadingHTTPServer
+    from core.cache import ScanCache
+
+    cache = ScanCache(service)
+    apply_lock = threading.Lock()
+
+    def handler_factory(*a, **kw):
+        return DotfilesHandler(*a, config=service.config, service=service, cache=cache,
+                               apply_lock=apply_lock, **kw)
+
+    httpd = ReusableThreadingHTTPServer(("127.0.0.1", 0), handler_factory)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    try:
+        url = f"http://127.0.0.1:{httpd.server_address[1]}"
+        total_files = sum(len(pkg.files) for pkg in packages)
+        name = packages[0].name if packages else ""
+        bench.run("web_scan_refresh", lambda: fetch(f"{url}/api/scan?refresh=1"), total_files)
+        bench.run("web_scan_cached", lambda: fetch(f"{url}/api/scan"), total_files)
+        bench.run("web_scan_compact", lambda: fetch(f"{url}/api/scan?compact=1"), total_files)
+        bench.run("web_packages", lambda: fetch(f"{url}/api/packages"), len(packages))
+        bench.run("web_package", lambda: fetch(f"{url}/api/packages/{name}"),
+                  len(packages[0].files) if packages else 0)
+        query = urllib.parse.urlencode({"source": str(left), "target": str(right)})
+        bench.run("web_diff", lambda: fetch(f"{url}/api/diff?{query}"), 1)
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+
+def main() -> None:
+    """命令行入口。"""
+    parser = argparse.ArgumentParser(description="DotKeeper 基准测试")
+    parser.add_argument("--packages", type=int, default=20, help="包数量")
+    parser.add_argument("--files", type=int, default=200, help="每个包的文件数")
+    parser.add_argument("--depth", type=int, default=3, help="包内最大目录深度")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"状态比例 (默认: {DEFAULT_MIX})")
+    parser.add_argument("--config-files", type=int, default=500, help="用于备份测试的 .config 文件数")
+    parser.add_argument("--diff-lines", type=int, default=20000, help="Diff 测试文件的行数")
+    parser.add_argument("--repeat", type=int, default=3, help="每项基准的重复次数")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    parser.add_argument("--scan-workers", type=int, default=1, help="扫描线程数")
+    parser.add_argument("--apply-workers", type=int, default=1, help="执行线程数")
+    parser.add_argument("--only", nargs="*", help="只运行指定名称的基准")
+    parser.add_argument("--output", default=None, help="结果 JSON 输出路径 (默认: 标准输出)")
+    args = parser.parse_args()
+
+    result = run_benchmarks(args)
+    text = json.dumps(result, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + "\n")
+    else:
+        print(text)
+
+if __name__ == "__main__":
+    main()
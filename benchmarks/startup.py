@@ -0,0 +1,124 @@
+"""
+DotKeeper 启动时间基准（基于 python -X importtime）。
+
+在临时目录中生成一个小型 dotfiles 仓库，多次运行 `dotkeeper.py scan`，记录进程总耗时与导入耗时，
+并检查 scan 没有加载按需导入的子系统（diff、git 同步、Web、备份归档等）。
+任一项超出预算时以非零状态退出，可用于回归检查。
+
+用法:
+    python benchmarks/startup.py --repeat 5 --budget-ms 80 --output startup.json
+"""
+import argparse
+import json
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# scan 不应加载的模块（均由对应子系统在首次使用时导入）
+LAZY_MODULES = (
+    "core.utils.diff", "difflib",          # Diff
+    "subprocess",                          # git 同步
+    "gui.web_server", "http.server", "webbrowser", "gzip",   # Web
+    "core.operations", "core.backup", "core.journal", "tarfile",   # 计划执行与备份
+    "concurrent.futures",                  # 并发扫描 / 执行
+)
+
+def make_repo(root: Path, packages: int = 3, files: int = 5) -> Tuple[Path, Path]:
+    """生成 packages 个包、每包 files 个文件的小型仓库，返回 (dotfiles 目录, 目标根目录)。"""
+    dots, home = root / "dots", root / "home"
+    for p in range(packages):
+        for f in range(files):
+            path = dots / f"pkg{p}" / f".pkg{p}" / f"file{f}"
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(f"{p}:{f}\n")
+    home.mkdir(parents=True)
+    return dots, home
+
+def parse_importtime(stderr: str) -> Tuple[int, Dict[str, int]]:
+    """解析 -X importtime 输出，返回 (顶层导入的累计微秒数, {模块名: 累计微秒})。"""
+    total = 0
+    modules = {}
+    for line in stderr.splitlines():
+        parts = line[len("import time:"):].split("|") if line.startswith("import time:") else []
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            continue
+        cumulative = int(parts[1])
+        name = parts[2].rstrip()
+        modules[name.strip()] = cumulative
+        # 名称前的缩进表示嵌套层级，只累加顶层导入
+        if not name.startswith("  "):
+            total += cumulative
+    return total, modules
+
+def run_once(args: List[str]) -> Tuple[float, int, Dict[str, int]]:
+    """运行一次命令，返回 (墙钟秒数, 导入微秒数, {模块: 累计微秒})。"""
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-X", "importtime", *args], cwd=ROOT, capture_output=True,
+                          text=True)
+    elapsed = time.perf_counter() - start
+    if proc.returncode != 0:
+        raise RuntimeError(f"Command failed / 命令失败: {' '.join(args)}\n{proc.stderr[-2000:]}")
+    total, modules = parse_importtime(proc.stderr)
+    return elapsed, total, modules
+
+def main() -> None:
+    """命令行入口。"""
+    parser = argparse.ArgumentParser(description="DotKeeper 启动时间基准")
+    parser.add_argument("--repeat", type=int, default=5, help="运行次数 (取最小值)")
+    parser.add_argument("--budget-ms", type=float, default=80.0,
+                        help="scan 的导入耗时预算，扣除解释器自身启动的导入 (毫秒)")
+    parser.add_argument("--top", type=int, default=10, help="报告中列出的最慢的 DotKeeper 模块数")
+    parser.add_argument("--output", default=None, help="结果 JSON 输出路径 (默认: 标准输出)")
+    args = parser.parse_args()
+
+    base = Path(tempfile.mkdtemp(prefix="dotkeeper-startup-"))
+    try:
+        dots, home = make_repo(base)
+        command = ["dotkeeper.py", "--dotfiles", str(dots), "--target", str(home), "--no-index", "scan"]
+        # 先运行一次生成字节码缓存
+        run_once(command)
+        baseline = min((run_once(["-c", "pass"]) for _ in range(args.repeat)), key=lambda r: r[1])
+        runs = [run_once(command) for _ in range(args.repeat)]
+    finally:
+        shutil.rmtree(base, ignore_errors=True)
+
+    wall, imports, modules = min(runs, key=lambda r: r[1])
+    own_ms = (imports - baseline[1]) / 1000
+    loaded_lazy = sorted(name for name in LAZY_MODULES if name in modules)
+    slowest = sorted(((name, us) for name, us in modules.items() if name.split(".")[0] in ("core", "gui")),
+                     key=lambda item: -item[1])[:args.top]
+
+    result = {
+        "python": sys.version.split()[0],
+        "command": "scan",
+        "wall_ms": round(min(r[0] for r in runs) * 1000, 2),
+        "interpreter_wall_ms": round(baseline[0] * 1000, 2),
+        "import_ms": round(imports / 1000, 2),
+        "interpreter_import_ms": round(baseline[1] / 1000, 2),
+        "dotkeeper_import_ms": round(own_ms, 2),
+        "budget_ms": args.budget_ms,
+        "modules": {name: round(us / 1000, 2) for name, us in slowest},
+        "eagerly_loaded": loaded_lazy,
+        "ok": own_ms <= args.budget_ms and not loaded_lazy,
+    }
+    text = json.dumps(result, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + "\n")
+    else:
+        print(text)
+
+    if loaded_lazy:
+        print(f"scan imported lazy subsystems / scan 加载了应按需导入的模块: {', '.join(loaded_lazy)}", file=sys.stderr)
+    if own_ms > args.budget_ms:
+        print(f"Import time {own_ms:.1f} ms exceeds budget {args.budget_ms} ms / 导入耗时超出预算", file=sys.stderr)
+    if not result["ok"]:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
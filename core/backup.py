@@ -0,0 +1,390 @@
+import hashlib
+import json
+import os
+import shutil
+import stat
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+MANIFEST_SUFFIX = ".manifest.json"
+MANIFEST_VERSION = 1
+
+# 相对路径 -> (大小, mtime_ns, inode)，均取自被备份的源文件
+Manifest = Dict[str, Tuple[int, int, int]]
+
+def manifest_path(snapshot: Path) -> Path:
+    """快照对应的清单文件（与快照目录并列，不混入备份内容）。"""
+    return snapshot.with_name(snapshot.name + MANIFEST_SUFFIX)
+
+def file_signature(st: os.stat_result) -> Tuple[int, int, int]:
+    """判断文件未变化所用的签名。"""
+    return st.st_size, st.st_mtime_ns, st.st_ino
+
+def read_manifest(snapshot: Path) -> Optional[Manifest]:
+    """读取快照清单；不存在或无法解析时返回 None。"""
+    try:
+        with open(manifest_path(snapshot), "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if data.get("version") != MANIFEST_VERSION:
+        return None
+    return {rel: tuple(sig) for rel, sig in data.get("files", {}).items()}
+
+def write_manifest(snapshot: Path, files: Manifest) -> None:
+    """原子地写入快照清单；清单存在即表示快照已完整。"""
+    path = manifest_path(snapshot)
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"version": MANIFEST_VERSION, "files": files}, f, separators=(",", ":"))
+    os.replace(tmp, path)
+
+def latest_snapshot(backup_root: Path, prefix: str) -> Optional[Path]:
+    """返回 backup_root 下最近一个带有清单（即已完整完成）的快照目录。"""
+    try:
+        names = os.listdir(backup_root)
+    except OSError:
+        return None
+    candidates: List[str] = sorted(
+        (name for name in names if name.startswith(prefix) and not name.endswith(MANIFEST_SUFFIX)
+         and name + MANIFEST_SUFFIX in names),
+        reverse=True)
+    for name in candidates:
+        if (backup_root / name).is_dir():
+            return backup_root / name
+    return None
+
+# Linux FICLONE ioctl (reflink)，在 btrfs/xfs 等文件系统上共享数据块而不复制
+FICLONE = 0x40049409
+HASH_CHUNK = 1024 * 1024
+
+def hash_file(path: Path) -> str:
+    """以 BLAKE2b 分块计算文件内容的哈希。"""
+    h = hashlib.blake2b(digest_size=20)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def _clone_file(src: Path, dst: Path) -> None:
+    """优先用 reflink 复制文件，不支持时退回普通复制。"""
+    try:
+        import fcntl
+        with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+        return
+    except (ImportError, OSError):
+        pass
+    shutil.copyfile(src, dst)
+
+def read_history(backup_path: Path) -> List[dict]:
+    """读取备份清单中的历史条目（旧的在前）。"""
+    try:
+        with open(manifest_path(backup_path), "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return []
+    if data.get("version") != MANIFEST_VERSION:
+        return []
+    return data.get("entries", [])
+
+def write_history(backup_path: Path, entries: List[dict]) -> None:
+    """原子地写入备份清单；没有条目时删除清单。"""
+    path = manifest_path(backup_path)
+    if not entries:
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            pass
+        return
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"version": MANIFEST_VERSION, "entries": entries}, f, separators=(",", ":"))
+    os.replace(tmp, path)
+
+def same_entry(a: dict, b: dict) -> bool:
+    """两个清单条目是否描述相同的内容（忽略备份时间）。"""
+    return {k: v for k, v in a.items() if k != "time"} == {k: v for k, v in b.items() if k != "time"}
+
+class BackupStore:
+    """
+    内容寻址的备份对象库。
+    文件内容按 BLAKE2b 哈希存放在 <root>/<前两位>/<其余部分>，相同内容只存一份；
+    refs.json 记录每个对象被清单引用的次数，最后一个引用被恢复时直接把对象 rename 出库。
+    """
+    _instances: Dict[str, "BackupStore"] = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self, root: Path):
+        """初始化对象库（使用 at() 获取共享实例）。"""
+        self.root = root
+        self._lock = threading.RLock()
+        self._refs: Optional[Dict[str, int]] = None
+
+    @classmethod
+    def at(cls, root: Path) -> "BackupStore":
+        """返回 root 对应的共享实例，保证并发执行的操作使用同一份引用计数。"""
+        key = os.fspath(root)
+        with cls._instances_lock:
+            store = cls._instances.get(key)
+            if store is None:
+                store = cls._instances[key] = cls(root)
+            return store
+
+    def object_path(self, digest: str) -> Path:
+        """对象在库中的路径。"""
+        return self.root / digest[:2] / digest[2:]
+
+    def store(self, path: Path) -> dict:
+        """把文件、软链接或目录移入对象库（path 随之被移除），返回描述其内容的清单条目。"""
+        with self._lock:
+            # 每次重新读取引用计数，以免与其他进程的修改冲突
+            self._refs = None
+            try:
+                return self._store(path)
+            finally:
+                self._save_refs()
+
+    def restore(self, entry: dict, dst: Path) -> None:
+        """按清单条目在 dst 处重建内容，并释放对对象的引用。"""
+        with self._lock:
+            self._refs = None
+            try:
+                self._restore(entry, dst)
+            finally:
+                self._save_refs()
+
+    def matches(self, entry: dict, path: Path) -> bool:
+        """path 处的内容是否已与清单条目一致（用于中断后重复执行时跳过）。"""
+        kind = entry["type"]
+        if kind == "link":
+            return path.is_symlink() and os.readlink(path) == entry["link"]
+        if kind == "file":
+            return path.is_file() and not path.is_symlink() and hash_file(path) == entry["hash"]
+        if not path.is_dir() or path.is_symlink():
+            return False
+        return all(self.matches(child, path / name) for name, child in entry["files"].items())
+
+    def _store(self, path: Path) -> dict:
+        st = os.lstat(path)
+        if stat.S_ISLNK(st.st_mode):
+            entry = {"type": "link", "link": os.readlink(path)}
+            os.unlink(path)
+        elif stat.S_ISDIR(st.st_mode):
+            files = {}
+            for name in sorted(os.listdir(path)):
+                files[name] = self._store(path / name)
+            entry = {"type": "dir", "mode": stat.S_IMODE(st.st_mode), "files": files}
+            os.rmdir(path)
+        else:
+            digest = hash_file(path)
+            obj = self.object_path(digest)
+            if obj.exists():
+                # 内容已在库中，只增加引用
+                os.unlink(path)
+            else:
+                obj.parent.mkdir(parents=True, exist_ok=True)
+                shutil.move(path, obj)
+            refs = self._load_refs()
+            refs[digest] = refs.get(digest, 0) + 1
+            entry = {"type": "file", "hash": digest, "mode": stat.S_IMODE(st.st_mode), "mtime_ns": st.st_mtime_ns}
+        return entry
+
+    def _restore(self, entry: dict, dst: Path) -> None:
+        kind = entry["type"]
+        if kind == "link":
+            os.symlink(entry["link"], dst)
+        elif kind == "dir":
+            dst.mkdir(exist_ok=True)
+            for name, child in entry["files"].items():
+                self._restore(child, dst / name)
+            os.chmod(dst, entry["mode"])
+        else:
+            digest = entry["hash"]
+            obj = self.object_path(digest)
+            refs = self._load_refs()
+            count = refs.get(digest, 0)
+            if count <= 1:
+                # 最后一个引用：直接移出对象库
+                refs.pop(digest, None)
+                shutil.move(obj, dst)
+            else:
+                refs[digest] = count - 1
+                _clone_file(obj, dst)
+            os.chmod(dst, entry["mode"])
+            os.utime(dst, ns=(entry["mtime_ns"], entry["mtime_ns"]))
+
+    def _refs_path(self) -> Path:
+        return self.root / "refs.json"
+
+    def _load_refs(self) -> Dict[str, int]:
+        if self._refs is None:
+            try:
+                with open(self._refs_path(), "r", encoding="utf-8") as f:
+                    self._refs = json.load(f)
+            except (OSError, ValueError):
+                self._refs = {}
+        return self._refs
+
+    def _save_refs(self) -> None:
+        if self._refs is None:
+            return
+        self.root.mkdir(parents=True, exist_ok=True)
+        path = self._refs_path()
+        tmp = path.with_name(path.name + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self._refs, f, separators=(",", ":"))
+        os.replace(tmp, path)
+
+ARCHIVE_COMPRESSIONS = ("gz", "xz", "bz2")
+ARCHIVE_INDEX_SUFFIX = ".index.json"
+_SIZE_UNITS = {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+
+def parse_size(text) -> Optional[int]:
+    """解析 '500M'、'2G'、'1048576' 这样的大小；空值返回 None。"""
+    if text is None or text == "":
+        return None
+    if isinstance(text, int):
+        return text
+    value = str(text).strip().upper().rstrip("B")
+    unit = value[-1:] if value[-1:] in _SIZE_UNITS else ""
+    return int(float(value[:len(value) - len(unit)]) * _SIZE_UNITS[unit])
+
+def archive_index_path(base: Path) -> Path:
+    """归档的清单文件；清单存在即表示归档已完整写入。"""
+    return base.with_name(base.name + ARCHIVE_INDEX_SUFFIX)
+
+def read_archive_index(base: Path) -> dict:
+    """读取归档清单。"""
+    with open(archive_index_path(base), "r", encoding="utf-8") as f:
+        index = json.load(f)
+    if index.get("version") != MANIFEST_VERSION:
+        raise ValueError(f"Unsupported archive index / 不支持的归档清单: {archive_index_path(base)}")
+    return index
+
+class ArchiveWriter:
+    """
+    把目录树流式写入压缩 tar 归档（不生成中间副本，内存占用与文件大小无关）。
+    超过 max_bytes（未压缩字节数）或 max_files 时切换到下一个分卷；
+    清单记录每个条目所在的分卷，单文件恢复时只需解压一个分卷。
+    """
+    def __init__(self, base: Path, compression: str = "gz", max_bytes: Optional[int] = None,
+                 max_files: Optional[int] = None):
+        """初始化写入器，base 为不含扩展名的归档路径。"""
+        if compression not in ARCHIVE_COMPRESSIONS:
+            raise ValueError(f"Unknown compression / 未知的压缩方式: {compression}")
+        self.base = base
+        self.compression = compression
+        self.max_bytes = max_bytes
+        self.max_files = max_files
+        self.chunks: List[str] = []
+        self.files: Dict[str, list] = {}
+        self._tar = None
+        self._bytes = 0
+        self._count = 0
+
+    def chunk_name(self, number: int) -> str:
+        """分卷文件名；不分卷时只有一个 <name>.tar.<压缩>。"""
+        if self.max_bytes is None and self.max_files is None:
+            return f"{self.base.name}.tar.{self.compression}"
+        return f"{self.base.name}.part{number:03d}.tar.{self.compression}"
+
+    def write_tree(self, src: Path) -> dict:
+        """写入整个目录树并生成清单，返回清单内容。"""
+        try:
+            self._add_dir(src, "")
+        finally:
+            if self._tar is not None:
+                self._tar.close()
+                self._tar = None
+        index = {"version": MANIFEST_VERSION, "compression": self.compression,
+                 "chunks": self.chunks, "files": self.files}
+        path = archive_index_path(self.base)
+        tmp = path.with_name(path.name + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(index, f, separators=(",", ":"))
+        os.replace(tmp, path)
+        return index
+
+    def _add_dir(self, src_dir: Path, rel_dir: str) -> None:
+        with os.scandir(src_dir) as it:
+            entries = sorted(it, key=lambda e: e.name)
+        for entry in entries:
+            rel = rel_dir + entry.name
+            is_dir = entry.is_dir(follow_symlinks=False)
+            self._add(Path(entry.path), rel)
+            if is_dir:
+                self._add_dir(Path(entry.path), rel + "/")
+
+    def _add(self, path: Path, rel: str) -> None:
+        tar = self._tar_for_next()
+        info = tar.gettarinfo(str(path), arcname=rel)
+        if info is None:
+            # 套接字等无法归档的条目
+            return
+        if info.islnk():
+            # gettarinfo 把同一 inode 的后续路径记为硬链接，而硬链接的目标可能在其他分卷中；
+            # 每个路径都作为普通文件写入内容，单独恢复时不依赖其他条目
+            import tarfile
+
+            info.type = tarfile.REGTYPE
+            info.linkname = ""
+            info.size = os.lstat(path).st_size
+        if info.isreg():
+            with open(path, "rb") as f:
+                tar.addfile(info, f)
+            kind = "f"
+        else:
+            tar.addfile(info)
+            kind = "d" if info.isdir() else "l" if info.issym() else "o"
+        self.files[rel] = [len(self.chunks) - 1, info.size, kind]
+        # 含 tar 头部的未压缩字节数
+        self._bytes = tar.offset
+        self._count += 1
+
+    def _tar_for_next(self):
+        """返回用于写入下一个条目的分卷，当前分卷已满时切换到新分卷。"""
+        full = self._tar is not None and (
+            (self.max_bytes is not None and self._bytes >= self.max_bytes)
+            or (self.max_files is not None and self._count >= self.max_files))
+        if self._tar is None or full:
+            if self._tar is not None:
+                self._tar.close()
+            # tarfile（及其压缩模块）只在归档时导入
+            import tarfile
+
+            name = self.chunk_name(len(self.chunks))
+            self.chunks.append(name)
+            self._tar = tarfile.open(os.fspath(self.base.with_name(name)), mode=f"w|{self.compression}")
+            self._bytes = self._count = 0
+        return self._tar
+
+def extract_archive_member(base: Path, member: str, dst: Path) -> None:
+    """从归档中只解压 member 所在的分卷并把该条目写到 dst（目录只创建目录本身）。"""
+    index = read_archive_index(base)
+    record = index["files"].get(member)
+    if record is None:
+        raise FileNotFoundError(f"{member} is not in archive / 归档中没有 {member}: {base}")
+    import tarfile
+
+    chunk = base.with_name(index["chunks"][record[0]])
+    with tarfile.open(os.fspath(chunk), mode=f"r|{index['compression']}") as tar:
+        for info in tar:
+            if info.name != member:
+                continue
+            if info.isdir():
+                dst.mkdir(parents=True, exist_ok=True)
+            elif info.issym():
+                os.symlink(info.linkname, dst)
+                return
+            elif info.isreg():
+                with tar.extractfile(info) as fsrc, open(dst, "wb") as fdst:
+                    shutil.copyfileobj(fsrc, fdst)
+            else:
+                raise ValueError(f"Unsupported archive member / 不支持的归档条目: {member}")
+            os.chmod(dst, info.mode)
+            os.utime(dst, (info.mtime, info.mtime))
+            return
+    raise FileNotFoundError(f"{member} is missing from {chunk} / {chunk} 中缺少 {member}")
@@ -0,0 +1,239 @@
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from .detector import StateDetector
+from .metrics import METRICS
+from .models import Dotfile, Package
+
+class ScanCache:
+    """
+    线程安全的包扫描缓存。
+    首次访问时全量扫描；之后只重新扫描被标记失效的包。
+    """
+    def __init__(self, service):
+        """初始化缓存。"""
+        self.service = service
+        self._lock = threading.RLock()
+        self._packages: Dict[str, Package] = {}
+        self._order: List[str] = []
+        self._dirty = set()
+        self._valid = False
+        # invalidate_paths 用的反向索引：目标目录 -> {包名: 包内相对目录}，
+        # 以及目标目录及其各级祖先 -> 包名集合；按包增量维护，None 表示需要重建
+        self._dir_owners: Optional[Dict[str, Dict[str, str]]] = None
+        self._subtree_owners: Dict[str, Set[str]] = {}
+        self._owned: Dict[str, Tuple[List[str], Set[str]]] = {}
+        # 每当缓存内容可能变化时递增；epoch 区分不同的缓存实例（例如服务重启前后）
+        self.generation = 0
+        self.epoch = f"{time.time_ns():x}"
+
+    def packages(self, refresh: bool = False) -> List[Package]:
+        """返回所有包（按扫描顺序）；refresh=True 时强制全量重新扫描。"""
+        with self._lock:
+            if METRICS.enabled:
+                METRICS.cache("scan_cache", not (refresh or not self._valid or self._dirty))
+            if refresh or not self._valid:
+                packages = self.service.scan_packages()
+                self._packages = {pkg.name: pkg for pkg in packages}
+                self._order = [pkg.name for pkg in packages]
+                self._dir_owners = None
+                self._dirty.clear()
+                self._valid = True
+                self.generation += 1
+            elif self._dirty:
+                for name in self._order:
+                    if name in self._dirty:
+                        self._refresh(name)
+                self._order = [name for name in self._order if name in self._packages]
+                self._dirty.clear()
+                self.generation += 1
+            return [self._packages[name] for name in self._order]
+
+    def snapshot(self, refresh: bool = False) -> Tuple[int, List[Package]]:
+        """原子地返回 (generation, 所有包)，用于生成与内容一致的 ETag。"""
+        with self._lock:
+            packages = self.packages(refresh=refresh)
+            return self.generation, packages
+
+    def package_snapshot(self, name: str) -> Tuple[Optional[int], Optional[Package]]:
+        """
+        原子地返回 (generation, 单个包)。
+        缓存尚未建立时结果不会被缓存，generation 为 None（不能用于 ETag）。
+        """
+        with self._lock:
+            valid = self._valid
+            package = self.get(name)
+            return (self.generation if valid else None), package
+
+    def get(self, name: str) -> Optional[Package]:
+        """返回单个包；缓存未建立或该包已失效时只扫描这一个包。"""
+        with self._lock:
+            if not self._valid:
+                return self.service.scan_package(name)
+            if name in self._dirty or name not in self._packages:
+                self._refresh(name)
+                self._dirty.discard(name)
+                self.generation += 1
+            return self._packages.get(name)
+
+    def rescan(self, names: Iterable[str]) -> Tuple[List[Package], List[str]]:
+        """
+        一次重新扫描多个包并更新缓存（用于规划前获取最新状态）。
+        返回 (按给定顺序排列的包, 未找到的包名)。
+        """
+        with self._lock:
+            packages, missing = self.service.scan_selected(list(names))
+            if self._valid:
+                for name in missing:
+                    self._packages.pop(name, None)
+                    self._index_owners(name, None)
+                for package in packages:
+                    if package.name not in self._packages and package.name not in self._order:
+                        self._order.append(package.name)
+                    self._packages[package.name] = package
+                    self._index_owners(package.name, package)
+                    self._dirty.discard(package.name)
+                self._order = [name for name in self._order if name in self._packages]
+                self.generation += 1
+            return packages, missing
+
+    def invalidate(self, names: Optional[Iterable[str]] = None) -> None:
+        """标记包失效；names 为 None 时整个缓存失效。"""
+        with self._lock:
+            if names is None:
+                self._valid = False
+                return
+            self._dirty.update(names)
+
+    def redetect(self, dirs: Iterable[Tuple[str, str]]) -> Set[str]:
+        """
+        就地重新检测 (包名, 包内相对目录) 中文件的状态，返回状态发生变化的包名。
+        用于目标侧的增量更新，无需重新遍历包目录；按名称在当前缓存的包中查找，
+        因此调用方不必持有可能已被重新扫描替换的 Package 或 Dotfile 视图。
+        """
+        wanted: Dict[str, Set[str]] = {}
+        for name, rel_dir in dirs:
+            wanted.setdefault(name, set()).add(rel_dir)
+        changed = set()
+        detector = StateDetector()
+        with self._lock:
+            for name, rel_dirs in wanted.items():
+                package = self._packages.get(name)
+                if package is None:
+                    continue
+                for dotfile in package.files_in_dirs(rel_dirs):
+                    state = detector.check(dotfile.source, dotfile.target)
+                    if state != dotfile.state:
+                        dotfile.state = state
+                        changed.add(name)
+            if changed:
+                self.generation += 1
+        return changed
+
+    def apply_sync(self, result) -> Tuple[List[str], List[Tuple[str, Dotfile]]]:
+        """
+        根据 git 同步的结果（SyncResult）增量更新缓存。
+        新增或删除了文件的包重新扫描；只修改了内容的文件就地重新检测。
+        返回 (被更新的包名, 指向已变化内容的已部署链接)。无法确定变更范围时整个缓存失效。
+        """
+        if result.full:
+            self.invalidate()
+            return [], []
+        changes = result.package_changes()
+        if not changes:
+            return [], []
+
+        with self._lock:
+            fresh = not self._valid
+            self.packages()
+            detector = StateDetector()
+            for name, entries in changes.items():
+                structural = name not in self._packages or any(status not in ("M", "T") for status, _ in entries)
+                if structural and not fresh:
+                    self._refresh(name)
+                    continue
+                package = self._packages.get(name)
+                if package is None:
+                    continue
+                modified = {rel for _, rel in entries}
+                for dotfile in package.files:
+                    if dotfile.rel_path in modified:
+                        dotfile.state = detector.check(dotfile.source, dotfile.target)
+            self._order = [name for name in self._order if name in self._packages]
+            self.generation += 1
+            packages = [self._packages[name] for name in self._order if name in changes]
+        return sorted(changes), self.service.changed_links(result, packages)
+
+    def invalidate_paths(self, paths: Iterable[Path]) -> None:
+        """
+        标记目标路径（或其祖先目录）被修改过的包失效。
+        按目标目录的反向索引查找，每个路径的开销与缓存中的文件总数无关。
+        """
+        touched = {os.fspath(p) for p in paths}
+        if not touched:
+            return
+        with self._lock:
+            if self._dir_owners is None:
+                self._dir_owners, self._subtree_owners, self._owned = {}, {}, {}
+                for name, package in self._packages.items():
+                    self._index_owners(name, package)
+            affected = set()
+            for path in touched:
+                # 被修改的是目标目录或其祖先（例如折叠链接）：其下所有目标都可能变化
+                affected.update(self._subtree_owners.get(path, ()))
+                # 被修改的是某个目标本身：只检查该目录中的文件
+                parent = os.path.dirname(path)
+                for name, rel_dir in self._dir_owners.get(parent, {}).items():
+                    if name not in affected and any(os.fspath(dotfile.target) == path for dotfile
+                                                    in self._packages[name].files_in_dirs([rel_dir])):
+                        affected.add(name)
+            self._dirty.update(affected)
+
+    def _index_owners(self, name: str, package: Optional[Package]) -> None:
+        """更新 invalidate_paths 的反向索引中某个包的条目（调用方持有锁；索引尚未建立时不做任何事）。"""
+        if self._dir_owners is None:
+            return
+        dirs, ancestors = self._owned.pop(name, ((), ()))
+        for target_dir in dirs:
+            owners = self._dir_owners.get(target_dir)
+            if owners is not None:
+                owners.pop(name, None)
+                if not owners:
+                    del self._dir_owners[target_dir]
+        for path in ancestors:
+            owners = self._subtree_owners.get(path)
+            if owners is not None:
+                owners.discard(name)
+                if not owners:
+                    del self._subtree_owners[path]
+        if package is None:
+            return
+
+        dirs, ancestors = [], set()
+        for target_dir, rel_dir in package.target_dirs():
+            self._dir_owners.setdefault(target_dir, {})[name] = rel_dir
+            dirs.append(target_dir)
+            path = target_dir
+            while path not in ancestors:
+                ancestors.add(path)
+                parent = os.path.dirname(path)
+                if parent == path:
+                    break
+                path = parent
+        for path in ancestors:
+            self._subtree_owners.setdefault(path, set()).add(name)
+        self._owned[name] = (dirs, ancestors)
+
+    def _refresh(self, name: str) -> None:
+        """重新扫描单个包（调用方持有锁）。"""
+        package = self.service.scan_package(name)
+        if package is None:
+            self._packages.pop(name, None)
+        else:
+            if name not in self._packages and name not in self._order:
+                self._order.append(name)
+            self._packages[name] = package
+        self._index_owners(name, package)
@@ -1,12 +1,57 @@
 from pathlib import Path
 import os
 
+from .index import default_cache_dir
+
 class AppConfig:
     """应用程序配置类。"""
-    def __init__(self, dotfiles_dir: str = "~/.dotfiles", target_root: str = None):
+    def __init__(self, dotfiles_dir: str = "~/.dotfiles", target_root: str = None, scan_workers: int = 1,
+                 use_index: bool = True, cache_dir: str = None, fold: bool = False, apply_workers: int = 1,
+                 use_journal: bool = True, backup_mode: str = "copy",
+                 archive_compression: str = "gz", diff_max_bytes: int = 2 * 1024 * 1024,
+                 diff_max_lines: int = 5000, diff_cache_entries: int = 128,
+                 diff_cache_bytes: int = 32 * 1024 * 1024, profile: bool = False, ignore_file: str = None,
+                 ignore_patterns: list = None, default_ignores: bool = True, binaries_file: str = None,
+                 package_binaries: dict = None):
         """初始化配置。"""
-        self.dotfiles_dir = Path(os.path.expanduser(dotfiles_dir))
-        self.target_root = Path(os.path.expanduser(target_root)) if target_root else Path.home()
+        # 相对路径按启动时的当前目录转为绝对路径，检测与索引中的路径都是绝对路径
+        self.dotfiles_dir = Path(os.path.abspath(os.path.expanduser(dotfiles_dir)))
+        self.target_root = Path(os.path.abspath(os.path.expanduser(target_root))) if target_root else Path.home()
+        # 扫描线程数，<= 1 表示串行扫描
+        self.scan_workers = max(1, int(scan_workers or 1))
+        # 持久化扫描索引 (默认位于 ~/.cache/dotkeeper)
+        self.use_index = use_index
+        self.cache_dir = Path(os.path.abspath(os.path.expanduser(cache_dir))) if cache_dir else default_cache_dir()
+        # 部署时像 GNU Stow 一样把目标不存在的目录折叠为单个目录链接
+        self.fold = fold
+        # 执行计划时的并发线程数，<= 1 表示按计划顺序串行执行
+        self.apply_workers = max(1, int(apply_workers or 1))
+        # 实际执行计划时写入操作日志 (缓存目录下的 journal/)，支持 resume / rollback
+        self.use_journal = use_journal
+        # backup-config 的备份方式: 'copy' 完整复制，'incremental' 硬链接增量快照，'archive' 压缩归档
+        self.backup_mode = backup_mode
+        # 归档模式的压缩方式: gz / xz / bz2
+        self.archive_compression = archive_compression
+        # Diff 的工作量上限：超过 diff_max_bytes 字节的文件只给出摘要，输出超过 diff_max_lines 行时截断 (0 表示不限制)
+        self.diff_max_bytes = diff_max_bytes
+        self.diff_max_lines = diff_max_lines
+        # 文件 diff 结果的 LRU 缓存上限（条目数与总字节数）
+        self.diff_cache_entries = diff_cache_entries
+        self.diff_cache_bytes = diff_cache_bytes
+        # 采集分阶段耗时、文件系统调用与缓存命中等指标 (--profile，/api/metrics)
+        self.profile = profile
+        # 扫描时忽略的条目：全局忽略文件 (默认 <dotfiles>/.dotkeeper-ignore)、额外规则，以及是否启用内置规则
+        # (编辑器交换文件、__pycache__ 等)；各包还可以有自己的 .dotkeeper-ignore / .stow-local-ignore
+        self.ignore_file = (Path(os.path.expanduser(ignore_file)) if ignore_file
+                            else self.dotfiles_dir / ".dotkeeper-ignore")
+        self.ignore_patterns = list(ignore_patterns or [])
+        self.default_ignores = default_ignores
+        # 包名与程序名不同时的映射 (包名 -> [可执行文件名, ...])，用于 is_installed；
+        # 映射文件默认为 <dotfiles>/.dotkeeper-binaries，package_binaries 中的条目优先
+        self.binaries_file = (Path(os.path.expanduser(binaries_file)) if binaries_file
+                              else self.dotfiles_dir / ".dotkeeper-binaries")
+        self.package_binaries = {name: [b] if isinstance(b, str) else list(b)
+                                 for name, b in (package_binaries or {}).items()}
 
     def ensure_dirs(self):
         """确保必要的目录存在（dotfiles_dir 必须已存在）。"""
@@ -1,39 +1,210 @@
 from pathlib import Path
 import os
+import stat
+from typing import Dict, List, Optional, Tuple
 from .models import FileState
+from .index import dir_signature, target_signature
+from .metrics import METRICS
 
 class StateDetector:
-    """文件状态检测器。"""
+    """
+    文件状态检测器。
+    每个目标只做一次 lstat，仅对软链接调用 readlink；链接目标在词法上与预先解析好的源路径比较，
+    目录的解析结果会被缓存，因此一个实例应在一次扫描内复用。
+    """
+    def __init__(self):
+        """初始化检测器缓存。"""
+        self._real_dirs: Dict[str, str] = {}
+
     @staticmethod
     def detect(source: Path, target: Path) -> FileState:
         """
         检测目标相对于源 dotfile 的状态。
         """
-        if not target.exists(follow_symlinks=False) and not target.is_symlink():
-            return FileState.MISSING
+        return StateDetector().check(source, target)
+
+    def check(self, source: Path, target: Path) -> FileState:
+        """使用本实例的缓存检测单个目标的状态。"""
+        if self.is_folded(source.parent, target.parent) and os.path.lexists(source):
+            return FileState.LINKED
+        source_key = os.path.join(self.real_dir(str(source.parent)), source.name)
+        return self._classify(str(target), source_key, self._lstat(str(target)))
 
-        if target.is_symlink():
-            if not target.exists():
-                return FileState.ORPHAN
-
-            try:
-                link_target = os.readlink(target)
-                abs_link_target = Path(link_target)
-                if not abs_link_target.is_absolute():
-                    abs_link_target = target.parent / link_target
-                
-                abs_link_target = abs_link_target.resolve()
-                resolved_source = source.resolve()
-
-                if abs_link_target == resolved_source:
-                    return FileState.LINKED
+    def check_dir(self, source_dir: Path, target_dir: Path, names: List[str], index=None) -> List[FileState]:
+        """
+        批量检测同一源目录下各文件对应目标的状态。
+        index 为 ScanIndex 时，目标目录未变化则复用上次的检测结果，否则 lstat 签名未变的链接复用缓存的链接内容。
+        """
+        source_real = self.real_dir(str(source_dir))
+        target_base = str(target_dir)
+        if self.real_dir(target_base) == source_real:
+            # 目标目录经折叠链接指向源目录本身，其中的文件都已链接，无需逐个检测
+            return [FileState.LINKED] * len(names)
+
+        with METRICS.phase("detect"):
+            return self._check_names(source_dir, source_real, target_base, names, index)
+
+    def _check_names(self, source_dir: Path, source_real: str, target_base: str, names: List[str],
+                     index) -> List[FileState]:
+        """
+        check_dir 的逐文件部分。
+        目标目录的签名未变时，上次不存在的目标直接判为 MISSING，上次的链接内容直接复用，均不再 lstat；
+        链接内容指向的目录仍按本次扫描解析（real_dir 按目录缓存，同一目录下的链接只解析一次），
+        因此中间目录的软链接被改指时比较结果随之变化。
+        """
+        profile = METRICS.enabled
+        source = str(source_dir)
+        cached, entries, dir_sig = None, None, None
+        if index is not None and names:
+            dir_sig = self._dir_signature(target_base)
+            if dir_sig is not None:
+                cached = index.lookup_target_dir(target_base, source, dir_sig)
+                entries = {}
+                if profile:
+                    METRICS.cache("scan_index_target_dir", cached is not None)
+
+        states = []
+        for name in names:
+            target = os.path.join(target_base, name)
+            source_key = os.path.join(source_real, name)
+            link_target = None
+            if cached is not None and name in cached:
+                link_target = cached[name]
+                if link_target is None:
+                    state = FileState.MISSING
+                elif self._link_key(target, link_target) == source_key:
+                    state = FileState.LINKED
                 else:
-                    # 是链接，但不是指向我们的文件 -> 冲突
-                    # 为了安全，任何不是我们的预存链接都视为冲突。
-                    return FileState.CONFLICT
-            except OSError:
-                # 损坏的链接
-                return FileState.ORPHAN
-        
-        # 存在且不是软链接 -> 冲突
+                    state, link_target = self._check_name(target, os.path.join(source, name), source_key, index)
+            else:
+                state, link_target = self._check_name(target, os.path.join(source, name), source_key, index)
+            states.append(state)
+            if entries is not None and (state == FileState.MISSING or link_target is not None):
+                entries[name] = link_target
+
+        if entries is not None:
+            index.store_target_dir(target_base, source, dir_sig, entries)
+        return states
+
+    def _check_name(self, target: str, source: str, source_key: str, index) -> Tuple[FileState, Optional[str]]:
+        """
+        检测单个目标，返回 (状态, 链接内容)；只有词法比较即判定为 LINKED 的链接才返回链接内容。
+        index 中该链接的 lstat 签名未变时复用缓存的链接内容，不再 readlink。
+        """
+        st = self._lstat(target)
+        if index is None or st is None or not stat.S_ISLNK(st.st_mode):
+            return self._classify(target, source_key, st), None
+
+        sig = target_signature(st)
+        link_target = index.lookup_target(target, source, sig)
+        hit = link_target is not None and self._link_key(target, link_target) == source_key
+        if METRICS.enabled:
+            METRICS.cache("scan_index_target", hit)
+        if hit:
+            return FileState.LINKED, link_target
+        link_target = self._readlink(target)
+        if link_target is not None and self._link_key(target, link_target) == source_key:
+            index.store_target(target, source, sig, link_target)
+            return FileState.LINKED, link_target
+        index.forget_target(target)
+        return self._classify(target, source_key, st), None
+
+    @staticmethod
+    def _dir_signature(path: str) -> Optional[List[int]]:
+        """目标目录的签名；目录不存在时返回 None。"""
+        if METRICS.enabled:
+            METRICS.syscall("stat")
+        try:
+            return dir_signature(os.stat(path))
+        except OSError:
+            return None
+
+    def is_folded(self, source_dir: Path, target_dir: Path) -> bool:
+        """目标目录是否（经某个祖先的折叠链接）就是源目录本身。"""
+        return self.real_dir(str(target_dir)) == self.real_dir(str(source_dir))
+
+    def real_dir(self, path: str) -> str:
+        """
+        返回目录的物理路径（解析所有软链接），逐级缓存，使共享父目录只解析一次。
+        相对路径先按当前目录补全（不做词法上的 .. 折叠），结果总是绝对路径。
+        """
+        cached = self._real_dirs.get(path)
+        if cached is not None:
+            return cached
+        if not os.path.isabs(path):
+            real = self.real_dir(os.path.join(os.getcwd(), path))
+            self._real_dirs[path] = real
+            return real
+
+        parent, name = os.path.split(path)
+        if not name or parent == path:
+            real = path
+        elif name == '.':
+            real = self.real_dir(parent)
+        elif name == '..':
+            real = os.path.dirname(self.real_dir(parent))
+        else:
+            real = os.path.join(self.real_dir(parent), name)
+            st = self._lstat(real)
+            if st is not None and stat.S_ISLNK(st.st_mode):
+                if METRICS.enabled:
+                    METRICS.syscall("realpath")
+                real = os.path.realpath(real)
+
+        self._real_dirs[path] = real
+        return real
+
+    @staticmethod
+    def _lstat(path: str) -> Optional[os.stat_result]:
+        """lstat，目标不存在时返回 None。"""
+        if METRICS.enabled:
+            METRICS.syscall("lstat")
+        try:
+            return os.lstat(path)
+        except (FileNotFoundError, NotADirectoryError):
+            return None
+
+    @staticmethod
+    def _readlink(path: str) -> Optional[str]:
+        """readlink，失败时返回 None。"""
+        if METRICS.enabled:
+            METRICS.syscall("readlink")
+        try:
+            return os.readlink(path)
+        except OSError:
+            return None
+
+    def _link_key(self, target: str, link_target: str) -> str:
+        """链接内容指向的路径：父目录解析为物理路径（使用本实例的目录缓存），最后一级保持原样。"""
+        abs_link_target = os.path.join(os.path.dirname(target), link_target).rstrip(os.sep) or os.sep
+        link_parent, link_name = os.path.split(abs_link_target)
+        return os.path.join(self.real_dir(link_parent), link_name)
+
+    def _classify(self, target: str, source_key: str, st: Optional[os.stat_result]) -> FileState:
+        """根据已取得的 lstat 结果判定状态。"""
+        if st is None:
+            return FileState.MISSING
+
+        if not stat.S_ISLNK(st.st_mode):
+            # 存在且不是软链接 -> 冲突
+            return FileState.CONFLICT
+
+        link_target = self._readlink(target)
+        if link_target is None:
+            # 损坏的链接
+            return FileState.ORPHAN
+
+        link_key = self._link_key(target, link_target)
+        if link_key == source_key:
+            return FileState.LINKED
+
+        # 词法比较失败（例如链接经过其他软链接），回退到完整解析
+        if METRICS.enabled:
+            METRICS.syscall("resolve")
+        if not os.path.exists(target):
+            return FileState.ORPHAN
+        if os.path.realpath(link_key) == os.path.realpath(source_key):
+            return FileState.LINKED
+        # 是链接，但不是指向我们的文件 -> 冲突
+        # 为了安全，任何不是我们的预存链接都视为冲突。
         return FileState.CONFLICT
@@ -0,0 +1,105 @@
+import os
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from .metrics import METRICS
+
+# 包名与可执行文件名不同时的映射文件（每行 "包名 = 可执行文件 [可执行文件 ...]"）
+BINARIES_FILE = ".dotkeeper-binaries"
+
+def read_binaries(path: Path) -> Dict[str, List[str]]:
+    """
+    读取包名到可执行文件名的映射；文件不存在时返回空字典。
+    '=' 右侧为空表示该包没有对应的程序（is_installed 恒为 False）。
+    """
+    mapping = {}
+    try:
+        text = Path(path).read_text(encoding="utf-8")
+    except (OSError, UnicodeDecodeError):
+        return mapping
+    for line in text.splitlines():
+        line = line.split("#", 1)[0].strip()
+        name, sep, value = line.partition("=")
+        if sep and name.strip():
+            mapping[name.strip()] = value.replace(",", " ").split()
+    return mapping
+
+class ExecutableIndex:
+    """
+    PATH 中可执行文件名的索引，代替逐个包调用 shutil.which。
+    每个 PATH 目录列出一次，记录 名称 -> 所在目录；refresh() 只 stat 各目录，
+    PATH 或任一目录的 mtime 变化时才重建。查找不存在的名称只是一次字典查询，
+    命中时再检查候选文件是否可执行（目录 mtime 不反映权限变化）。
+    """
+    def __init__(self):
+        """初始化（空索引，首次 refresh 时构建）。"""
+        self._lock = threading.Lock()
+        self._signature: Optional[Tuple] = None
+        self._names: Dict[str, List[str]] = {}
+
+    @staticmethod
+    def _path_dirs() -> List[str]:
+        """PATH 中的目录（去重，保持顺序）。"""
+        return list(dict.fromkeys(d for d in os.environ.get("PATH", os.defpath).split(os.pathsep) if d))
+
+    def refresh(self) -> bool:
+        """PATH 变化时重建索引；返回是否重建。"""
+        dirs = self._path_dirs()
+        signature = []
+        for d in dirs:
+            try:
+                signature.append((d, os.stat(d).st_mtime_ns))
+            except OSError:
+                signature.append((d, None))
+        signature = tuple(signature)
+        if METRICS.enabled:
+            METRICS.syscall("stat", len(dirs))
+        with self._lock:
+            stale = signature != self._signature
+            if METRICS.enabled:
+                METRICS.cache("path_index", not stale)
+            if stale:
+                self._names = self._build(d for d, mtime in signature if mtime is not None)
+                self._signature = signature
+        return stale
+
+    @staticmethod
+    def _build(dirs) -> Dict[str, List[str]]:
+        """列出各目录的条目，得到 名称 -> [目录, ...]（按 PATH 顺序）。"""
+        names: Dict[str, List[str]] = {}
+        exts = [e.lower() for e in os.environ.get("PATHEXT", "").split(os.pathsep) if e] if os.name == "nt" else []
+        for d in dirs:
+            if METRICS.enabled:
+                METRICS.syscall("scandir")
+            try:
+                with os.scandir(d) as it:
+                    entries = [entry.name for entry in it]
+            except OSError:
+                continue
+            for name in entries:
+                names.setdefault(name, []).append(d)
+                # Windows 上 "git.exe" 也以 "git" 登记
+                stem, ext = os.path.splitext(name)
+                if ext.lower() in exts:
+                    names.setdefault(stem, []).append(d)
+        return names
+
+    def find(self, name: str) -> Optional[str]:
+        """返回 PATH 中名为 name 的可执行文件路径（同 shutil.which），不存在时返回 None。"""
+        if self._signature is None:
+            self.refresh()
+        dirs = self._names.get(name)
+        if not dirs:
+            return None
+        for d in dirs:
+            candidates = [os.path.join(d, name)]
+            if os.name == "nt":
+                candidates += [os.path.join(d, name + e) for e in os.environ.get("PATHEXT", "").split(os.pathsep) if e]
+            for candidate in candidates:
+                if os.path.isfile(candidate) and os.access(candidate, os.X_OK):
+                    return candidate
+        return None
+
+    def __contains__(self, name: str) -> bool:
+        return self.find(name) is not None
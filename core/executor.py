@@ -1,16 +1,20 @@
-from typing import List
-from .operations import Operation
+from typing import TYPE_CHECKING, Dict, List, Set, Tuple
+from .metrics import METRICS
 import logging
+import os
+
+if TYPE_CHECKING:
+    from .operations import Operation, MkdirOperation
 
 logger = logging.getLogger(__name__)
 
 class OperationPlan:
     """操作计划。"""
-    def __init__(self, operations: List[Operation] = None):
+    def __init__(self, operations: List["Operation"] = None):
         """初始化操作计划。"""
         self.operations = operations or []
 
-    def add(self, operation: Operation):
+    def add(self, operation: "Operation"):
         """添加操作。"""
         self.operations.append(operation)
 
@@ -24,13 +28,20 @@ class OperationPlan:
 class Executor:
     """操作执行器。"""
     @staticmethod
-    def run(plan: OperationPlan, dry_run: bool = True) -> List[str]:
+    def run(plan: OperationPlan, dry_run: bool = True, workers: int = 1, journal=None) -> List[str]:
         """
         执行操作计划。
+        workers > 1 时按路径依赖关系并发执行互不相关的操作。
+        journal 为 Journal 时，每个操作执行前后都会记录，已完成的操作被跳过（用于 resume）。
         返回执行日志列表。
         """
+        if not dry_run and workers > 1 and len(plan.operations) > 1:
+            return Executor._run_parallel(plan, workers, journal)
+
         logs = []
-        for op in plan.operations:
+        for index, op in enumerate(plan.operations):
+            if journal is not None and journal.is_done(index):
+                continue
             if dry_run:
                 msg = f"[DRY-RUN] {op.dry_run()}"
                 logs.append(msg)
@@ -40,12 +51,159 @@ class Executor:
                     msg = f"[EXECUTE] {op.dry_run()}"
                     logs.append(msg)
                     logger.info(msg)
-                    op.apply()
+                    Executor._apply(op, index, journal)
                 except Exception as e:
                     error_msg = f"Failed to execute {op.description} / 执行 {op.description} 失败: {e}"
                     logger.error(error_msg)
                     logs.append(f"[ERROR] {error_msg}")
-                    # In a robust system, we might want to rollback or stop here.
-                    # For MVP, we stop.
+                    # 日志保留为未完成状态，可通过 resume / rollback 处理
+                    if journal is not None:
+                        journal.close()
                     raise e
+        if not dry_run and journal is not None:
+            journal.commit()
+        return logs
+
+    @staticmethod
+    def _apply(op: "Operation", index: int, journal) -> None:
+        """执行单个操作，并在日志中记录开始与完成。"""
+        if journal is not None:
+            journal.record_dirs(op.parent_dirs())
+            journal.begin(index, op)
+        op.apply()
+        if METRICS.enabled:
+            METRICS.inc("dotkeeper_operations_total", type=type(op).__name__)
+        if journal is not None:
+            journal.finish(index)
+
+    @staticmethod
+    def _make_dir(op: "MkdirOperation", journal) -> None:
+        """执行器插入的目录创建节点。"""
+        if journal is not None:
+            journal.record_dirs([op.path])
+        op.apply()
+        if METRICS.enabled:
+            METRICS.inc("dotkeeper_operations_total", type=type(op).__name__)
+
+    @staticmethod
+    def build_graph(operations: List["Operation"]) -> Tuple[List["Operation"], List[Set[int]]]:
+        """
+        根据操作涉及的路径构建依赖图，返回 (节点列表, 每个节点依赖的节点下标集合)。
+        作用于同一路径、其祖先或子孙路径的操作保持计划中的先后顺序；
+        每个需要的父目录只插入一个 MkdirOperation 节点，排在其下的操作之前。
+        """
+        from .operations import MkdirOperation
+
+        nodes: List["Operation"] = []
+        deps: List[Set[int]] = []
+        last_writer: Dict[str, int] = {}
+        # 祖先路径 -> 自上次直接作用于该路径以来，作用于其子孙的节点
+        under: Dict[str, Set[int]] = {}
+        mkdirs: Dict[str, int] = {}
+
+        def chain(path: str) -> List[str]:
+            paths = [path]
+            parent = os.path.dirname(path)
+            while parent != path:
+                paths.append(parent)
+                path, parent = parent, os.path.dirname(parent)
+            return paths
+
+        def add(op: "Operation", paths: List[str]) -> int:
+            idx = len(nodes)
+            required = set()
+            for path in paths:
+                ancestors = chain(path)
+                for a in ancestors:
+                    writer = last_writer.get(a)
+                    if writer is not None:
+                        required.add(writer)
+                required |= under.pop(path, set())
+                last_writer[path] = idx
+                for a in ancestors[1:]:
+                    under.setdefault(a, set()).add(idx)
+            nodes.append(op)
+            deps.append(required)
+            return idx
+
+        for op in operations:
+            for parent in op.parent_dirs():
+                key = os.fspath(parent)
+                idx = mkdirs.get(key)
+                # 目录或其祖先在创建之后又被修改过（例如被删除），需要重新创建
+                if idx is None or max(last_writer.get(a, -1) for a in chain(key)) != idx:
+                    mkdirs[key] = add(MkdirOperation(parent), [key])
+            add(op, [os.fspath(p) for p in op.affected_paths()])
+        return nodes, deps
+
+    @staticmethod
+    def _run_parallel(plan: OperationPlan, workers: int, journal=None) -> List[str]:
+        """在线程池上按依赖图并发执行计划；首个失败后不再调度新操作，并重新抛出该异常。"""
+        from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+        nodes, deps = Executor.build_graph(plan.operations)
+        plan_index = {id(op): index for index, op in enumerate(plan.operations)}
+        dependents: List[List[int]] = [[] for _ in nodes]
+        remaining = [len(d) for d in deps]
+        for idx, required in enumerate(deps):
+            for dep in required:
+                dependents[dep].append(idx)
+
+        messages: Dict[int, str] = {}
+        error = None
+        for op in plan.operations:
+            op.parents_ready = True
+        try:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                def submit(idx: int):
+                    op = nodes[idx]
+                    index = plan_index.get(id(op))
+                    if index is None:
+                        # 执行器插入的 MkdirOperation 不输出日志，但新建的目录要记入 journal 以便回滚
+                        running[pool.submit(Executor._make_dir, op, journal)] = idx
+                        return
+                    if journal is not None and journal.is_done(index):
+                        running[pool.submit(lambda: None)] = idx
+                        return
+                    # 描述需在执行前生成（部分操作的描述取决于执行前的状态）
+                    messages[id(op)] = msg = f"[EXECUTE] {op.dry_run()}"
+                    logger.info(msg)
+                    running[pool.submit(Executor._apply, op, index, journal)] = idx
+
+                running = {}
+                for idx, count in enumerate(remaining):
+                    if count == 0:
+                        submit(idx)
+
+                while running:
+                    finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        idx = running.pop(future)
+                        exc = future.exception()
+                        if exc is not None:
+                            if error is None:
+                                error = (nodes[idx], exc)
+                            continue
+                        if error is not None:
+                            continue
+                        for dependent in dependents[idx]:
+                            remaining[dependent] -= 1
+                            if remaining[dependent] == 0:
+                                submit(dependent)
+        finally:
+            for op in plan.operations:
+                op.parents_ready = False
+
+        # 日志按计划顺序记录实际执行过的操作
+        logs = [messages[id(op)] for op in plan.operations if id(op) in messages]
+        if error is not None:
+            op, exc = error
+            error_msg = f"Failed to execute {op.description} / 执行 {op.description} 失败: {exc}"
+            logger.error(error_msg)
+            logs.append(f"[ERROR] {error_msg}")
+            if journal is not None:
+                journal.close()
+            raise exc
+        if journal is not None:
+            journal.commit()
         return logs
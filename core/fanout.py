@@ -0,0 +1,82 @@
+import copy
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from .config import AppConfig
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class TargetReport:
+    """单个目标根目录的部署结果。"""
+    target_root: str
+    states: Dict[str, int] = field(default_factory=dict)   # 部署前各状态的文件数
+    operations: int = 0
+    status: str = "ok"                                      # ok / error
+    error: str = ""
+    seconds: float = 0.0
+
+class FanoutDeployer:
+    """
+    把同一组包部署到多个目标根目录（例如多个用户主目录或容器 rootfs）。
+    dotfiles 仓库只遍历一次；每个目标根目录的状态检测、规划与执行在进程池中相互独立地进行，
+    各自使用以该目标根目录为键的索引与操作日志。
+    """
+    @staticmethod
+    def run(config: AppConfig, targets: List[str], names: Optional[List[str]] = None, dry_run: bool = True,
+            workers: Optional[int] = None) -> Tuple[List[TargetReport], List[str]]:
+        """
+        部署 names 指定的包（None 表示全部包）到每个目标根目录。
+        返回 (按 targets 顺序排列的报告, 未找到的包名)；有包未找到时不做任何部署。
+        """
+        from .service import DotfilesService
+
+        layout, missing = DotfilesService(config).package_layout(names)
+        if missing or not targets:
+            return [], missing
+
+        configs = []
+        for target in dict.fromkeys(os.path.expanduser(t) for t in targets):
+            target_config = copy.copy(config)
+            target_config.target_root = Path(target)
+            configs.append(target_config)
+
+        workers = max(1, min(workers or os.cpu_count() or 1, len(configs)))
+        if workers == 1:
+            return [FanoutDeployer._deploy_target(c, layout, dry_run) for c in configs], []
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(FanoutDeployer._deploy_target, c, layout, dry_run) for c in configs]
+            return [future.result() for future in futures], []
+
+    @staticmethod
+    def _deploy_target(config: AppConfig, layout: list, dry_run: bool) -> TargetReport:
+        """在单个目标根目录上检测状态、规划并执行（在工作进程中运行）。"""
+        from .service import DotfilesService
+
+        # 多个目标的逐条执行日志交织在一起没有意义，结果由报告汇总；
+        # workers == 1 时在调用方进程中运行，结束后恢复调用方原有的屏蔽级别
+        previous = logging.root.manager.disable
+        logging.disable(max(previous, logging.INFO))
+        start = time.perf_counter()
+        report = TargetReport(target_root=str(config.target_root))
+        try:
+            service = DotfilesService(config)
+            packages = service.packages_from_layout(layout)
+            for pkg in packages:
+                for state, count in pkg.state_counts().items():
+                    report.states[state.value] = report.states.get(state.value, 0) + count
+            plan = service.plan_batch(packages, action="link")
+            report.operations = len(plan.operations)
+            if not plan.is_empty():
+                service.execute(plan, dry_run=dry_run)
+        except Exception as e:
+            report.status, report.error = "error", str(e)
+        finally:
+            logging.disable(previous)
+        report.seconds = time.perf_counter() - start
+        return report
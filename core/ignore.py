@@ -0,0 +1,118 @@
+import fnmatch
+import re
+from pathlib import Path
+from typing import Iterable, List, Optional, Tuple
+
+# 包内忽略文件；STOW_IGNORE_FILE 兼容 GNU Stow 的 .stow-local-ignore（每行一个正则）
+IGNORE_FILE = ".dotkeeper-ignore"
+STOW_IGNORE_FILE = ".stow-local-ignore"
+
+# 忽略文件本身总是被忽略
+ALWAYS_IGNORED = (IGNORE_FILE, STOW_IGNORE_FILE)
+
+# 内置规则：编辑器交换/备份文件与常见缓存
+DEFAULT_IGNORES = (
+    "__pycache__/",
+    "*.py[co]",
+    ".*.sw[a-p]",
+    "*~",
+    ".#*",
+    "#*#",
+    ".DS_Store",
+)
+
+def parse_patterns(text: str, regex: bool = False) -> List[str]:
+    """
+    解析忽略文件内容，返回规则列表（去掉空行与 # 注释）。
+    regex=True 时每行都是正则（.stow-local-ignore 格式），统一转换为 're:' 前缀的规则；
+    与 Stow 一致，空白之后的 # 也开始注释（正则中的 # 需写成 \\#）。
+    """
+    patterns = []
+    for line in text.splitlines():
+        if regex:
+            line = re.sub(r"\s+#.*", "", line)
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        patterns.append(f"re:{line}" if regex and not line.startswith("re:") else line)
+    return patterns
+
+def read_patterns(path: Path, regex: bool = False) -> List[str]:
+    """读取忽略文件；文件不存在或无法读取时返回空列表。"""
+    try:
+        text = Path(path).read_text(encoding="utf-8")
+    except (OSError, UnicodeDecodeError):
+        return []
+    return parse_patterns(text, regex=regex)
+
+class IgnoreRules:
+    """
+    编译后的忽略规则。
+    规则语法：
+      - 默认为 glob（fnmatch）；以 're:' 开头的是正则；
+      - 以 '/' 结尾的规则只匹配目录（匹配的目录整个不再进入）；
+      - 含 '/' 的规则匹配以 '/' 开头、相对于包根目录的路径（如 '/.config/app/cache'），否则只匹配名称。
+    名称规则需完整匹配。与 GNU Stow 相同，路径正则在路径中搜索，匹配须起止于路径分隔处
+    （'^/README.*' 只匹配包根目录下的 README）；路径 glob 锚定在包根目录。
+    所有规则按（名称/路径）×（任意/仅目录）合并成至多四个正则，每个条目最多匹配两次。
+    """
+    def __init__(self, patterns: Iterable[str] = ()):
+        """编译规则；无效的正则会抛出 ValueError。"""
+        self.patterns = list(patterns)
+        buckets = {(path, dir_only): [] for path in (False, True) for dir_only in (False, True)}
+        for pattern in self.patterns:
+            is_regex = pattern.startswith("re:")
+            body = pattern[3:] if is_regex else pattern
+            dir_only = body.endswith("/")
+            body = body.rstrip("/")
+            if not body:
+                continue
+            is_path = "/" in body
+            if is_regex:
+                try:
+                    re.compile(body)
+                except re.error as e:
+                    raise ValueError(f"Invalid ignore pattern / 无效的忽略规则 {pattern!r}: {e}") from e
+                # 同 Stow：名称正则为 ^(re)$，路径正则为 (^|/)(re)(/|$)
+                buckets[(is_path, dir_only)].append(f"(?:(?:^|/)(?:{body})(?:/|$))" if is_path else f"(?:{body})")
+            elif is_path:
+                buckets[(is_path, dir_only)].append(f"(?:^{fnmatch.translate('/' + body.lstrip('/'))})")
+            else:
+                buckets[(is_path, dir_only)].append(f"(?:{fnmatch.translate(body)})")
+        self._name_any = self._join(buckets[(False, False)])
+        self._name_dir = self._join(buckets[(False, False)] + buckets[(False, True)])
+        self._path_any = self._join(buckets[(True, False)])
+        self._path_dir = self._join(buckets[(True, False)] + buckets[(True, True)])
+
+    @staticmethod
+    def _join(parts: List[str]) -> Optional["re.Pattern"]:
+        return re.compile("|".join(parts)) if parts else None
+
+    @classmethod
+    def for_package(cls, package_root: Path, base: Iterable[str] = ()) -> "IgnoreRules":
+        """在 base（内置与全局规则）之后追加包内 .dotkeeper-ignore 与 .stow-local-ignore 中的规则。"""
+        patterns = list(base)
+        patterns += read_patterns(package_root / IGNORE_FILE)
+        patterns += read_patterns(package_root / STOW_IGNORE_FILE, regex=True)
+        return cls(patterns)
+
+    def __bool__(self) -> bool:
+        return any(p is not None for p in (self._name_any, self._name_dir, self._path_any, self._path_dir))
+
+    def match(self, rel_path: str, is_dir: bool = False) -> bool:
+        """rel_path（相对于包根目录，'/' 分隔，不以 '/' 开头）是否被忽略。"""
+        name = rel_path.rpartition("/")[2]
+        name_re, path_re = (self._name_dir, self._path_dir) if is_dir else (self._name_any, self._path_any)
+        return bool((name_re is not None and name_re.fullmatch(name))
+                    or (path_re is not None and path_re.search("/" + rel_path)))
+
+    def filter(self, rel_dir: str, dirs: List[str],
+               filenames: List[str]) -> Tuple[List[str], List[str], int, int]:
+        """
+        过滤同一目录（rel_dir，包根目录为 '' 或 '.'）下的子目录与文件。
+        返回 (保留的子目录, 保留的文件, 忽略的目录数, 忽略的文件数)；不修改传入的列表。
+        """
+        prefix = "" if rel_dir in ("", ".") else rel_dir + "/"
+        kept_dirs = [d for d in dirs if not self.match(prefix + d, is_dir=True)]
+        kept_files = [f for f in filenames if not self.match(prefix + f)]
+        return kept_dirs, kept_files, len(dirs) - len(kept_dirs), len(filenames) - len(kept_files)
@@ -0,0 +1,179 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 目录 mtime 距离当前时间小于该值时不写入索引，避免同一时钟刻度内的修改被漏掉
+RACY_WINDOW_NS = 2_000_000_000
+
+def default_cache_dir() -> Path:
+    """返回默认缓存目录（遵循 XDG_CACHE_HOME）。"""
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return Path(base) / "dotkeeper"
+
+def dir_signature(st: os.stat_result) -> List[int]:
+    """目录签名：mtime 与 inode。"""
+    return [st.st_mtime_ns, st.st_ino]
+
+def target_signature(st: os.stat_result) -> List[int]:
+    """目标签名：基于 lstat 的设备、inode、类型、大小与 mtime。"""
+    return [st.st_dev, st.st_ino, st.st_mode, st.st_size, st.st_mtime_ns]
+
+class ScanIndex:
+    """
+    持久化扫描索引。
+    记录包内每个目录的签名与条目列表、指向源文件的软链接目标的链接内容，
+    以及目标目录签名未变时可整体复用的检测结果，
+    使未变化的目录无需重新遍历、未变化的链接无需重新解析。
+    """
+    VERSION = 3
+
+    def __init__(self, path: Path):
+        """初始化索引（不会立即读取磁盘）。"""
+        self.path = path
+        self._dirs: Dict[str, list] = {}
+        self._targets: Dict[str, list] = {}
+        self._target_dirs: Dict[str, list] = {}
+        self._seen_dirs = set()
+        self._seen_targets = set()
+        self._seen_target_dirs = set()
+        self._dirty = False
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_config(cls, config) -> "ScanIndex":
+        """根据配置（dotfiles 目录 + 目标根目录）定位索引文件。"""
+        key = f"{config.dotfiles_dir.resolve()}\0{config.target_root.resolve()}"
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=8).hexdigest()
+        index = cls(Path(config.cache_dir) / f"scan-index-{digest}.json")
+        index.load()
+        return index
+
+    def load(self) -> None:
+        """从磁盘读取索引，文件损坏或版本不符时从空索引开始。"""
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get("version") != self.VERSION:
+            return
+        self._dirs = data.get("dirs", {})
+        self._targets = data.get("targets", {})
+        self._target_dirs = data.get("target_dirs", {})
+
+    def save(self, prune: bool = False) -> None:
+        """
+        原子地写回索引。
+        prune=True 时丢弃本轮扫描未访问到的条目（仅应在全量扫描后使用）。
+        """
+        with self._lock:
+            if prune:
+                dirs = {k: v for k, v in self._dirs.items() if k in self._seen_dirs}
+                targets = {k: v for k, v in self._targets.items() if k in self._seen_targets}
+                target_dirs = {k: v for k, v in self._target_dirs.items() if k in self._seen_target_dirs}
+                if (len(dirs) != len(self._dirs) or len(targets) != len(self._targets)
+                        or len(target_dirs) != len(self._target_dirs)):
+                    self._dirs, self._targets, self._target_dirs = dirs, targets, target_dirs
+                    self._dirty = True
+            self._seen_dirs = set()
+            self._seen_targets = set()
+            self._seen_target_dirs = set()
+            if not self._dirty:
+                return
+            payload = {"version": self.VERSION, "dirs": self._dirs, "targets": self._targets,
+                       "target_dirs": self._target_dirs}
+            self._dirty = False
+
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(payload, f, separators=(",", ":"))
+            os.replace(tmp, self.path)
+        except OSError as e:
+            logger.warning(f"Failed to write scan index {self.path} / 写入扫描索引失败: {e}")
+
+    def lookup_dir(self, path: str, sig: List[int]) -> Optional[Tuple[List[str], List[str]]]:
+        """签名一致时返回缓存的 (子目录, 文件) 列表（并发扫描时会从多个线程调用）。"""
+        with self._lock:
+            entry = self._dirs.get(path)
+            self._seen_dirs.add(path)
+        if entry is not None and entry[0] == sig:
+            return entry[1], entry[2]
+        return None
+
+    def store_dir(self, path: str, sig: List[int], dirs: List[str], files: List[str]) -> None:
+        """记录目录条目；处于 racy 窗口内的目录不缓存。"""
+        with self._lock:
+            self._seen_dirs.add(path)
+            if time.time_ns() - sig[0] < RACY_WINDOW_NS:
+                if self._dirs.pop(path, None) is not None:
+                    self._dirty = True
+                return
+            self._dirs[path] = [sig, dirs, files]
+            self._dirty = True
+
+    def lookup_target(self, target: str, source: str, sig: List[int]) -> Optional[str]:
+        """
+        签名与源路径一致时返回缓存的链接内容（readlink 的结果）。
+        链接本身的 lstat 签名不变说明内容未变；链接所经过的目录是否被改指由调用方重新解析判断。
+        """
+        with self._lock:
+            entry = self._targets.get(target)
+            self._seen_targets.add(target)
+        if entry is not None and entry[0] == sig and entry[1] == source:
+            return entry[2]
+        return None
+
+    def store_target(self, target: str, source: str, sig: List[int], link: str) -> None:
+        """记录指向源文件的链接及其内容。"""
+        with self._lock:
+            self._seen_targets.add(target)
+            self._targets[target] = [sig, source, link]
+            self._dirty = True
+
+    def lookup_target_dir(self, target_dir: str, source_dir: str,
+                          sig: List[int]) -> Optional[Dict[str, Optional[str]]]:
+        """
+        目标目录签名一致时返回上次检测的结果 {文件名: 链接内容，None 表示目标不存在}。
+        软链接不能原地修改，目录中条目的增删、替换都会改变目录的 mtime，
+        因此签名未变时各条目是否存在以及链接内容都与上次相同。
+        """
+        key = f"{target_dir}\0{source_dir}"
+        with self._lock:
+            entry = self._target_dirs.get(key)
+            self._seen_target_dirs.add(key)
+            if entry is None or entry[0] != sig:
+                return None
+            # 其中链接的逐条目缓存仍然有效，全量扫描后不应被清理
+            self._seen_targets.update(os.path.join(target_dir, name)
+                                      for name, link in entry[1].items() if link is not None)
+        return entry[1]
+
+    def store_target_dir(self, target_dir: str, source_dir: str, sig: List[int],
+                         entries: Dict[str, Optional[str]]) -> None:
+        """记录目标目录的检测结果；处于 racy 窗口内的目录不缓存。"""
+        key = f"{target_dir}\0{source_dir}"
+        with self._lock:
+            self._seen_target_dirs.add(key)
+            if time.time_ns() - sig[0] < RACY_WINDOW_NS:
+                if self._target_dirs.pop(key, None) is not None:
+                    self._dirty = True
+                return
+            entry = [sig, entries]
+            if self._target_dirs.get(key) != entry:
+                self._target_dirs[key] = entry
+                self._dirty = True
+
+    def forget_target(self, target: str) -> None:
+        """移除目标条目。"""
+        with self._lock:
+            if self._targets.pop(target, None) is not None:
+                self._dirty = True
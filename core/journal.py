@@ -0,0 +1,286 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+
+from .executor import OperationPlan
+from .operations import (Operation, BackupOperation, RestoreBackupOperation, SymlinkOperation,
+                         CopyOperation, SnapshotOperation, ArchiveOperation, ExtractArchiveOperation,
+                         RemoveOperation, MkdirOperation, UnfoldOperation)
+
+logger = logging.getLogger(__name__)
+
+MAGIC = "DKJ1"
+# 每写入多少条记录 fsync 一次；会破坏现有内容的操作在执行前总是同步落盘
+SYNC_EVERY = 256
+# 保留的已完成日志数量
+KEEP_JOURNALS = 10
+
+# 操作类型 -> (记录代码, 构造参数属性)
+_OP_CODES = {
+    BackupOperation: ("B", ("target", "backup_path", "store_root")),
+    RestoreBackupOperation: ("R", ("target", "backup_path", "store_root")),
+    SymlinkOperation: ("L", ("src", "dst")),
+    CopyOperation: ("C", ("src", "dst", "preserve_symlinks")),
+    SnapshotOperation: ("S", ("src", "dst", "link_dest")),
+    ArchiveOperation: ("A", ("src", "dst", "compression", "max_bytes", "max_files")),
+    ExtractArchiveOperation: ("E", ("archive", "member", "dst")),
+    RemoveOperation: ("X", ("target",)),
+    MkdirOperation: ("M", ("path",)),
+    UnfoldOperation: ("U", ("target", "src_dir", "entries")),
+}
+_OP_CLASSES = {code: cls for cls, (code, _) in _OP_CODES.items()}
+# 不是路径的参数，按原样记录
+_PLAIN_ATTRS = {"preserve_symlinks", "compression", "max_bytes", "max_files", "member", "entries"}
+
+class Journal:
+    """
+    操作计划的预写日志。
+    首行记录整个计划，之后每个操作追加 "S <序号> [撤销信息]"（执行前）和 "D <序号>"（执行后），
+    执行过程中新建的目录记录为 "M <路径>"，计划完成时写入 "C"，回滚后写入 "R"。
+    用于中断后的 resume 和 rollback，无需重新扫描。
+    """
+    def __init__(self, path: Path, operations: List[Operation], roots: Dict[str, str]):
+        """初始化日志对象（使用 create() 或 load() 获取实例）。"""
+        self.path = path
+        self.operations = operations
+        self.roots = roots
+        self.started: Dict[int, Optional[dict]] = {}
+        self.done: Set[int] = set()
+        self.created_dirs: List[Path] = []
+        self.status = "pending"
+        self._fh = None
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def journal_dir(config) -> Path:
+        """日志目录（位于缓存目录下）。"""
+        return Path(config.cache_dir) / "journal"
+
+    @staticmethod
+    def _prefix(config) -> str:
+        key = f"{config.dotfiles_dir.resolve()}\0{config.target_root.resolve()}"
+        return hashlib.blake2b(key.encode("utf-8"), digest_size=8).hexdigest()
+
+    @classmethod
+    def create(cls, config, plan: OperationPlan) -> "Journal":
+        """为即将执行的计划创建新日志，并同步写入计划本身。"""
+        directory = cls.journal_dir(config)
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / f"{cls._prefix(config)}-{time.time_ns()}.jnl"
+        # 路径前缀表：目标根目录与 dotfiles 目录下的路径只记录相对部分
+        roots = {"~": str(config.target_root), "@": str(config.dotfiles_dir)}
+        journal = cls(path, list(plan.operations), roots)
+
+        header = {"roots": roots, "ops": [journal._encode_op(op) for op in journal.operations]}
+        journal._fh = open(path, "a", encoding="utf-8")
+        journal._fh.write(f"{MAGIC} {json.dumps(header, separators=(',', ':'))}\n")
+        journal._sync()
+        cls._prune(config)
+        return journal
+
+    @classmethod
+    def load(cls, path: Path) -> "Journal":
+        """读取日志文件；末尾被截断的记录会被忽略。"""
+        with open(path, "r", encoding="utf-8") as f:
+            first = f.readline()
+            if not first.startswith(MAGIC + " "):
+                raise ValueError(f"Not a journal file / 不是日志文件: {path}")
+            header = json.loads(first[len(MAGIC) + 1:])
+            journal = cls(path, [], header["roots"])
+            journal.operations = [journal._decode_op(rec) for rec in header["ops"]]
+            for line in f:
+                if not line.endswith("\n"):
+                    break
+                kind, _, rest = line.rstrip("\n").partition(" ")
+                if kind == "S":
+                    index, _, info = rest.partition(" ")
+                    # resume 时重新开始的操作不会覆盖第一次记录的撤销信息（旧版日志可能有重复记录）
+                    if journal.started.get(int(index)) is None:
+                        journal.started[int(index)] = json.loads(info) if info else None
+                elif kind == "D":
+                    journal.done.add(int(rest))
+                elif kind == "M":
+                    journal.created_dirs.append(journal._decode_path(rest))
+                elif kind == "C":
+                    journal.status = "committed"
+                elif kind == "R":
+                    journal.status = "rolled_back"
+        return journal
+
+    @classmethod
+    def latest(cls, config, pending_only: bool = False) -> Optional["Journal"]:
+        """返回当前配置最近一次尚未回滚的日志；pending_only=True 时只返回未完成的。"""
+        directory = cls.journal_dir(config)
+        if not directory.exists():
+            return None
+        paths = sorted(directory.glob(f"{cls._prefix(config)}-*.jnl"), reverse=True)
+        for path in paths:
+            try:
+                journal = cls.load(path)
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning(f"Skipping unreadable journal {path} / 跳过无法读取的日志: {e}")
+                continue
+            if journal.status == "rolled_back":
+                continue
+            if pending_only and journal.status != "pending":
+                return None
+            return journal
+        return None
+
+    @classmethod
+    def _prune(cls, config) -> None:
+        """只保留最近的若干个日志。"""
+        paths = sorted(cls.journal_dir(config).glob(f"{cls._prefix(config)}-*.jnl"), reverse=True)
+        for path in paths[KEEP_JOURNALS:]:
+            try:
+                path.unlink()
+            except OSError:
+                pass
+
+    def plan(self) -> OperationPlan:
+        """返回日志中记录的完整计划。"""
+        return OperationPlan(list(self.operations))
+
+    def remaining(self) -> OperationPlan:
+        """返回尚未完成的操作组成的计划。"""
+        return OperationPlan([op for i, op in enumerate(self.operations) if i not in self.done])
+
+    def is_done(self, index: int) -> bool:
+        """该操作是否已完成。"""
+        return index in self.done
+
+    def record_dirs(self, dirs: List[Path]) -> None:
+        """记录即将被创建的目录（含不存在的祖先），回滚时若为空则删除。"""
+        missing = []
+        for directory in dirs:
+            while not directory.exists() and directory != directory.parent:
+                missing.append(directory)
+                directory = directory.parent
+        if not missing:
+            return
+        with self._lock:
+            known = set(self.created_dirs)
+            for directory in missing:
+                if directory not in known:
+                    known.add(directory)
+                    self.created_dirs.append(directory)
+                    self._write(f"M {self._encode_path(directory)}\n")
+
+    def begin(self, index: int, op: Operation) -> None:
+        """
+        在执行操作前记录；带有撤销信息的记录立即同步落盘。
+        resume 时已开始但未完成的操作可能已经产生了效果，此时保留第一次的撤销信息，不再重新快照。
+        """
+        with self._lock:
+            if index in self.started:
+                return
+        info = op.snapshot()
+        with self._lock:
+            self.started[index] = info
+            if info is None:
+                self._write(f"S {index}\n")
+            else:
+                self._write(f"S {index} {json.dumps(info, separators=(',', ':'))}\n", sync=True)
+
+    def finish(self, index: int) -> None:
+        """在操作完成后记录。"""
+        with self._lock:
+            self.done.add(index)
+            self._write(f"D {index}\n")
+
+    def commit(self) -> None:
+        """标记计划已全部完成并关闭日志。"""
+        with self._lock:
+            self.status = "committed"
+            self._write("C\n", sync=True)
+            self._close()
+
+    def close(self) -> None:
+        """同步并关闭日志（计划未完成时保留为 pending，可 resume 或 rollback）。"""
+        with self._lock:
+            self._close()
+
+    def rollback(self, dry_run: bool = True) -> List[str]:
+        """
+        按相反顺序撤销已开始的操作。
+        无法撤销的操作记录为错误并继续处理其余操作。
+        """
+        logs = []
+        for index in sorted(self.started, reverse=True):
+            op = self.operations[index]
+            if dry_run:
+                msg = f"[DRY-RUN] [UNDO] {op.description}"
+                logs.append(msg)
+                logger.info(msg)
+                continue
+            try:
+                msg = f"[UNDO] {op.description}"
+                logs.append(msg)
+                logger.info(msg)
+                op.undo(self.started[index])
+            except Exception as e:
+                error_msg = f"Failed to undo {op.description} / 撤销 {op.description} 失败: {e}"
+                logger.error(error_msg)
+                logs.append(f"[ERROR] {error_msg}")
+        if not dry_run:
+            # 删除执行时新建、现在已为空的目录（由深到浅）
+            for directory in sorted(self.created_dirs, key=lambda d: len(d.parts), reverse=True):
+                try:
+                    directory.rmdir()
+                except OSError:
+                    pass
+            with self._lock:
+                self.status = "rolled_back"
+                self._write("R\n", sync=True)
+                self._close()
+        return logs
+
+    def _write(self, record: str, sync: bool = False) -> None:
+        if self._fh is None:
+            self._fh = open(self.path, "a", encoding="utf-8")
+        self._fh.write(record)
+        self._pending += 1
+        if sync or self._pending >= SYNC_EVERY:
+            self._sync()
+
+    def _sync(self) -> None:
+        self._fh.flush()
+        os.fsync(self._fh.fileno())
+        self._pending = 0
+
+    def _close(self) -> None:
+        if self._fh is not None:
+            self._sync()
+            self._fh.close()
+            self._fh = None
+
+    def _encode_path(self, path: Path) -> str:
+        """用最长匹配的根目录前缀压缩路径。"""
+        text = str(path)
+        best = None
+        for key, root in self.roots.items():
+            if text.startswith(root + os.sep) and (best is None or len(root) > len(self.roots[best])):
+                best = key
+        return text if best is None else best + text[len(self.roots[best]):]
+
+    def _decode_path(self, text: str) -> Path:
+        root = self.roots.get(text[:1])
+        return Path(root + text[1:]) if root is not None else Path(text)
+
+    def _encode_op(self, op: Operation) -> list:
+        code, attrs = _OP_CODES[type(op)]
+        values = [getattr(op, attr) for attr in attrs]
+        return [code] + [self._encode_path(v) if isinstance(v, Path) else v for v in values]
+
+    def _decode_op(self, record: list) -> Operation:
+        cls = _OP_CLASSES[record[0]]
+        _, attrs = _OP_CODES[cls]
+        args = [self._decode_path(v) if isinstance(v, str) and attr not in _PLAIN_ATTRS else v
+                for attr, v in zip(attrs, record[1:])]
+        return cls(*args)
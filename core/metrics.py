@@ -0,0 +1,155 @@
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# 指标说明（Prometheus 的 HELP 行）与类型
+_HELP = {
+    "dotkeeper_metrics_enabled": ("gauge", "Whether detailed metrics collection is enabled (--profile)."),
+    "dotkeeper_phase_seconds_total": ("counter", "Cumulative wall time per phase (summed across threads)."),
+    "dotkeeper_phase_calls_total": ("counter", "Number of times each phase ran."),
+    "dotkeeper_syscalls_total": ("counter", "Filesystem calls by category."),
+    "dotkeeper_operations_total": ("counter", "Applied operations by type."),
+    "dotkeeper_copied_bytes_total": ("counter", "Bytes copied by CopyOperation."),
+    "dotkeeper_ignored_total": ("counter", "Entries skipped by ignore rules (ignored directories are not walked)."),
+    "dotkeeper_cache_requests_total": ("counter", "Cache lookups by cache and result."),
+    "dotkeeper_cache_hit_ratio": ("gauge", "Cache hits divided by lookups."),
+}
+
+_NULL = nullcontext()
+
+class Metrics:
+    """
+    进程内的性能指标（计数器与分阶段耗时）。
+    默认关闭：调用方在热点路径上先检查 enabled，关闭时除这一次属性读取外没有任何开销；
+    开启后（--profile）计数在锁内累加，可由 render() 输出为 Prometheus 文本格式。
+    """
+    def __init__(self):
+        """初始化（关闭状态）。"""
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._counters: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = {}
+        self._phases: Dict[str, List[float]] = {}
+
+    def enable(self, enabled: bool = True) -> None:
+        """开启或关闭采集。"""
+        self.enabled = enabled
+
+    def reset(self) -> None:
+        """清空已采集的数据。"""
+        with self._lock:
+            self._counters.clear()
+            self._phases.clear()
+
+    def inc(self, name: str, value: float = 1, **labels: str) -> None:
+        """累加计数器（调用方应先检查 enabled）。"""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def syscall(self, category: str, count: int = 1) -> None:
+        """按类别记录文件系统调用次数。"""
+        self.inc("dotkeeper_syscalls_total", count, category=category)
+
+    def cache(self, name: str, hit: bool) -> None:
+        """记录一次缓存查找的结果。"""
+        self.inc("dotkeeper_cache_requests_total", 1, cache=name, result="hit" if hit else "miss")
+
+    def phase(self, name: str):
+        """返回统计某阶段耗时的上下文管理器；未开启时返回共享的空上下文。"""
+        if not self.enabled:
+            return _NULL
+        return self._timed(name)
+
+    @contextmanager
+    def _timed(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                entry = self._phases.setdefault(name, [0, 0.0])
+                entry[0] += 1
+                entry[1] += elapsed
+
+    def phases(self) -> Dict[str, Tuple[int, float]]:
+        """返回 {阶段: (次数, 累计秒数)}。"""
+        with self._lock:
+            return {name: (int(count), seconds) for name, (count, seconds) in self._phases.items()}
+
+    def counters(self) -> Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float]:
+        """返回计数器快照。"""
+        with self._lock:
+            return dict(self._counters)
+
+    def render(self, caches: Optional[Dict[str, Tuple[int, int]]] = None) -> str:
+        """
+        以 Prometheus 文本格式输出所有指标。
+        caches 为 {缓存名: (命中, 未命中)}，用于合并其他组件自行维护的计数（例如 DiffCache）。
+        """
+        samples: Dict[str, List[Tuple[Dict[str, str], float]]] = {}
+
+        def add(name: str, labels: Dict[str, str], value: float) -> None:
+            samples.setdefault(name, []).append((labels, value))
+
+        add("dotkeeper_metrics_enabled", {}, 1 if self.enabled else 0)
+        for phase, (count, seconds) in sorted(self.phases().items()):
+            add("dotkeeper_phase_seconds_total", {"phase": phase}, seconds)
+            add("dotkeeper_phase_calls_total", {"phase": phase}, count)
+
+        lookups: Dict[str, List[int]] = {}
+        for (name, labels), value in sorted(self.counters().items()):
+            labels = dict(labels)
+            add(name, labels, value)
+            if name == "dotkeeper_cache_requests_total":
+                entry = lookups.setdefault(labels["cache"], [0, 0])
+                entry[0 if labels["result"] == "hit" else 1] += int(value)
+        for name, (hits, misses) in (caches or {}).items():
+            add("dotkeeper_cache_requests_total", {"cache": name, "result": "hit"}, hits)
+            add("dotkeeper_cache_requests_total", {"cache": name, "result": "miss"}, misses)
+            lookups[name] = [hits, misses]
+        for name, (hits, misses) in sorted(lookups.items()):
+            if hits + misses:
+                add("dotkeeper_cache_hit_ratio", {"cache": name}, hits / (hits + misses))
+
+        lines = []
+        for name, (kind, help_text) in _HELP.items():
+            if name not in samples:
+                continue
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples[name]:
+                label_text = ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items())
+                suffix = f"{{{label_text}}}" if label_text else ""
+                lines.append(f"{name}{suffix} {_format(value)}")
+        return "\n".join(lines) + "\n"
+
+    def report(self) -> List[str]:
+        """生成供 --profile 在命令行输出的可读摘要。"""
+        lines = ["Profile / 性能统计:"]
+        phases = self.phases()
+        if phases:
+            lines.append("  Phases / 阶段 (cumulative / 累计):")
+            for name, (count, seconds) in sorted(phases.items(), key=lambda item: -item[1][1]):
+                lines.append(f"    {name:<14} {seconds * 1000:10.2f} ms  x{count}")
+        groups: Dict[str, List[str]] = {}
+        for (name, labels), value in sorted(self.counters().items()):
+            label_text = ",".join(v for _, v in labels)
+            groups.setdefault(name, []).append(f"{label_text or 'total'}={_format(value)}")
+        for name, items in groups.items():
+            lines.append(f"  {name.replace('dotkeeper_', '')}: {'  '.join(items)}")
+        return lines
+
+def _escape(value: str) -> str:
+    """转义 Prometheus 标签值。"""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format(value: float) -> str:
+    """整数值不带小数点输出。"""
+    if float(value).is_integer():
+        return str(int(value))
+    return f"{value:.6f}"
+
+# 进程内共享的指标实例
+METRICS = Metrics()
@@ -1,7 +1,11 @@
+import os
+import sys
+from array import array
+from collections.abc import Sequence
 from enum import Enum
 from pathlib import Path
 from dataclasses import dataclass, field
-from typing import List
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 
 class FileState(Enum):
     """文件状态枚举。"""
@@ -10,30 +14,281 @@ class FileState(Enum):
     MISSING = "missing"     # 目标不存在
     ORPHAN = "orphan"       # 目标是损坏的链接或指向错误的源
 
-@dataclass
+# 状态在包的状态列中以小整数保存
+_STATES = list(FileState)
+_STATE_CODES = {state: code for code, state in enumerate(_STATES)}
+
 class Dotfile:
-    """单个 Dotfile 配置项。"""
-    source: Path           # ~/.dotfiles/package/... 中的文件
-    target: Path           # ~/... 中的目标路径
-    state: FileState = FileState.MISSING
+    """
+    单个 Dotfile 配置项。
+    直接创建时保存完整路径；从 Package.files 取得的是轻量视图，源路径、目标路径和状态按需从包的列中生成，
+    对 state 的赋值会写回包中。视图不应长期保存：包的 files 被整体替换后视图不再有效。
+    """
+    __slots__ = ("_package", "_index", "_source", "_target", "_state")
+
+    def __init__(self, source: Path, target: Path, state: FileState = FileState.MISSING):
+        self._package = None
+        self._index = -1
+        self._source = source  # ~/.dotfiles/package/... 中的文件
+        self._target = target  # ~/... 中的目标路径
+        self._state = state
+
+    @classmethod
+    def _view(cls, package: "Package", index: int) -> "Dotfile":
+        """包中第 index 个文件的视图。"""
+        view = cls.__new__(cls)
+        view._package = package
+        view._index = index
+        view._source = view._target = None
+        return view
+
+    @property
+    def source(self) -> Path:
+        # 视图第一次访问时生成路径并保存在视图上，同一视图的多次访问共用同一个 Path
+        if self._source is None:
+            self._source = self._package.source_of(self._index)
+        return self._source
+
+    @property
+    def target(self) -> Path:
+        if self._target is None:
+            self._target = self._package.target_of(self._index)
+        return self._target
+
+    @property
+    def state(self) -> FileState:
+        if self._package is None:
+            return self._state
+        return _STATES[self._package._states[self._index]]
+
+    @state.setter
+    def state(self, value: FileState) -> None:
+        if self._package is None:
+            self._state = value
+        else:
+            self._package._states[self._index] = _STATE_CODES[value]
+
+    @property
+    def rel_path(self) -> str:
+        """相对于包根目录的路径（'/' 分隔）。"""
+        if self._package is None:
+            return self._source.name
+        return self._package.rel_of(self._index)
 
     @property
     def relative_source_path(self) -> Path:
         """返回相对于包根目录的路径。"""
         return self.source
 
-@dataclass
+    def __eq__(self, other):
+        if not isinstance(other, Dotfile):
+            return NotImplemented
+        return (self.source, self.target, self.state) == (other.source, other.target, other.state)
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return f"Dotfile(source={self.source!r}, target={self.target!r}, state={self.state})"
+
+class FileList(Sequence):
+    """Package.files：按需生成 Dotfile 视图的只读序列（另支持 append / extend）。"""
+    __slots__ = ("_package",)
+
+    def __init__(self, package: "Package"):
+        self._package = package
+
+    def __len__(self) -> int:
+        return len(self._package._states)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [Dotfile._view(self._package, i) for i in range(len(self))[index]]
+        count = len(self)
+        if index < 0:
+            index += count
+        if not 0 <= index < count:
+            raise IndexError("file index out of range")
+        return Dotfile._view(self._package, index)
+
+    def __iter__(self) -> Iterator[Dotfile]:
+        package = self._package
+        for index in range(len(package._states)):
+            yield Dotfile._view(package, index)
+
+    def __eq__(self, other):
+        if isinstance(other, (FileList, list)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def append(self, dotfile: Dotfile) -> None:
+        self._package._add(dotfile)
+
+    def extend(self, dotfiles: Iterable[Dotfile]) -> None:
+        for dotfile in dotfiles:
+            self._package._add(dotfile)
+
+    def __repr__(self) -> str:
+        return repr(list(self))
+
 class Package:
-    """Dotfile 包模型。"""
-    name: str
-    root: Path             # ~/.dotfiles/<name>
-    files: List[Dotfile] = field(default_factory=list)
-    is_installed: bool = False
+    """
+    Dotfile 包模型。
+    文件以列的形式保存：包内相对目录（每个目录一份）、驻留（intern）的文件名、所在目录的下标，
+    以及 array 保存的状态码；源路径与目标路径由包根目录和目标根目录按需拼出。
+    files 返回这些列上的 Dotfile 视图，接口与原先的列表一致。
+    """
+    __slots__ = ("name", "root", "target_root", "is_installed", "_dirs", "_dir_index", "_dir_ids", "_names",
+                 "_states", "_paths")
+
+    def __init__(self, name: str, root: Path, files: Optional[Iterable[Dotfile]] = None,
+                 is_installed: bool = False, target_root: Optional[Path] = None):
+        self.name = name
+        self.root = root                 # ~/.dotfiles/<name>
+        self.target_root = target_root   # 为 None 时由第一个加入的文件推断
+        self.is_installed = is_installed
+        self._dirs: List[str] = []
+        self._dir_index: Dict[str, int] = {}
+        self._dir_ids = array("I")
+        self._names: List[str] = []
+        self._states = array("B")
+        # 不符合 根目录/相对路径 规律的文件（直接构造的 Dotfile）：下标 -> (源路径, 目标路径)
+        self._paths: Optional[Dict[int, Tuple[Path, Path]]] = None
+        if files:
+            self.files.extend(files)
+
+    @classmethod
+    def from_dirs(cls, name: str, root: Path, target_root: Path,
+                  dirs: Iterable[Tuple[str, List[str], List[FileState]]],
+                  is_installed: bool = False) -> "Package":
+        """由扫描结果 [(包内相对目录, 文件名列表, 状态列表), ...] 直接构建，不创建任何 Dotfile 对象。"""
+        package = cls(name, root, is_installed=is_installed, target_root=target_root)
+        for rel_dir, names, states in dirs:
+            package.add_dir(rel_dir, names, states)
+        return package
+
+    def add_dir(self, rel_dir: str, names: List[str], states: List[FileState]) -> None:
+        """追加同一目录（包内相对路径，根目录为 ''）下的一批文件。"""
+        rel_dir = "" if rel_dir == "." else rel_dir
+        dir_id = self._dir_index.get(rel_dir)
+        if dir_id is None:
+            dir_id = self._dir_index[rel_dir] = len(self._dirs)
+            self._dirs.append(sys.intern(rel_dir))
+        self._names.extend(sys.intern(name) for name in names)
+        self._dir_ids.extend([dir_id] * len(names))
+        self._states.extend(_STATE_CODES[state] for state in states)
+
+    def _add(self, dotfile: Dotfile) -> None:
+        """追加一个 Dotfile（复制其路径与状态）。"""
+        source, target = Path(dotfile.source), Path(dotfile.target)
+        try:
+            rel = source.relative_to(self.root)
+        except ValueError:
+            rel = None
+        if rel is not None and self.target_root is None and rel.parts:
+            self.target_root = Path(*target.parts[:len(target.parts) - len(rel.parts)])
+        index = len(self._states)
+        parent = rel.parent.as_posix() if rel is not None else ""
+        self.add_dir(parent, [source.name], [dotfile.state])
+        if rel is None or self.target_root is None or target != self.target_root / rel:
+            if self._paths is None:
+                self._paths = {}
+            self._paths[index] = (source, target)
+
+    @property
+    def files(self) -> FileList:
+        return FileList(self)
+
+    @files.setter
+    def files(self, files: Iterable[Dotfile]) -> None:
+        files = list(files)
+        self._dirs, self._dir_index, self._names, self._paths = [], {}, [], None
+        self._dir_ids, self._states = array("I"), array("B")
+        self.files.extend(files)
+
+    def rel_of(self, index: int) -> str:
+        """第 index 个文件相对于包根目录的路径。"""
+        rel_dir = self._dirs[self._dir_ids[index]]
+        return f"{rel_dir}/{self._names[index]}" if rel_dir else self._names[index]
+
+    def source_of(self, index: int) -> Path:
+        if self._paths is not None and index in self._paths:
+            return self._paths[index][0]
+        return self.root / self.rel_of(index)
+
+    def target_of(self, index: int) -> Path:
+        if self._paths is not None and index in self._paths:
+            return self._paths[index][1]
+        return self.target_root / self.rel_of(index)
+
+    def dirs(self) -> List[str]:
+        """扫描到的包内目录（相对于包根目录，根目录为 ''）。"""
+        return list(self._dirs)
+
+    def target_dirs(self) -> Iterator[Tuple[str, str]]:
+        """
+        生成 (目标目录, 包内相对目录)：每个扫描到的目录一项，不创建 Dotfile 视图；
+        逐个构造、目标不符合 目标根目录/相对路径 规律的文件按各自的目标路径另外生成。
+        """
+        if self.target_root is not None:
+            target_root = os.fspath(self.target_root)
+            for rel_dir in self._dirs:
+                yield (os.path.join(target_root, rel_dir) if rel_dir else target_root), rel_dir
+        if self._paths is not None:
+            for index, (_, target) in self._paths.items():
+                yield os.path.dirname(os.fspath(target)), self._dirs[self._dir_ids[index]]
+
+    def files_in_dirs(self, rel_dirs: Iterable[str]) -> Iterator[Dotfile]:
+        """rel_dirs（包内相对目录）中直接包含的文件的视图。"""
+        ids = {self._dir_index[d] for d in rel_dirs if d in self._dir_index}
+        if not ids:
+            return
+        for index, dir_id in enumerate(self._dir_ids):
+            if dir_id in ids:
+                yield Dotfile._view(self, index)
+
+    def entries(self) -> Iterator[Tuple[str, FileState]]:
+        """按顺序生成 (包内相对路径, 状态)，不创建 Dotfile 视图。"""
+        for index, code in enumerate(self._states):
+            yield self.rel_of(index), _STATES[code]
+
+    def state_counts(self) -> Dict[FileState, int]:
+        """各状态的文件数（只包含出现过的状态）。"""
+        return {state: count for state in _STATES if (count := self._states.count(_STATE_CODES[state]))}
 
     @property
     def status(self) -> str:
         """获取包状态摘要。"""
-        if not self.files:
+        if not self._states:
             return "empty"
         # Simple summary logic
         return "present"
+
+    def __eq__(self, other):
+        if not isinstance(other, Package):
+            return NotImplemented
+        return ((self.name, self.root, self.is_installed, list(self.files))
+                == (other.name, other.root, other.is_installed, list(other.files)))
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return f"Package(name={self.name!r}, root={self.root!r}, files=<{len(self._states)} files>, is_installed={self.is_installed})"
+
+@dataclass
+class SyncResult:
+    """git pull 的结果及其引入的变更。"""
+    ok: bool
+    logs: List[str] = field(default_factory=list)
+    before: Optional[str] = None           # pull 前的 HEAD
+    after: Optional[str] = None            # pull 后的 HEAD
+    changes: List[Tuple[str, str]] = field(default_factory=list)   # (git 状态字母, 仓库内相对路径)
+    full: bool = False                     # 无法确定变更范围，需要全量重新扫描
+
+    def package_changes(self) -> Dict[str, List[Tuple[str, str]]]:
+        """按包分组的变更：包名 -> [(状态, 包内相对路径)]；仓库顶层文件和隐藏目录不属于任何包。"""
+        packages: Dict[str, List[Tuple[str, str]]] = {}
+        for status, path in self.changes:
+            name, sep, rel = path.partition('/')
+            if sep and not name.startswith('.'):
+                packages.setdefault(name, []).append((status, rel))
+        return packages
@@ -1,15 +1,66 @@
 from abc import ABC, abstractmethod
 from pathlib import Path
+from typing import List, Optional
 import shutil
 import os
+import time
 import logging
 
+from .backup import (manifest_path, read_manifest, write_manifest, file_signature, read_history,
+                     write_history, same_entry, BackupStore, ArchiveWriter, archive_index_path,
+                     extract_archive_member, ARCHIVE_INDEX_SUFFIX)
+from .metrics import METRICS
+
 logger = logging.getLogger(__name__)
 
+def _link_text(path: Path) -> Optional[str]:
+    """path 是软链接时返回其内容，否则返回 None。"""
+    try:
+        return os.readlink(path)
+    except OSError:
+        return None
+
+def _counting_copy(src, dst):
+    """shutil.copy2，并记录复制次数与字节数（仅在开启指标采集时使用）。"""
+    result = shutil.copy2(src, dst)
+    METRICS.syscall("copy")
+    METRICS.inc("dotkeeper_copied_bytes_total", os.lstat(result).st_size)
+    return result
+
+def _link_tree(path: Path) -> Optional[dict]:
+    """
+    path 是只由软链接（及同样只含软链接的子目录）组成的目录时，返回 {"dirs": [...], "links": {相对路径: 链接内容}}，
+    用于撤销时重建；其中有真实文件时返回 None。
+    """
+    dirs, links = [], {}
+    for root, subdirs, files in os.walk(path):
+        rel_root = os.path.relpath(root, path)
+        for name in list(subdirs):
+            if os.path.islink(os.path.join(root, name)):
+                subdirs.remove(name)
+                files.append(name)
+            else:
+                dirs.append(os.path.normpath(os.path.join(rel_root, name)))
+        for name in files:
+            full = os.path.join(root, name)
+            if not os.path.islink(full):
+                return None
+            links[os.path.normpath(os.path.join(rel_root, name))] = os.readlink(full)
+    return {"dirs": dirs, "links": links}
+
+def _remove_path(path: Path) -> None:
+    """删除文件、软链接或目录。"""
+    if path.is_symlink() or not path.is_dir():
+        os.unlink(path)
+    else:
+        shutil.rmtree(path)
+
 class Operation(ABC):
     """抽象操作基类。"""
     def __init__(self, description: str):
         self.description = description
+        # 由执行器预先创建父目录时置为 True，操作本身不再重复 mkdir
+        self.parents_ready = False
 
     @abstractmethod
     def dry_run(self) -> str:
@@ -21,42 +72,197 @@ class Operation(ABC):
         """执行操作。"""
         pass
 
+    def affected_paths(self) -> List[Path]:
+        """返回该操作会修改的目标路径（用于缓存失效等）。"""
+        return []
+
+    def parent_dirs(self) -> List[Path]:
+        """返回执行前必须存在的父目录。"""
+        return []
+
+    def snapshot(self) -> Optional[dict]:
+        """
+        在执行前记录撤销所需的信息（写入日志）。
+        返回 None 表示该操作不会破坏现有内容；非空结果会在执行前被同步落盘。
+        """
+        return None
+
+    def undo(self, info: Optional[dict]) -> None:
+        """根据 snapshot() 的结果撤销操作；无法撤销时抛出 RuntimeError。"""
+        raise RuntimeError(f"Cannot undo: {self.description} / 无法撤销: {self.description}")
+
+    def ensure_parent(self, path: Path) -> None:
+        """确保 path 的父目录存在（执行器已创建时跳过）。"""
+        if not self.parents_ready:
+            path.parent.mkdir(parents=True, exist_ok=True)
+
 class BackupOperation(Operation):
-    """备份操作。"""
-    def __init__(self, target: Path, backup_path: Path):
+    """
+    备份操作。
+    指定 store_root 时，目标内容移入内容寻址的对象库，并在 backup_path 对应的清单中追加一条历史；
+    否则沿用旧方式：移动到 backup_path，并把已有备份轮转为 <name>.<timestamp>。
+    """
+    def __init__(self, target: Path, backup_path: Path, store_root: Optional[Path] = None):
         super().__init__(f"Backup {target} to {backup_path} / 备份 {target} 到 {backup_path}")
         self.target = target
         self.backup_path = backup_path
+        self.store_root = store_root
+        # snapshot() 预先确定的轮转路径，保证撤销时能找到
+        self._archive: Optional[Path] = None
 
     def dry_run(self) -> str:
+        if self.store_root is not None:
+            return f"[BACKUP] Store '{self.target}' in '{self.store_root}' (manifest '{manifest_path(self.backup_path)}') / 将 '{self.target}' 存入 '{self.store_root}' (清单 '{manifest_path(self.backup_path)}')"
         return f"[BACKUP] Move '{self.target}' to '{self.backup_path}' / 移动 '{self.target}' 到 '{self.backup_path}'"
 
+    def affected_paths(self) -> List[Path]:
+        if self.store_root is not None:
+            return [self.target, manifest_path(self.backup_path)]
+        return [self.target, self.backup_path]
+
+    def parent_dirs(self) -> List[Path]:
+        return [self.backup_path.parent]
+
+    def snapshot(self) -> Optional[dict]:
+        if self.store_root is not None:
+            return {"entries": len(read_history(self.backup_path))}
+        if self.backup_path.exists() or self.backup_path.is_symlink():
+            self._archive = self._archive_path()
+            return {"archive": str(self._archive)}
+        return None
+
+    def undo(self, info: Optional[dict]) -> None:
+        if self.store_root is not None:
+            history = read_history(self.backup_path)
+            if info is None or len(history) <= info["entries"]:
+                return
+            entry = history[-1]
+            if not (self.target.exists() or self.target.is_symlink()):
+                self.target.parent.mkdir(parents=True, exist_ok=True)
+                BackupStore.at(self.store_root).restore(entry, self.target)
+            write_history(self.backup_path, history[:-1])
+            return
+        # 目标仍在原处说明移动尚未发生
+        if not (self.target.exists() or self.target.is_symlink()):
+            if self.backup_path.exists() or self.backup_path.is_symlink():
+                self.target.parent.mkdir(parents=True, exist_ok=True)
+                shutil.move(self.backup_path, self.target)
+        if info and info.get("archive"):
+            archive_path = Path(info["archive"])
+            backup_present = self.backup_path.exists() or self.backup_path.is_symlink()
+            if not backup_present and (archive_path.exists() or archive_path.is_symlink()):
+                shutil.move(archive_path, self.backup_path)
+
+    def _archive_path(self) -> Path:
+        """轮转旧备份的目标路径；同一秒内多次轮转时追加序号避免冲突。"""
+        timestamp = int(time.time())
+        archive_path = self.backup_path.with_name(f"{self.backup_path.name}.{timestamp}")
+        counter = 1
+        while archive_path.exists() or archive_path.is_symlink():
+            archive_path = self.backup_path.with_name(f"{self.backup_path.name}.{timestamp}.{counter}")
+            counter += 1
+        return archive_path
+
     def apply(self) -> None:
         if self.target.exists() or self.target.is_symlink():
-            self.backup_path.parent.mkdir(parents=True, exist_ok=True)
+            self.ensure_parent(self.backup_path)
+
+            if METRICS.enabled:
+                METRICS.syscall("move")
+            if self.store_root is not None:
+                entry = BackupStore.at(self.store_root).store(self.target)
+                entry["time"] = int(time.time())
+                history = read_history(self.backup_path)
+                history.append(entry)
+                write_history(self.backup_path, history)
+                return
             
-            if self.backup_path.exists():
+            if self.backup_path.exists() or self.backup_path.is_symlink():
                 # 轮转现有备份
-                import time
-                timestamp = int(time.time())
-                archive_path = self.backup_path.with_name(f"{self.backup_path.name}.{timestamp}")
-                shutil.move(self.backup_path, archive_path)
+                shutil.move(self.backup_path, self._archive or self._archive_path())
             
             shutil.move(self.target, self.backup_path)
 
 class RestoreBackupOperation(Operation):
-    """恢复备份操作。"""
-    def __init__(self, target: Path, backup_path: Path):
+    """
+    恢复备份操作。
+    指定 store_root 且清单中有历史时，从对象库恢复最近一条并将其移出清单；
+    否则移动 backup_path 处的旧式备份。
+    """
+    def __init__(self, target: Path, backup_path: Path, store_root: Optional[Path] = None):
         super().__init__(f"Restore {target} from {backup_path} / 从 {backup_path} 恢复 {target}")
         self.target = target
         self.backup_path = backup_path
+        self.store_root = store_root
+
+    def _latest_entry(self) -> Optional[dict]:
+        if self.store_root is None:
+            return None
+        history = read_history(self.backup_path)
+        return history[-1] if history else None
 
     def dry_run(self) -> str:
+        if self._latest_entry() is not None:
+            return f"[RESTORE] Restore '{self.target}' from '{self.store_root}' (manifest '{manifest_path(self.backup_path)}') / 从 '{self.store_root}' 恢复 '{self.target}' (清单 '{manifest_path(self.backup_path)}')"
         if self.backup_path.exists():
             return f"[RESTORE] Move '{self.backup_path}' to '{self.target}' / 移动 '{self.backup_path}' 到 '{self.target}'"
         return f"[RESTORE] No backup found at '{self.backup_path}' (Skipping) / 未在 '{self.backup_path}' 找到备份 (跳过)"
 
+    def affected_paths(self) -> List[Path]:
+        if self.store_root is not None:
+            return [self.target, self.backup_path, manifest_path(self.backup_path)]
+        return [self.target, self.backup_path]
+
+    def parent_dirs(self) -> List[Path]:
+        return [self.target.parent]
+
+    def snapshot(self) -> Optional[dict]:
+        entry = self._latest_entry()
+        if entry is None and not self.backup_path.exists():
+            return None
+        info = {} if entry is None else {"entry": entry}
+        if self.target.is_symlink():
+            info["link"] = _link_text(self.target)
+        elif self.target.exists():
+            info["lost"] = True
+        return info
+
+    def undo(self, info: Optional[dict]) -> None:
+        if info is None:
+            return
+        entry = info.get("entry")
+        if entry is not None:
+            # 把恢复出的内容重新存回对象库，并补回清单条目
+            if self.target.exists() or self.target.is_symlink():
+                BackupStore.at(self.store_root).store(self.target)
+            history = read_history(self.backup_path)
+            # 清单尚未更新时（执行中断），条目仍在末尾
+            if not history or not same_entry(history[-1], entry):
+                history.append(entry)
+                write_history(self.backup_path, history)
+        elif (self.target.exists() or self.target.is_symlink()) and not self.backup_path.exists():
+            self.backup_path.parent.mkdir(parents=True, exist_ok=True)
+            shutil.move(self.target, self.backup_path)
+        if info.get("link"):
+            os.symlink(info["link"], self.target)
+        elif info.get("lost"):
+            raise RuntimeError(f"Overwritten content of {self.target} cannot be recovered / {self.target} 被覆盖的内容无法恢复")
+
     def apply(self) -> None:
+        entry = self._latest_entry()
+        if entry is not None:
+            store = BackupStore.at(self.store_root)
+            # 中断后重复执行时目标可能已经恢复，此时只需更新清单
+            if not store.matches(entry, self.target):
+                if self.target.exists() or self.target.is_symlink():
+                    _remove_path(self.target)
+                self.ensure_parent(self.target)
+                if METRICS.enabled:
+                    METRICS.syscall("move")
+                store.restore(entry, self.target)
+            write_history(self.backup_path, read_history(self.backup_path)[:-1])
+            return
+
         if self.backup_path.exists():
             # 目标应该已经清除，但做安全检查
             if self.target.exists() or self.target.is_symlink():
@@ -65,7 +271,9 @@ class RestoreBackupOperation(Operation):
                 else:
                     os.unlink(self.target)
             
-            self.target.parent.mkdir(parents=True, exist_ok=True)
+            self.ensure_parent(self.target)
+            if METRICS.enabled:
+                METRICS.syscall("move")
             shutil.move(self.backup_path, self.target)
             
             # 清理空备份目录？可选。
@@ -81,6 +289,22 @@ class SymlinkOperation(Operation):
     def dry_run(self) -> str:
         return f"[LINK] Create symlink '{self.dst}' -> '{self.src}' / 创建软链接 '{self.dst}' -> '{self.src}'"
 
+    def affected_paths(self) -> List[Path]:
+        return [self.dst]
+
+    def parent_dirs(self) -> List[Path]:
+        return [self.dst.parent]
+
+    def snapshot(self) -> Optional[dict]:
+        link = _link_text(self.dst)
+        return {"link": link} if link is not None else None
+
+    def undo(self, info: Optional[dict]) -> None:
+        if self.dst.is_symlink():
+            os.unlink(self.dst)
+        if info and info.get("link"):
+            os.symlink(info["link"], self.dst)
+
     def apply(self) -> None:
         if self.dst.exists() or self.dst.is_symlink():
             if self.dst.is_symlink():
@@ -88,8 +312,10 @@ class SymlinkOperation(Operation):
             else:
                  raise FileExistsError(f"Target {self.dst} still exists. Backup failed or not scheduled?")
         
-        self.dst.parent.mkdir(parents=True, exist_ok=True)
+        self.ensure_parent(self.dst)
         
+        if METRICS.enabled:
+            METRICS.syscall("symlink")
         try:
             target_dir = self.dst.parent
             rel_src = os.path.relpath(self.src, target_dir)
@@ -109,12 +335,182 @@ class CopyOperation(Operation):
     def dry_run(self) -> str:
         return f"[COPY] Materialize '{self.src}' to '{self.dst}' / 实体化 '{self.src}' 到 '{self.dst}'"
 
+    def affected_paths(self) -> List[Path]:
+        return [self.dst]
+
+    def parent_dirs(self) -> List[Path]:
+        return [self.dst.parent]
+
+    def snapshot(self) -> Optional[dict]:
+        return {"existed": True} if self.dst.exists() or self.dst.is_symlink() else None
+
+    def undo(self, info: Optional[dict]) -> None:
+        if info and info.get("existed"):
+            raise RuntimeError(f"Cannot undo copy into existing {self.dst} / 无法撤销对已存在的 {self.dst} 的复制")
+        if self.dst.exists() or self.dst.is_symlink():
+            _remove_path(self.dst)
+
     def apply(self) -> None:
-        self.dst.parent.mkdir(parents=True, exist_ok=True)
+        self.ensure_parent(self.dst)
+        copy = _counting_copy if METRICS.enabled else shutil.copy2
         if self.src.is_dir():
-            shutil.copytree(self.src, self.dst, dirs_exist_ok=True, symlinks=self.preserve_symlinks)
+            shutil.copytree(self.src, self.dst, dirs_exist_ok=True, symlinks=self.preserve_symlinks,
+                            copy_function=copy)
         else:
-            shutil.copy2(self.src, self.dst)
+            copy(self.src, self.dst)
+
+class SnapshotOperation(Operation):
+    """
+    增量快照操作（类似 rsync --link-dest）。
+    与上一个快照清单中大小、mtime 和 inode 都相同的文件以硬链接方式复用，只复制变化的文件；
+    完成后写入本快照的清单。
+    """
+    def __init__(self, src: Path, dst: Path, link_dest: Optional[Path] = None):
+        super().__init__(f"Snapshot {src} to {dst} / 快照 {src} 到 {dst}")
+        self.src = src
+        self.dst = dst
+        self.link_dest = link_dest
+        self.linked = 0
+        self.copied = 0
+
+    def dry_run(self) -> str:
+        if self.link_dest is not None:
+            return f"[SNAPSHOT] Snapshot '{self.src}' to '{self.dst}', hard-linking unchanged files from '{self.link_dest}' / 快照 '{self.src}' 到 '{self.dst}'，未变化的文件硬链接自 '{self.link_dest}'"
+        return f"[SNAPSHOT] Snapshot '{self.src}' to '{self.dst}' (no previous snapshot, full copy) / 快照 '{self.src}' 到 '{self.dst}' (无上一个快照，完整复制)"
+
+    def affected_paths(self) -> List[Path]:
+        return [self.dst, manifest_path(self.dst)]
+
+    def parent_dirs(self) -> List[Path]:
+        return [self.dst.parent]
+
+    def snapshot(self) -> Optional[dict]:
+        return {"existed": True} if self.dst.exists() or self.dst.is_symlink() else None
+
+    def undo(self, info: Optional[dict]) -> None:
+        if info and info.get("existed"):
+            raise RuntimeError(f"Cannot undo snapshot into existing {self.dst} / 无法撤销对已存在的 {self.dst} 的快照")
+        for path in (manifest_path(self.dst), self.dst):
+            if path.exists() or path.is_symlink():
+                _remove_path(path)
+
+    def apply(self) -> None:
+        self.ensure_parent(self.dst)
+        previous = read_manifest(self.link_dest) if self.link_dest is not None else None
+        files = {}
+        self.linked = self.copied = 0
+        self._copy_tree(self.src, self.dst, "", previous or {}, files)
+        write_manifest(self.dst, files)
+        logger.info(f"Snapshot: {self.linked} hard-linked, {self.copied} copied / 快照: 硬链接 {self.linked} 个，复制 {self.copied} 个")
+
+    def _copy_tree(self, src_dir: Path, dst_dir: Path, rel_dir: str, previous: dict, files: dict) -> None:
+        dst_dir.mkdir(exist_ok=True)
+        with os.scandir(src_dir) as it:
+            entries = sorted(it, key=lambda e: e.name)
+        for entry in entries:
+            rel = rel_dir + entry.name
+            dst = dst_dir / entry.name
+            if not entry.is_dir(follow_symlinks=False) and os.path.lexists(dst):
+                # 中断后 resume 时残留的部分快照
+                os.unlink(dst)
+            if entry.is_symlink():
+                os.symlink(os.readlink(entry.path), dst)
+            elif entry.is_dir():
+                self._copy_tree(Path(entry.path), dst, rel + "/", previous, files)
+            elif entry.is_file():
+                sig = file_signature(entry.stat())
+                files[rel] = sig
+                if previous.get(rel) == sig:
+                    try:
+                        os.link(self.link_dest / rel, dst)
+                        self.linked += 1
+                        continue
+                    except OSError:
+                        # 旧快照中的文件已丢失或不在同一文件系统，退回复制
+                        pass
+                shutil.copy2(entry.path, dst)
+                self.copied += 1
+        shutil.copystat(src_dir, dst_dir)
+
+class ArchiveOperation(Operation):
+    """把目录流式打包为压缩 tar 归档（可按大小或文件数分卷），并写入清单。"""
+    def __init__(self, src: Path, dst: Path, compression: str = "gz", max_bytes: Optional[int] = None,
+                 max_files: Optional[int] = None):
+        super().__init__(f"Archive {src} to {dst} / 归档 {src} 到 {dst}")
+        self.src = src
+        self.dst = dst
+        self.compression = compression
+        self.max_bytes = max_bytes
+        self.max_files = max_files
+
+    def dry_run(self) -> str:
+        split = ""
+        if self.max_bytes is not None or self.max_files is not None:
+            split = f", split at {self.max_bytes or '-'} bytes / {self.max_files or '-'} files"
+        return f"[ARCHIVE] Stream '{self.src}' into '{self.dst}' (tar.{self.compression}{split}) / 将 '{self.src}' 流式打包到 '{self.dst}' (tar.{self.compression})"
+
+    def affected_paths(self) -> List[Path]:
+        return [archive_index_path(self.dst)]
+
+    def parent_dirs(self) -> List[Path]:
+        return [self.dst.parent]
+
+    def snapshot(self) -> Optional[dict]:
+        return {"existed": True} if archive_index_path(self.dst).exists() else None
+
+    def undo(self, info: Optional[dict]) -> None:
+        if info and info.get("existed"):
+            raise RuntimeError(f"Cannot undo archive into existing {self.dst} / 无法撤销对已存在的 {self.dst} 的归档")
+        prefix = self.dst.name + "."
+        for name in os.listdir(self.dst.parent):
+            if name.startswith(prefix) and (".tar." in name or name.endswith(ARCHIVE_INDEX_SUFFIX)):
+                os.unlink(self.dst.parent / name)
+
+    def apply(self) -> None:
+        self.ensure_parent(self.dst)
+        writer = ArchiveWriter(self.dst, self.compression, self.max_bytes, self.max_files)
+        index = writer.write_tree(self.src)
+        logger.info(f"Archived {len(index['files'])} entries into {len(index['chunks'])} chunk(s) / 已归档 {len(index['files'])} 个条目，共 {len(index['chunks'])} 个分卷")
+
+class ExtractArchiveOperation(Operation):
+    """从归档中恢复单个条目（只解压其所在的分卷）。"""
+    def __init__(self, archive: Path, member: str, dst: Path):
+        super().__init__(f"Extract {member} from {archive} to {dst} / 从 {archive} 提取 {member} 到 {dst}")
+        self.archive = archive
+        self.member = member
+        self.dst = dst
+
+    def dry_run(self) -> str:
+        return f"[EXTRACT] Extract '{self.member}' from '{self.archive}' to '{self.dst}' / 从 '{self.archive}' 提取 '{self.member}' 到 '{self.dst}'"
+
+    def affected_paths(self) -> List[Path]:
+        return [self.dst]
+
+    def parent_dirs(self) -> List[Path]:
+        return [self.dst.parent]
+
+    def snapshot(self) -> Optional[dict]:
+        if self.dst.is_symlink():
+            return {"link": _link_text(self.dst)}
+        if self.dst.exists():
+            return {"lost": True}
+        return None
+
+    def undo(self, info: Optional[dict]) -> None:
+        if info and info.get("lost"):
+            raise RuntimeError(f"Overwritten content of {self.dst} cannot be recovered / {self.dst} 被覆盖的内容无法恢复")
+        if self.dst.is_symlink() or self.dst.is_file():
+            os.unlink(self.dst)
+        elif self.dst.is_dir() and not os.listdir(self.dst):
+            self.dst.rmdir()
+        if info and info.get("link"):
+            os.symlink(info["link"], self.dst)
+
+    def apply(self) -> None:
+        self.ensure_parent(self.dst)
+        if self.dst.is_symlink() or self.dst.is_file():
+            os.unlink(self.dst)
+        extract_archive_member(self.archive, self.member, self.dst)
 
 class RemoveOperation(Operation):
     """删除/移除操作。"""
@@ -125,9 +521,45 @@ class RemoveOperation(Operation):
     def dry_run(self) -> str:
         return f"[REMOVE] Delete '{self.target}' / 删除 '{self.target}'"
 
+    def affected_paths(self) -> List[Path]:
+        return [self.target]
+
+    def snapshot(self) -> Optional[dict]:
+        if self.target.is_symlink():
+            return {"link": _link_text(self.target)}
+        if self.target.is_dir():
+            # 重新折叠前的目录只包含链接，记录下来以便回滚时重建
+            tree = _link_tree(self.target)
+            if tree is not None:
+                return {"tree": tree}
+        if self.target.exists():
+            return {"lost": True}
+        return None
+
+    def undo(self, info: Optional[dict]) -> None:
+        if not info:
+            return
+        if info.get("link"):
+            if not self.target.is_symlink():
+                self.target.parent.mkdir(parents=True, exist_ok=True)
+                os.symlink(info["link"], self.target)
+        elif info.get("tree"):
+            if self.target.is_symlink():
+                os.unlink(self.target)
+            self.target.mkdir(parents=True, exist_ok=True)
+            for rel in info["tree"]["dirs"]:
+                (self.target / rel).mkdir(parents=True, exist_ok=True)
+            for rel, link in info["tree"]["links"].items():
+                if not os.path.lexists(self.target / rel):
+                    os.symlink(link, self.target / rel)
+        elif info.get("lost"):
+            raise RuntimeError(f"Removed content of {self.target} cannot be recovered / {self.target} 被删除的内容无法恢复")
+
     def apply(self) -> None:
         try:
             # 文件的内容
+            if METRICS.enabled:
+                METRICS.syscall("unlink")
             if self.target.is_symlink():
                 os.unlink(self.target)
             elif self.target.is_dir():
@@ -136,3 +568,64 @@ class RemoveOperation(Operation):
                 os.unlink(self.target)
         except FileNotFoundError:
             pass # 已经不存在，这很好
+
+class MkdirOperation(Operation):
+    """创建目录操作（由执行器在并行执行时自动插入，每个目录只创建一次）。"""
+    def __init__(self, path: Path):
+        super().__init__(f"Create directory {path} / 创建目录 {path}")
+        self.path = path
+
+    def dry_run(self) -> str:
+        return f"[MKDIR] Create directory '{self.path}' / 创建目录 '{self.path}'"
+
+    def affected_paths(self) -> List[Path]:
+        return [self.path]
+
+    def apply(self) -> None:
+        if METRICS.enabled:
+            METRICS.syscall("mkdir")
+        self.path.mkdir(parents=True, exist_ok=True)
+
+class UnfoldOperation(Operation):
+    """
+    展开折叠目录操作：把指向包目录的目录软链接替换为真实目录，并为其中每个条目建立链接。
+    entries 为规划时确定的条目（已排除该包忽略的条目）；为 None 时链接除 .git 外的所有条目。
+    """
+    def __init__(self, target: Path, src_dir: Path, entries: Optional[List[str]] = None):
+        super().__init__(f"Unfold {target} -> {src_dir} / 展开 {target} -> {src_dir}")
+        self.target = target
+        self.src_dir = src_dir
+        self.entries = entries
+
+    def dry_run(self) -> str:
+        return f"[UNFOLD] Replace folded link '{self.target}' with a directory of links into '{self.src_dir}' / 将折叠链接 '{self.target}' 替换为指向 '{self.src_dir}' 条目的目录"
+
+    def affected_paths(self) -> List[Path]:
+        return [self.target]
+
+    def snapshot(self) -> Optional[dict]:
+        link = _link_text(self.target)
+        return {"link": link} if link is not None else None
+
+    def undo(self, info: Optional[dict]) -> None:
+        if not info or not info.get("link") or self.target.is_symlink():
+            return
+        if self.target.is_dir():
+            if not all((self.target / name).is_symlink() for name in os.listdir(self.target)):
+                raise RuntimeError(f"Cannot refold {self.target}, it contains real files / 无法重新折叠 {self.target}，其中包含真实文件")
+            shutil.rmtree(self.target)
+        os.symlink(info["link"], self.target)
+
+    def apply(self) -> None:
+        if self.target.is_symlink():
+            os.unlink(self.target)
+            self.target.mkdir()
+        elif not self.target.is_dir():
+            raise FileExistsError(f"Target {self.target} is not a folded symlink / {self.target} 不是折叠链接")
+
+        # 已展开（例如中断后重新执行）时只补齐缺失的链接
+        names = self.entries if self.entries is not None else sorted(os.listdir(self.src_dir))
+        for name in names:
+            if name == '.git' or os.path.lexists(self.target / name):
+                continue
+            os.symlink(os.path.relpath(self.src_dir / name, self.target), self.target / name)
@@ -1,21 +1,22 @@
 import os
-import shutil
-from datetime import datetime
 from pathlib import Path
-from typing import List, Optional, Tuple
+from typing import Dict, Iterator, List, Optional, Tuple
 import logging
+import stat
 
 from .config import AppConfig
-from .models import Package, Dotfile, FileState
+from .models import Package, Dotfile, FileState, SyncResult
 from .detector import StateDetector
-from .operations import SymlinkOperation, RemoveOperation, BackupOperation, RestoreBackupOperation, CopyOperation
-from .executor import OperationPlan
+from .index import ScanIndex, dir_signature
+from .ignore import IgnoreRules, ALWAYS_IGNORED, DEFAULT_IGNORES, read_patterns
+from .executables import ExecutableIndex, read_binaries
+from .executor import OperationPlan, Executor
+from .metrics import METRICS
 
 logger = logging.getLogger(__name__)
 
-import subprocess
-
-from .utils.diff import DiffViewer
+# git 命令的默认超时（秒）
+GIT_TIMEOUT = 120
 
 class DotfilesService:
     """Dotfiles 核心服务类。"""
@@ -23,44 +24,150 @@ class DotfilesService:
         """初始化服务。"""
         self.config = config
         self.config.ensure_dirs()
+        self._index: Optional[ScanIndex] = None
+        # 每次扫描使用新的检测器，目录解析缓存只在单次扫描内有效
+        self._detector = StateDetector()
+        # 内置与全局忽略规则，每次扫描开始时重新读取
+        self._ignores: List[str] = []
+        # PATH 可执行文件索引（跨扫描复用，PATH 目录变化时重建）与 包名 -> 可执行文件名 映射
+        self._executables = ExecutableIndex()
+        self._binaries: Dict[str, List[str]] = {}
+        self._diff_cache = None
+        if config.profile:
+            METRICS.enable()
+
+    @property
+    def index(self) -> Optional[ScanIndex]:
+        """持久化扫描索引（首次访问时加载，未启用时为 None）。"""
+        if self._index is None and self.config.use_index:
+            self._index = ScanIndex.for_config(self.config)
+        return self._index
+
+    @property
+    def diff_cache(self):
+        """
+        以两侧文件签名为键的 diff 结果缓存（Web GUI 中反复查看同一对文件时命中）。
+        Diff 子系统在首次使用时才导入，命令行的 scan / deploy 等命令不需要加载 difflib。
+        """
+        if self._diff_cache is None:
+            from .utils.diff import DiffCache
+            self._diff_cache = DiffCache(self.config.diff_cache_entries, self.config.diff_cache_bytes)
+        return self._diff_cache
+
+    def execute(self, plan: OperationPlan, dry_run: bool = True) -> List[str]:
+        """
+        执行计划。实际执行时写入操作日志，中断后可 resume 或 rollback。
+        """
+        journal = None
+        if not dry_run and self.config.use_journal and not plan.is_empty():
+            from .journal import Journal
+            journal = Journal.create(self.config, plan)
+        with METRICS.phase("apply"):
+            return Executor.run(plan, dry_run=dry_run, workers=self.config.apply_workers, journal=journal)
+
+    def resume(self, dry_run: bool = True) -> Optional[List[str]]:
+        """继续执行最近一次中断的计划；没有中断的计划时返回 None。"""
+        from .journal import Journal
+        journal = Journal.latest(self.config, pending_only=True)
+        if journal is None:
+            return None
+        if dry_run:
+            return Executor.run(journal.remaining(), dry_run=True)
+        return Executor.run(journal.plan(), dry_run=False, workers=self.config.apply_workers, journal=journal)
+
+    def rollback(self, dry_run: bool = True) -> Optional[List[str]]:
+        """撤销最近一次执行（或中断）的计划；没有可回滚的计划时返回 None。"""
+        from .journal import Journal
+        journal = Journal.latest(self.config)
+        if journal is None:
+            return None
+        return journal.rollback(dry_run=dry_run)
 
     def get_diff(self, dotfile: Dotfile) -> List[str]:
         """
         获取 dotfile 源文件与目标文件的差异。
         """
-        return DiffViewer.get_diff(dotfile.source, dotfile.target)
+        return list(self.iter_diff(dotfile.source, dotfile.target))
+
+    def iter_diff(self, source: Path, target: Path) -> Iterator[str]:
+        """按配置的上限逐行生成差异。"""
+        return self.diff_cache.iter_diff(source, target, max_bytes=self.config.diff_max_bytes,
+                                         max_lines=self.config.diff_max_lines)
 
-    def sync_remote(self) -> List[str]:
+    def sync_remote(self, timeout: float = GIT_TIMEOUT) -> SyncResult:
         """
-        从远程仓库拉取变更。
-        返回日志列表。
+        从远程仓库拉取变更，并根据 pull 前后的 HEAD 用 git diff 计算变更的文件。
+        git 不读取标准输入、不弹出凭据提示，超时后被终止，因此不会无限期占用调用线程。
         """
-        logs = []
+        import subprocess
+
         if not (self.config.dotfiles_dir / ".git").exists():
-            return ["Dotfiles directory is not a git repo / Dotfiles 目录不是 git 仓库。"]
-        
+            return SyncResult(ok=False, logs=["Dotfiles directory is not a git repo / Dotfiles 目录不是 git 仓库。"])
+
+        result = SyncResult(ok=False)
+        logs = result.logs
         try:
-            # 简单的 git pull
-            result = subprocess.run(
-                ["git", "pull"], 
-                cwd=self.config.dotfiles_dir, 
-                capture_output=True, 
-                text=True
-            )
-            if result.stdout:
-                logs.append(result.stdout)
-            if result.stderr:
-                logs.append(result.stderr)
-            
-            if result.returncode == 0:
-                 logs.append("Sync successful / 同步成功。")
-            else:
-                 logs.append("Sync failed / 同步失败。")
-                 
+            result.before = self._git_head(timeout)
+            pull = self._git(["pull"], timeout)
+            if pull.stdout:
+                logs.append(pull.stdout)
+            if pull.stderr:
+                logs.append(pull.stderr)
+            if pull.returncode != 0:
+                logs.append("Sync failed / 同步失败。")
+                return result
+
+            result.ok = True
+            result.after = self._git_head(timeout)
+            if result.before is None or result.after is None:
+                result.full = True
+            elif result.before != result.after:
+                diff = self._git(["diff", "--name-status", "--no-renames", "-z", result.before, result.after], timeout)
+                if diff.returncode != 0:
+                    result.full = True
+                else:
+                    fields = diff.stdout.split("\0")
+                    result.changes = [(fields[i][:1], fields[i + 1]) for i in range(0, len(fields) - 1, 2)]
+            logs.append("Sync successful / 同步成功。")
+            if result.changes:
+                logs.append(f"{len(result.changes)} files changed in {len(result.package_changes())} packages / "
+                            f"{len(result.package_changes())} 个包中有 {len(result.changes)} 个文件变化。")
+        except subprocess.TimeoutExpired:
+            # pull 可能已部分完成，变更范围未知
+            result.ok, result.full = False, True
+            logs.append(f"Sync timed out after {timeout}s / 同步超时 ({timeout} 秒)。")
         except Exception as e:
             logs.append(f"Sync error / 同步出错: {str(e)}")
-            
-        return logs
+
+        return result
+
+    def _git(self, args: List[str], timeout: float) -> "subprocess.CompletedProcess":
+        """在 dotfiles 目录中运行 git（不读取标准输入，不提示输入凭据）。"""
+        import subprocess
+
+        env = dict(os.environ, GIT_TERMINAL_PROMPT="0")
+        return subprocess.run(["git", *args], cwd=self.config.dotfiles_dir, capture_output=True, text=True,
+                              stdin=subprocess.DEVNULL, env=env, timeout=timeout)
+
+    def _git_head(self, timeout: float) -> Optional[str]:
+        """当前 HEAD 的提交号；仓库还没有提交时返回 None。"""
+        head = self._git(["rev-parse", "--verify", "-q", "HEAD"], timeout)
+        return (head.stdout.strip() or None) if head.returncode == 0 else None
+
+    @staticmethod
+    def changed_links(result: SyncResult, packages: List[Package]) -> List[Tuple[str, Dotfile]]:
+        """返回 (包名, Dotfile)：已部署（LINKED）且源文件内容在本次同步中被修改的链接。"""
+        changes = result.package_changes()
+        links = []
+        for package in packages:
+            modified = {rel for status, rel in changes.get(package.name, []) if status in ("M", "T")}
+            if not modified:
+                continue
+            for dotfile in package.files:
+                if (dotfile.state == FileState.LINKED
+                        and dotfile.source.relative_to(package.root).as_posix() in modified):
+                    links.append((package.name, dotfile))
+        return links
 
     def scan_packages(self) -> List[Package]:
         """扫描 dotfiles 目录下的包。"""
@@ -69,56 +176,338 @@ class DotfilesService:
              logger.warning(f"Dotfiles directory {self.config.dotfiles_dir} does not exist.")
              return packages
 
-        for item in self.config.dotfiles_dir.iterdir():
-            if item.is_dir() and not item.name.startswith('.'):
-                # 我们将任何非隐藏目录视为一个包
-                package = self._scan_single_package(item)
-                packages.append(package)
+        self._detector = StateDetector()
+        self._prepare_scan()
+
+        with METRICS.phase("scan"):
+            # 我们将任何非隐藏目录视为一个包
+            roots = [item for item in self.config.dotfiles_dir.iterdir()
+                     if item.is_dir() and not item.name.startswith('.')]
+
+            if self.config.scan_workers > 1:
+                packages = self._scan_packages_parallel(roots)
+            else:
+                for item in roots:
+                    package = self._scan_single_package(item)
+                    packages.append(package)
+
+        if self.index is not None:
+            with METRICS.phase("index_save"):
+                self.index.save(prune=True)
+        return packages
+
+    def scan_package(self, name: str) -> Optional[Package]:
+        """按名称扫描单个包；包不存在（或名称不是一级非隐藏目录）时返回 None。"""
+        packages, _ = self.scan_selected([name])
+        return packages[0] if packages else None
+
+    def scan_selected(self, names: Optional[List[str]] = None) -> Tuple[List[Package], List[str]]:
+        """
+        一次扫描多个指定的包（names 为 None 时扫描全部包），索引只写回一次。
+        返回 (按给定顺序排列的包, 未找到的包名)；重复的名称只扫描一次。
+        """
+        if names is None:
+            return self.scan_packages(), []
+
+        self._detector = StateDetector()
+        self._prepare_scan()
+        packages, missing, seen = [], [], set()
+        with METRICS.phase("scan"):
+            for name in names:
+                if name in seen:
+                    continue
+                seen.add(name)
+                package_root = self._package_root(name)
+                if package_root is None:
+                    missing.append(name)
+                else:
+                    packages.append(self._scan_single_package(package_root))
+        if self.index is not None and packages:
+            with METRICS.phase("index_save"):
+                self.index.save()
+        return packages, missing
+
+    def package_layout(self, names: Optional[List[str]] = None) -> Tuple[list, List[str]]:
+        """
+        只遍历 dotfiles 仓库（不检测目标状态），names 为 None 时包含全部包。
+        返回 ([(包名, 是否已安装, [(包内相对目录, 文件名列表), ...]), ...], 未找到的包名)；
+        结果只含字符串与布尔值，可传给其他进程，由 packages_from_layout 针对不同的目标根目录检测状态。
+        """
+        missing = []
+        if names is None:
+            if not self.config.dotfiles_dir.exists():
+                logger.warning(f"Dotfiles directory {self.config.dotfiles_dir} does not exist.")
+                return [], missing
+            roots = [item for item in self.config.dotfiles_dir.iterdir()
+                     if item.is_dir() and not item.name.startswith('.')]
+        else:
+            roots = []
+            for name in dict.fromkeys(names):
+                package_root = self._package_root(name)
+                if package_root is None:
+                    missing.append(name)
+                else:
+                    roots.append(package_root)
+
+        layout = []
+        self._prepare_scan()
+        with METRICS.phase("layout"):
+            for package_root in roots:
+                rules = self._ignore_rules(package_root)
+                dirs = []
+                # 与 _walk_subtree 相同的 os.walk 自顶向下顺序
+                pending = [package_root]
+                while pending:
+                    root = pending.pop()
+                    subdirs, filenames = self._list_dir(root, package_root, rules)
+                    dirs.append((str(root.relative_to(package_root)), filenames))
+                    pending.extend(root / d for d in reversed(subdirs))
+                layout.append((package_root.name, self._is_installed(package_root.name), dirs))
+        return layout, missing
+
+    def packages_from_layout(self, layout: list) -> List[Package]:
+        """根据 package_layout 的结果针对本服务的目标根目录检测状态，生成包列表。"""
+        self._detector = StateDetector()
+        packages = []
+        with METRICS.phase("scan"):
+            for name, is_installed, dirs in layout:
+                package_root = self.config.dotfiles_dir / name
+                segments = [self._scan_files(package_root, package_root / rel_dir, filenames)
+                            for rel_dir, filenames in dirs]
+                packages.append(Package.from_dirs(name, package_root, self.config.target_root, segments,
+                                                  is_installed=is_installed))
+        if self.index is not None:
+            self.index.save()
+        return packages
+
+    def _package_root(self, name: str) -> Optional[Path]:
+        """返回包目录；名称不是 dotfiles 目录下的一级非隐藏目录时返回 None。"""
+        package_root = self.config.dotfiles_dir / name
+        if not name or name.startswith('.') or Path(name).name != name or not package_root.is_dir():
+            return None
+        return package_root
+
+    def _scan_packages_parallel(self, roots: List[Path]) -> List[Package]:
+        """
+        并发扫描多个包。
+        每个包的顶层文件和每个一级子目录作为独立任务提交到线程池，
+        最后按串行扫描的顺序（os.walk 自顶向下）拼接结果。
+        """
+        from concurrent.futures import ThreadPoolExecutor
+
+        jobs = []
+        with ThreadPoolExecutor(max_workers=self.config.scan_workers) as pool:
+            for package_root in roots:
+                rules = self._ignore_rules(package_root)
+                dirs, filenames = self._list_dir(package_root, package_root, rules)
+                units = [pool.submit(self._scan_files, package_root, package_root, filenames)]
+                for d in dirs:
+                    units.append(pool.submit(self._walk_subtree, package_root, package_root / d, rules))
+                jobs.append((package_root, units))
+
+            packages = []
+            for package_root, units in jobs:
+                top, *subtrees = units
+                segments = [top.result()] + [segment for unit in subtrees for segment in unit.result()]
+                packages.append(Package.from_dirs(
+                    package_root.name,
+                    package_root,
+                    self.config.target_root,
+                    segments,
+                    is_installed=self._is_installed(package_root.name)
+                ))
         return packages
 
     def _scan_single_package(self, package_root: Path) -> Package:
         """扫描单个包。"""
-        files = []
-        # 遍历包目录
-        for root, dirs, filenames in os.walk(package_root):
-            # stow 通常忽略 .git 等文件，我们保持简单，至少跳过 .git
-            if '.git' in dirs:
-                dirs.remove('.git')
-            
-            for filename in filenames:
-                source_path = Path(root) / filename
-                rel_path = source_path.relative_to(package_root)
-                
-                # 目标是相对于用户主目录（或配置的目标根目录）
-                # 在典型的 stow 用法中，我们 stow 到 ~
-                target_path = self.config.target_root / rel_path
-                
-                state = StateDetector.detect(source_path, target_path)
-                
-                dotfile = Dotfile(
-                    source=source_path,
-                    target=target_path,
-                    state=state
-                )
-                files.append(dotfile)
-        
-        is_installed = shutil.which(package_root.name) is not None
-        return Package(name=package_root.name, root=package_root, files=files, is_installed=is_installed)
+        segments = self._walk_subtree(package_root, package_root, self._ignore_rules(package_root))
+        is_installed = self._is_installed(package_root.name)
+        return Package.from_dirs(package_root.name, package_root, self.config.target_root, segments,
+                                 is_installed=is_installed)
+
+    def _walk_subtree(self, package_root: Path, top: Path,
+                      rules: Optional[IgnoreRules] = None) -> List[Tuple[str, List[str], List[FileState]]]:
+        """按 os.walk 自顶向下的顺序遍历包内的一棵子树，返回每个目录的 (相对目录, 文件名, 状态)。"""
+        segments = []
+        pending = [top]
+        while pending:
+            root = pending.pop()
+            dirs, filenames = self._list_dir(root, package_root, rules)
+            segments.append(self._scan_files(package_root, root, filenames))
+            pending.extend(root / d for d in reversed(dirs))
+        return segments
+
+    def _list_dir(self, path: Path, package_root: Optional[Path] = None,
+                  rules: Optional[IgnoreRules] = None) -> Tuple[List[str], List[str]]:
+        """
+        列出目录下需要继续遍历的子目录和文件。
+        与 os.walk 一致：软链接目录不进入也不视为文件；启用索引时，目录签名未变则直接复用缓存。
+        给出 rules 时去掉被忽略的条目，被忽略的目录不会再进入（索引中保存的仍是未过滤的列表）。
+        """
+        with METRICS.phase("walk"):
+            dirs, filenames = self._read_dir(path)
+            if rules:
+                rel_dir = path.relative_to(package_root).as_posix()
+                dirs, filenames, ignored_dirs, ignored_files = rules.filter(rel_dir, dirs, filenames)
+                if METRICS.enabled and (ignored_dirs or ignored_files):
+                    METRICS.inc("dotkeeper_ignored_total", ignored_dirs, kind="dir")
+                    METRICS.inc("dotkeeper_ignored_total", ignored_files, kind="file")
+            return dirs, filenames
+
+    def _prepare_scan(self) -> None:
+        """扫描开始时重新读取忽略规则与可执行文件映射，并在 PATH 变化时重建可执行文件索引。"""
+        self._ignores = self._global_ignores()
+        self._binaries = dict(read_binaries(self.config.binaries_file))
+        self._binaries.update(self.config.package_binaries)
+        self._executables.refresh()
+
+    def _is_installed(self, name: str) -> bool:
+        """包对应的程序（默认与包同名，可由映射指定多个）是否在 PATH 中。"""
+        return any(self._executables.find(binary) for binary in self._binaries.get(name, [name]))
+
+    def _global_ignores(self) -> List[str]:
+        """内置规则、配置中的额外规则与全局忽略文件中的规则。"""
+        patterns = list(ALWAYS_IGNORED)
+        if self.config.default_ignores:
+            patterns += DEFAULT_IGNORES
+        patterns += self.config.ignore_patterns
+        patterns += read_patterns(self.config.ignore_file)
+        return patterns
+
+    def _ignore_rules(self, package_root: Path) -> IgnoreRules:
+        """编译某个包的忽略规则（全局规则 + 包内忽略文件）。"""
+        return IgnoreRules.for_package(package_root, self._ignores)
+
+    def _read_dir(self, path: Path) -> Tuple[List[str], List[str]]:
+        """_list_dir 的实现。"""
+        profile = METRICS.enabled
+        index = self.index
+        key = str(path)
+        sig = None
+        if index is not None:
+            if profile:
+                METRICS.syscall("stat")
+            try:
+                sig = dir_signature(os.stat(path))
+            except OSError:
+                return [], []
+            cached = index.lookup_dir(key, sig)
+            if profile:
+                METRICS.cache("scan_index_dir", cached is not None)
+            if cached is not None:
+                return cached
+
+        if profile:
+            METRICS.syscall("scandir")
+        dirs, filenames = [], []
+        try:
+            with os.scandir(path) as it:
+                for entry in it:
+                    try:
+                        is_dir = entry.is_dir()
+                    except OSError:
+                        is_dir = False
+                    if not is_dir:
+                        filenames.append(entry.name)
+                    elif not entry.is_symlink() and entry.name != '.git':
+                        # stow 通常忽略 .git 等文件，我们保持简单，至少跳过 .git
+                        dirs.append(entry.name)
+        except OSError:
+            return [], []
+
+        if index is not None:
+            index.store_dir(key, sig, dirs, filenames)
+        return dirs, filenames
+
+    def _scan_files(self, package_root: Path, root: Path,
+                    filenames: List[str]) -> Tuple[str, List[str], List[FileState]]:
+        """
+        检测同一目录下文件的状态，返回 (包内相对目录, 文件名, 状态)，由 Package.from_dirs 存入列中，
+        不为每个文件创建 Dotfile 和路径对象。
+        """
+        # 目标是相对于用户主目录（或配置的目标根目录）
+        # 在典型的 stow 用法中，我们 stow 到 ~
+        rel_dir = root.relative_to(package_root)
+        states = self._detector.check_dir(root, self.config.target_root / rel_dir, filenames, index=self.index)
+        return rel_dir.as_posix(), filenames, states
 
     def deploy(self, package: Package, conflict_strategy: str = "backup") -> OperationPlan:
         """部署（链接）包。"""
-        return self.sync(package, action="link", conflict_strategy=conflict_strategy)
+        with METRICS.phase("plan"):
+            return self.sync(package, action="link", conflict_strategy=conflict_strategy)
 
     def restore(self, package: Package) -> OperationPlan:
         """恢复（撤销链接）包。"""
-        return self.sync(package, action="unlink")
+        with METRICS.phase("plan"):
+            return self.sync(package, action="unlink")
 
-    def backup_config_dir(self) -> Tuple[OperationPlan, Optional[Path]]:
+    def plan_batch(self, packages: List[Package], action: str = "link",
+                   conflict_strategy: str = "backup") -> OperationPlan:
+        """
+        为多个包生成一个合并的计划（按包的顺序拼接），以便一次执行。
+        两个包声明同一目标时抛出 ValueError，此时不会生成任何操作。
+        折叠模式下，多个包共有的目标目录不折叠（各包基于同一扫描状态规划，否则会争抢同一个目录链接）。
+        """
+        conflicts = self.find_conflicts(packages)
+        if conflicts:
+            details = "; ".join(f"{target} ({', '.join(names)})" for target, names in list(conflicts.items())[:10])
+            if len(conflicts) > 10:
+                details += f"; ... (+{len(conflicts) - 10})"
+            raise ValueError(f"Packages claim the same targets / 多个包声明了相同的目标: {details}")
+
+        folded = action == "link" and self.config.fold
+        shared = self._shared_dirs(packages) if folded else set()
+        plan = OperationPlan()
+        with METRICS.phase("plan"):
+            for package in packages:
+                if folded:
+                    part = self._plan_folded_link(package, conflict_strategy, no_fold=shared)
+                else:
+                    part = self.sync(package, action=action, conflict_strategy=conflict_strategy)
+                plan.operations.extend(part.operations)
+        return plan
+
+    @staticmethod
+    def find_conflicts(packages: List[Package]) -> Dict[Path, List[str]]:
+        """返回被多个包声明的目标 -> 包名列表（按包的顺序）。"""
+        owners: Dict[Path, List[str]] = {}
+        for package in packages:
+            for dotfile in package.files:
+                names = owners.setdefault(dotfile.target, [])
+                if package.name not in names:
+                    names.append(package.name)
+        return {target: names for target, names in owners.items() if len(names) > 1}
+
+    def _shared_dirs(self, packages: List[Package]) -> set:
+        """多个包中都有文件落在其下的目标目录。"""
+        seen: Dict[Path, str] = {}
+        shared = set()
+        root = self.config.target_root
+        for package in packages:
+            for dotfile in package.files:
+                parent = dotfile.target.parent
+                while parent != root and parent != parent.parent:
+                    owner = seen.setdefault(parent, package.name)
+                    if owner != package.name:
+                        shared.add(parent)
+                    parent = parent.parent
+        return shared
+
+    def backup_config_dir(self, mode: Optional[str] = None, compression: Optional[str] = None,
+                          max_bytes: Optional[int] = None,
+                          max_files: Optional[int] = None) -> Tuple[OperationPlan, Optional[Path]]:
         """
         备份用户目录下的 .config 文件夹。
+        mode: 'copy' 完整复制；'incremental' 增量快照，未变化的文件硬链接到上一个快照；
+              'archive' 流式写入压缩 tar 归档（compression 为 gz/xz/bz2，可按 max_bytes / max_files 分卷）。
+        mode 和 compression 默认取配置。
 
-        返回 (操作计划, 备份路径)。如果 .config 不存在，操作计划为空且路径为 None。
+        返回 (操作计划, 备份路径)；归档模式下备份路径为归档清单。如果 .config 不存在，操作计划为空且路径为 None。
         """
+        from .operations import CopyOperation, SnapshotOperation, ArchiveOperation
+        from .backup import latest_snapshot, archive_index_path, ARCHIVE_COMPRESSIONS
+
+        mode = mode or self.config.backup_mode
         plan = OperationPlan()
 
         source_config = self.config.target_root / ".config"
@@ -126,59 +515,364 @@ class DotfilesService:
             logger.warning(".config directory does not exist under target root %s", self.config.target_root)
             return plan, None
 
+        from datetime import datetime
+
         timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
         backup_root = self.config.target_root / ".dotfiles_backup" / "config"
         backup_path = backup_root / f"config-{timestamp}"
 
-        plan.add(CopyOperation(source_config, backup_path, preserve_symlinks=True))
+        if mode == "incremental":
+            plan.add(SnapshotOperation(source_config, backup_path, latest_snapshot(backup_root, "config-")))
+        elif mode == "copy":
+            plan.add(CopyOperation(source_config, backup_path, preserve_symlinks=True))
+        elif mode == "archive":
+            compression = compression or self.config.archive_compression
+            if compression not in ARCHIVE_COMPRESSIONS:
+                raise ValueError(f"Unknown compression / 未知的压缩方式: {compression}")
+            plan.add(ArchiveOperation(source_config, backup_path, compression, max_bytes, max_files))
+            backup_path = archive_index_path(backup_path)
+        else:
+            raise ValueError(f"Unknown backup mode / 未知的备份模式: {mode}")
         return plan, backup_path
 
+    def restore_config_file(self, archive: Path, member: str, dest: Optional[Path] = None) -> OperationPlan:
+        """
+        从 .config 归档中恢复单个条目，只解压其所在的分卷。
+        archive 为归档清单 (<name>.index.json) 或不含扩展名的归档路径；dest 默认为 .config 下的原位置。
+        """
+        from .operations import ExtractArchiveOperation
+        from .backup import read_archive_index, ARCHIVE_INDEX_SUFFIX
+
+        archive = Path(archive)
+        if archive.name.endswith(ARCHIVE_INDEX_SUFFIX):
+            archive = archive.with_name(archive.name[:-len(ARCHIVE_INDEX_SUFFIX)])
+        member = member.strip("/")
+        if member not in read_archive_index(archive)["files"]:
+            raise FileNotFoundError(f"{member} is not in archive / 归档中没有 {member}: {archive}")
+        dest = dest or self.config.target_root / ".config" / member
+        return OperationPlan([ExtractArchiveOperation(archive, member, dest)])
+
     def sync(self, package: Package, action: str = "link", conflict_strategy: str = "backup") -> OperationPlan:
         """
         同步包（链接或取消链接）。
         action: 'link' (deploy) or 'unlink' (restore/unstow)
         conflict_strategy: 'backup', 'overwrite' (only for link)
         """
+        from .operations import RemoveOperation, RestoreBackupOperation, CopyOperation
+        from .backup import read_history
+
+        if action == "link" and self.config.fold:
+            return self._plan_folded_link(package, conflict_strategy)
+
         plan = OperationPlan()
-        
+        detector = StateDetector()
+        fold_roots = {}
+        removed_folds = set()
+        # 从备份恢复了原有条目的折叠链接位置，其下不再放入本包的文件
+        restored_folds = set()
+        # 本计划中展开的其他包的折叠目录 -> {条目名: 链接指向的源路径}
+        unfolded: Dict[Path, Dict[str, Path]] = {}
+        walked: Dict[Path, bool] = {}
+
         for dotfile in package.files:
-            # 计算备份路径
-            try:
-                rel_path = dotfile.source.relative_to(self.config.dotfiles_dir)
-            except ValueError:
-                # 鉴于扫描逻辑，这不应发生，但作为回退
-                rel_path = Path(dotfile.source.name)
-            
-            backup_path = self.config.target_root / ".dotfiles_backup" / rel_path
+            backup_path = self._backup_path(dotfile.source)
 
             if action == "link":
-                if dotfile.state == FileState.LINKED:
-                    continue
-                
-                if dotfile.state == FileState.MISSING:
-                    plan.add(SymlinkOperation(dotfile.source, dotfile.target))
-                
-                elif dotfile.state == FileState.ORPHAN:
-                    # 损坏的链接，移除并重新链接
-                    plan.add(RemoveOperation(dotfile.target))
-                    plan.add(SymlinkOperation(dotfile.source, dotfile.target))
-                
-                elif dotfile.state == FileState.CONFLICT:
-                    if conflict_strategy == "overwrite":
-                        plan.add(RemoveOperation(dotfile.target))
-                        plan.add(SymlinkOperation(dotfile.source, dotfile.target))
-                    elif conflict_strategy == "backup":
-                        plan.add(BackupOperation(dotfile.target, backup_path))
-                        plan.add(SymlinkOperation(dotfile.source, dotfile.target))
-            
+                state = self._unfold_parents(plan, package, dotfile, detector, unfolded, walked)
+                self._plan_link_file(plan, dotfile, state, backup_path, conflict_strategy)
+
             elif action == "unlink":
                 if dotfile.state == FileState.LINKED or dotfile.state == FileState.ORPHAN:
-                    plan.add(RemoveOperation(dotfile.target))
+                    fold_root = None
+                    if dotfile.state == FileState.LINKED:
+                        fold_root = self._find_fold_root(package, dotfile, detector, fold_roots)
+
+                    if fold_root is None:
+                        plan.add(RemoveOperation(dotfile.target))
+                    elif fold_root not in removed_folds:
+                        # 折叠链接只移除一次；不能删除其下的文件（那会删掉仓库中的源文件）
+                        removed_folds.add(fold_root)
+                        plan.add(RemoveOperation(fold_root))
+                        # 折叠部署时被整体备份的冲突条目（以包内目录为备份键）
+                        fold_backup = self._backup_path(package.root / fold_root.relative_to(self.config.target_root))
+                        if read_history(fold_backup):
+                            restored_folds.add(fold_root)
+                            plan.add(RestoreBackupOperation(fold_root, fold_backup, self._backup_store()))
+
                     # 检查备份并恢复
-                    if backup_path.exists():
-                        plan.add(RestoreBackupOperation(dotfile.target, backup_path))
+                    if fold_root in restored_folds:
+                        continue
+                    if self._has_backup(backup_path):
+                        plan.add(RestoreBackupOperation(dotfile.target, backup_path, self._backup_store()))
                     else:
                         # 无备份: 实体化源文件 (复制)
                         plan.add(CopyOperation(dotfile.source, dotfile.target))
-        
+
+        return plan
+
+    def _backup_path(self, source: Path) -> Path:
+        """计算源路径对应的备份路径（结构与 dotfiles 仓库一致）。"""
+        try:
+            rel_path = source.relative_to(self.config.dotfiles_dir)
+        except ValueError:
+            # 鉴于扫描逻辑，这不应发生，但作为回退
+            rel_path = Path(source.name)
+        return self.config.target_root / ".dotfiles_backup" / rel_path
+
+    def _backup_store(self) -> Path:
+        """冲突文件备份所用的内容寻址对象库。"""
+        return self.config.target_root / ".dotfiles_backup" / ".objects"
+
+    def _has_backup(self, backup_path: Path) -> bool:
+        """是否存在可恢复的备份（对象库清单或旧式备份文件）。"""
+        from .backup import manifest_path
+
+        return manifest_path(backup_path).exists() or backup_path.exists()
+
+    def _plan_link_file(self, plan: OperationPlan, dotfile: Dotfile, state: FileState,
+                        backup_path: Path, conflict_strategy: str) -> None:
+        """为单个文件规划链接操作。"""
+        from .operations import SymlinkOperation, RemoveOperation, BackupOperation
+
+        if state == FileState.LINKED:
+            return
+
+        if state == FileState.MISSING:
+            plan.add(SymlinkOperation(dotfile.source, dotfile.target))
+
+        elif state == FileState.ORPHAN:
+            # 损坏的链接，移除并重新链接
+            plan.add(RemoveOperation(dotfile.target))
+            plan.add(SymlinkOperation(dotfile.source, dotfile.target))
+
+        elif state == FileState.CONFLICT:
+            if conflict_strategy == "overwrite":
+                plan.add(RemoveOperation(dotfile.target))
+                plan.add(SymlinkOperation(dotfile.source, dotfile.target))
+            elif conflict_strategy == "backup":
+                plan.add(BackupOperation(dotfile.target, backup_path, self._backup_store()))
+                plan.add(SymlinkOperation(dotfile.source, dotfile.target))
+
+    def _find_fold_root(self, package: Package, dotfile: Dotfile, detector: StateDetector,
+                        cache: Dict[Path, Optional[Path]]) -> Optional[Path]:
+        """返回使该文件处于已链接状态的最上层折叠目录链接；未折叠时返回 None。"""
+        target_dir = dotfile.target.parent
+        if target_dir in cache:
+            return cache[target_dir]
+
+        fold_root = None
+        if detector.is_folded(dotfile.source.parent, target_dir):
+            rel_parts = dotfile.source.parent.relative_to(package.root).parts
+            for i in range(1, len(rel_parts) + 1):
+                candidate = self.config.target_root.joinpath(*rel_parts[:i])
+                if candidate.is_symlink() and detector.is_folded(package.root.joinpath(*rel_parts[:i]), candidate):
+                    fold_root = candidate
+                    break
+        cache[target_dir] = fold_root
+        return fold_root
+
+    def _plan_folded_link(self, package: Package, conflict_strategy: str,
+                          no_fold: Optional[set] = None) -> OperationPlan:
+        """
+        以 GNU Stow 的折叠方式规划部署。
+        目标目录不存在时只创建一个指向包内目录的链接；目标是其他包的折叠链接时先展开（unfold）；
+        目标目录中只剩指向本包同一目录的链接时重新折叠（refold）。
+        no_fold 中的目标目录（批量部署时多个包共有的目录）不折叠，逐个链接其中的文件。
+        """
+        from .operations import SymlinkOperation, RemoveOperation, BackupOperation, UnfoldOperation
+
+        no_fold = no_fold or set()
+        plan = OperationPlan()
+        detector = StateDetector()
+        target_root = self.config.target_root
+
+        # 包内目录树：相对目录 -> (子目录名列表, 文件列表)，保持扫描顺序
+        tree: Dict[Path, Tuple[List[str], List[Dotfile]]] = {Path('.'): ([], [])}
+        for dotfile in package.files:
+            rel_dir = dotfile.source.parent.relative_to(package.root)
+            tree.setdefault(rel_dir, ([], []))[1].append(dotfile)
+            while rel_dir != Path('.'):
+                subdirs = tree.setdefault(rel_dir.parent, ([], []))[0]
+                if rel_dir.name in subdirs:
+                    break
+                subdirs.append(rel_dir.name)
+                rel_dir = rel_dir.parent
+
+        # 本计划中将被展开的目录 -> {条目名: 链接指向的源路径}
+        unfolded: Dict[Path, Dict[str, Path]] = {}
+
+        def lookup(target: Path) -> Tuple[Optional[str], Optional[Path]]:
+            return self._planned_kind(target, unfolded)
+
+        def same(a: Path, b: Path) -> bool:
+            return detector.real_dir(str(a)) == detector.real_dir(str(b))
+
+        def visit(rel_dir: Path) -> None:
+            subdirs, files = tree[rel_dir]
+            in_unfolded = (target_root / rel_dir) in unfolded
+
+            for dotfile in files:
+                state = dotfile.state
+                if in_unfolded:
+                    # 扫描时看到的是展开前的状态，需要按计划后的目录内容重新判断
+                    kind, link_src = lookup(dotfile.target)
+                    if kind is None:
+                        state = FileState.MISSING
+                    elif kind == 'link' and same(link_src, dotfile.source):
+                        state = FileState.LINKED
+                    else:
+                        state = FileState.CONFLICT
+                self._plan_link_file(plan, dotfile, state, self._backup_path(dotfile.source), conflict_strategy)
+
+            for name in subdirs:
+                rel = rel_dir / name
+                source, target = package.root / rel, target_root / rel
+                kind, link_src = lookup(target)
+
+                if kind is None and target in no_fold:
+                    # 共有目录由文件链接的父目录创建步骤建立
+                    visit(rel)
+                elif kind is None:
+                    # 折叠：整个目录只需一个链接
+                    plan.add(SymlinkOperation(source, target))
+                elif kind == 'dir':
+                    if target not in unfolded and target not in no_fold and self._is_refoldable(source, target):
+                        plan.add(RemoveOperation(target))
+                        plan.add(SymlinkOperation(source, target))
+                    else:
+                        visit(rel)
+                elif kind == 'link' and same(link_src, source):
+                    # 已折叠到本包
+                    continue
+                elif kind == 'link' and self._is_package_dir(link_src):
+                    # 其他包的折叠链接：展开后继续向下
+                    entries = self._unfold_entries(link_src)
+                    plan.add(UnfoldOperation(target, link_src, entries))
+                    unfolded[target] = {n: link_src / n for n in entries}
+                    visit(rel)
+                elif conflict_strategy == "overwrite":
+                    plan.add(RemoveOperation(target))
+                    plan.add(SymlinkOperation(source, target))
+                elif conflict_strategy == "backup":
+                    # 以包内目录为键整体备份，restore 移除该折叠链接时恢复
+                    plan.add(BackupOperation(target, self._backup_path(source), self._backup_store()))
+                    plan.add(SymlinkOperation(source, target))
+
+        visit(Path('.'))
         return plan
+
+    @staticmethod
+    def _planned_kind(target: Path, unfolded: Dict[Path, Dict[str, Path]]) -> Tuple[Optional[str], Optional[Path]]:
+        """
+        返回目标在计划执行到此处时的类型：None / 'dir' / 'file' / 'link'（附带链接指向）。
+        unfolded 为计划中已展开的目录 -> {条目名: 链接指向的源路径}。
+        """
+        if target in unfolded:
+            return 'dir', None
+        entries = unfolded.get(target.parent)
+        if entries is not None:
+            link_src = entries.get(target.name)
+            return ('link', link_src) if link_src is not None else (None, None)
+        try:
+            st = os.lstat(target)
+        except (FileNotFoundError, NotADirectoryError):
+            return None, None
+        if stat.S_ISLNK(st.st_mode):
+            return 'link', Path(os.path.realpath(target))
+        return ('dir' if stat.S_ISDIR(st.st_mode) else 'file'), None
+
+    def _unfold_parents(self, plan: OperationPlan, package: Package, dotfile: Dotfile,
+                        detector: StateDetector, unfolded: Dict[Path, Dict[str, Path]],
+                        walked: Dict[Path, bool]) -> FileState:
+        """
+        非折叠部署时，目标的上级目录若是其他包的折叠链接，先将其展开（与 Stow 相同），
+        否则新链接会穿过该链接落进另一个包的仓库目录。
+        返回按展开后的目录内容重新判断的状态（没有展开时即扫描得到的状态）。
+        walked 记录已检查过的目标目录 -> 其路径上是否有展开的目录，同一目录下的文件只检查一次。
+        """
+        if dotfile.state == FileState.LINKED:
+            return dotfile.state
+        parent = dotfile.target.parent
+        passed = walked.get(parent)
+        if passed is None:
+            passed = walked[parent] = self._unfold_ancestors(plan, package, parent, detector, unfolded)
+        if not passed:
+            return dotfile.state
+        if parent not in unfolded:
+            # 上级目录在展开后不存在
+            return FileState.MISSING
+        kind, link_src = self._planned_kind(dotfile.target, unfolded)
+        if kind is None:
+            return FileState.MISSING
+        if kind == 'link' and detector.real_dir(str(link_src)) == detector.real_dir(str(dotfile.source)):
+            return FileState.LINKED
+        return FileState.CONFLICT
+
+    def _unfold_ancestors(self, plan: OperationPlan, package: Package, target_dir: Path,
+                          detector: StateDetector, unfolded: Dict[Path, Dict[str, Path]]) -> bool:
+        """自上而下展开 target_dir 路径上其他包的折叠链接；返回路径是否经过（计划中）展开的目录。"""
+        from .operations import UnfoldOperation
+
+        target_root = self.config.target_root
+        try:
+            rel_parts = target_dir.relative_to(target_root).parts
+        except ValueError:
+            return False
+
+        passed = False
+        for i in range(1, len(rel_parts) + 1):
+            target = target_root.joinpath(*rel_parts[:i])
+            kind, link_src = self._planned_kind(target, unfolded)
+            passed = passed or target in unfolded
+            if kind == 'dir':
+                continue
+            if kind != 'link' or detector.real_dir(str(link_src)) == detector.real_dir(
+                    str(package.root.joinpath(*rel_parts[:i]))) or not self._is_package_dir(link_src):
+                # 不存在、是文件、已折叠到本包或是用户自己的目录链接：其下没有需要展开的折叠链接
+                break
+            entries = self._unfold_entries(link_src)
+            plan.add(UnfoldOperation(target, link_src, entries))
+            unfolded[target] = {n: link_src / n for n in entries}
+            passed = True
+        return passed
+
+    def _unfold_entries(self, src_dir: Path) -> List[str]:
+        """展开指向包内目录 src_dir 的折叠链接时需要链接的条目（排除 .git 与该包忽略规则匹配的条目）。"""
+        names = sorted(n for n in os.listdir(src_dir) if n != '.git')
+        rel = Path(os.path.relpath(os.path.realpath(src_dir), os.path.realpath(self.config.dotfiles_dir)))
+        package_root = Path(os.path.realpath(self.config.dotfiles_dir)) / rel.parts[0]
+        rules = IgnoreRules.for_package(package_root, self._global_ignores())
+        if not rules:
+            return names
+        dirs = [n for n in names if (src_dir / n).is_dir() and not (src_dir / n).is_symlink()]
+        kept_dirs, kept_files, _, _ = rules.filter(Path(*rel.parts[1:]).as_posix(), dirs,
+                                                   [n for n in names if n not in dirs])
+        return sorted(kept_dirs + kept_files)
+
+    def _is_package_dir(self, path: Optional[Path]) -> bool:
+        """路径是否为 dotfiles 仓库内某个包中的目录。"""
+        if path is None or not path.is_dir():
+            return False
+        repo = os.path.realpath(self.config.dotfiles_dir)
+        return os.path.realpath(path).startswith(repo + os.sep)
+
+    @classmethod
+    def _is_refoldable(cls, source: Path, target: Path) -> bool:
+        """
+        目标目录是否完全由指向源目录各条目的链接（或同样可折叠的子目录）组成，
+        即可以整体替换为单个折叠链接。
+        """
+        try:
+            expected = sorted(n for n in os.listdir(source) if n != '.git')
+            if sorted(os.listdir(target)) != expected:
+                return False
+        except OSError:
+            return False
+        for name in expected:
+            entry = target / name
+            if entry.is_symlink():
+                if os.path.realpath(entry) != os.path.realpath(source / name):
+                    return False
+            elif not (entry.is_dir() and cls._is_refoldable(source / name, entry)):
+                return False
+        return True
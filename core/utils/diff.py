@@ -1,34 +1,332 @@
 import difflib
+import os
+import stat
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# 默认上限：单个文件超过 MAX_BYTES 字节时不做逐行 diff，输出超过 MAX_LINES 行时截断
+MAX_BYTES = 2 * 1024 * 1024
+MAX_LINES = 5000
+# 二进制检测读取的字节数，以及逐块比较内容时的块大小
+SNIFF_BYTES = 8192
+CHUNK_SIZE = 1024 * 1024
+# 目录 diff 时并发比较文件内容的线程数
+DIFF_WORKERS = 4
+
+class DirComparison:
+    """两个目录树的比较结果（相对路径，按字典序排列）。"""
+    def __init__(self, source: Path, target: Path):
+        """初始化比较结果。"""
+        self.source = source
+        self.target = target
+        # 只在源目录中存在 / 只在目标目录中存在 / 两边都有但内容不同
+        self.added: List[str] = []
+        self.removed: List[str] = []
+        self.changed: List[str] = []
+        self.identical = 0
+
+    def summary(self) -> List[str]:
+        """按路径顺序列出所有差异条目。"""
+        lines = [f"Directories differ: {self.target} and {self.source} "
+                 f"({len(self.added)} added, {len(self.removed)} removed, {len(self.changed)} changed, "
+                 f"{self.identical} identical)"]
+        entries = ([(rel, "Only in source") for rel in self.added]
+                   + [(rel, "Only in target") for rel in self.removed]
+                   + [(rel, "Changed") for rel in self.changed])
+        for rel, kind in sorted(entries):
+            lines.append(f"{kind}: {rel}")
+        return lines
 
 class DiffViewer:
     """Diff 查看器工具。"""
     @staticmethod
-    def get_diff(source: Path, target: Path) -> List[str]:
+    def get_diff(source: Path, target: Path, max_bytes: int = MAX_BYTES, max_lines: int = MAX_LINES) -> List[str]:
         """
         生成文件差异。
         返回 Diff 行列表。
         """
+        return list(DiffViewer.iter_diff(source, target, max_bytes=max_bytes, max_lines=max_lines))
+
+    @staticmethod
+    def iter_diff(source: Path, target: Path, max_bytes: int = MAX_BYTES,
+                  max_lines: int = MAX_LINES) -> Iterator[str]:
+        """
+        逐行生成文件或目录的差异（用于流式输出）。
+        目录先输出新增/删除/修改条目的摘要，再逐个生成内容不同的文件的 diff。
+        内容相同时不输出任何行；二进制文件或超过 max_bytes 的文件只输出摘要；
+        输出超过 max_lines 行时截断。max_bytes / max_lines 为 0 或 None 表示不限制。
+        """
         if not source.exists() or not target.exists():
-            return ["One of the files does not exist."]
-        
-        if source.is_dir() or target.is_dir():
-            return ["Directory diff not supported yet."]
-            
+            yield "One of the files does not exist."
+            return
+
+        if source.is_dir() and target.is_dir():
+            comparison = DiffViewer.compare_dirs(source, target)
+            lines = DiffViewer._iter_dir_diff(comparison, max_bytes)
+        elif source.is_dir() or target.is_dir():
+            yield f"File and directory differ: {target} and {source}"
+            return
+        else:
+            lines = DiffViewer._iter_file_diff(source, target, max_bytes)
+
+        for count, line in enumerate(lines):
+            if max_lines and count >= max_lines:
+                yield f"... diff truncated after {max_lines} lines ..."
+                return
+            yield line
+
+    @staticmethod
+    def _iter_dir_diff(comparison: DirComparison, max_bytes: int) -> Iterator[str]:
+        """先输出摘要，再逐个（按需）生成内容不同的文件的 diff。"""
+        yield from comparison.summary()
+        for rel in comparison.changed:
+            source = comparison.source / rel
+            target = comparison.target / rel
+            if source.is_symlink() or target.is_symlink():
+                yield f"Symlinks differ: {target} -> {DiffViewer._describe(target)} and {source} -> {DiffViewer._describe(source)}"
+            elif source.is_file() and target.is_file():
+                yield from DiffViewer._iter_file_diff(source, target, max_bytes, changed=True)
+            else:
+                yield f"File types differ: {target} and {source}"
+
+    @staticmethod
+    def _describe(path: Path) -> str:
+        return os.readlink(path) if path.is_symlink() else "(not a symlink)"
+
+    @staticmethod
+    def _iter_file_diff(source: Path, target: Path, max_bytes: int, changed: bool = False) -> Iterator[str]:
+        """生成两个普通文件的差异；changed=True 表示已知内容不同，跳过相同性检查。"""
         try:
+            source_st = source.stat()
+            target_st = target.stat()
+            if not changed and DiffViewer.files_identical(source, target, source_st, target_st):
+                return
+
+            if DiffViewer.is_binary(source) or DiffViewer.is_binary(target):
+                yield f"Binary files differ: {target} ({target_st.st_size} bytes) and {source} ({source_st.st_size} bytes)"
+                return
+
+            if max_bytes and max(source_st.st_size, target_st.st_size) > max_bytes:
+                yield (f"Files differ but are too large to diff (limit {max_bytes} bytes): "
+                       f"{target} ({target_st.st_size} bytes) and {source} ({source_st.st_size} bytes)")
+                return
+
             with open(source, 'r', encoding='utf-8') as f:
                 source_lines = f.readlines()
             with open(target, 'r', encoding='utf-8') as f:
                 target_lines = f.readlines()
-                
+
             diff = difflib.unified_diff(
-                target_lines, 
-                source_lines, 
-                fromfile=str(target), 
+                target_lines,
+                source_lines,
+                fromfile=str(target),
                 tofile=str(source),
                 lineterm=''
             )
-            return list(diff)
+            yield from diff
+        except UnicodeDecodeError:
+            yield f"Binary files differ: {target} and {source}"
         except Exception as e:
-            return [f"Error generating diff: {e}"]
+            yield f"Error generating diff: {e}"
+
+    @staticmethod
+    def compare_dirs(source: Path, target: Path, workers: int = DIFF_WORKERS) -> DirComparison:
+        """
+        递归比较两个目录树。
+        大小不同的文件直接判为不同；大小和 mtime 都相同的文件视为相同（与 rsync 的快速检查一致）；
+        其余候选文件在线程池中并发逐块比较内容。
+        """
+        result = DirComparison(source, target)
+        source_entries = DiffViewer._walk(source)
+        target_entries = DiffViewer._walk(target)
+
+        candidates = []
+        def parent(rel: str) -> str:
+            return rel.rpartition("/")[0]
+
+        for rel, (s_kind, s_st) in source_entries.items():
+            t = target_entries.get(rel)
+            if t is None:
+                # 整个新增的目录只列出目录本身
+                if parent(rel) in target_entries or not parent(rel):
+                    result.added.append(rel)
+                continue
+            t_kind, t_st = t
+            if s_kind != t_kind:
+                result.changed.append(rel)
+            elif s_kind == "dir":
+                continue
+            elif s_kind == "link":
+                if os.readlink(source / rel) != os.readlink(target / rel):
+                    result.changed.append(rel)
+                else:
+                    result.identical += 1
+            elif s_st.st_size != t_st.st_size:
+                result.changed.append(rel)
+            elif s_st.st_mtime_ns == t_st.st_mtime_ns or (s_st.st_dev, s_st.st_ino) == (t_st.st_dev, t_st.st_ino):
+                result.identical += 1
+            else:
+                candidates.append((rel, s_st, t_st))
+        result.removed = [rel for rel in target_entries
+                          if rel not in source_entries and (not parent(rel) or parent(rel) in source_entries)]
+
+        def check(item: Tuple[str, os.stat_result, os.stat_result]) -> bool:
+            rel, s_st, t_st = item
+            try:
+                return DiffViewer.files_identical(source / rel, target / rel, s_st, t_st)
+            except OSError:
+                return False
+
+        if workers > 1 and len(candidates) > 1:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                same = list(pool.map(check, candidates))
+        else:
+            same = [check(item) for item in candidates]
+        for (rel, _, _), identical in zip(candidates, same):
+            if identical:
+                result.identical += 1
+            else:
+                result.changed.append(rel)
+
+        result.added.sort()
+        result.removed.sort()
+        result.changed.sort()
+        return result
+
+    @staticmethod
+    def _walk(root: Path) -> Dict[str, Tuple[str, os.stat_result]]:
+        """收集目录树中所有条目：相对路径 -> (类型, lstat 结果)。不跟随目录软链接。"""
+        entries = {}
+        stack = [("", os.fspath(root))]
+        while stack:
+            prefix, path = stack.pop()
+            try:
+                it = os.scandir(path)
+            except OSError:
+                continue
+            with it:
+                for entry in it:
+                    rel = prefix + entry.name
+                    try:
+                        st = entry.stat(follow_symlinks=False)
+                    except OSError:
+                        continue
+                    if stat.S_ISLNK(st.st_mode):
+                        entries[rel] = ("link", st)
+                    elif stat.S_ISDIR(st.st_mode):
+                        entries[rel] = ("dir", st)
+                        stack.append((rel + "/", entry.path))
+                    else:
+                        entries[rel] = ("file", st)
+        return entries
+
+    @staticmethod
+    def files_identical(a: Path, b: Path, a_st: Optional[os.stat_result] = None,
+                        b_st: Optional[os.stat_result] = None) -> bool:
+        """先比较大小（以及是否为同一文件），再逐块比较内容。"""
+        a_st = a_st or a.stat()
+        b_st = b_st or b.stat()
+        if a_st.st_size != b_st.st_size:
+            return False
+        if (a_st.st_dev, a_st.st_ino) == (b_st.st_dev, b_st.st_ino):
+            return True
+        with open(a, 'rb') as fa, open(b, 'rb') as fb:
+            while True:
+                chunk = fa.read(CHUNK_SIZE)
+                if chunk != fb.read(CHUNK_SIZE):
+                    return False
+                if not chunk:
+                    return True
+
+    @staticmethod
+    def is_binary(path: Path) -> bool:
+        """文件开头包含 NUL 字节时视为二进制文件。"""
+        with open(path, 'rb') as f:
+            return b'\0' in f.read(SNIFF_BYTES)
+
+class DiffCache:
+    """
+    文件 diff 结果的 LRU 缓存，按条目数和总字节数限制大小。
+    键包含两侧文件的 (dev, inode, size, mtime_ns)，任一侧被修改后自然失效；目录 diff 不缓存。
+    """
+    def __init__(self, max_entries: int = 128, max_bytes: int = 32 * 1024 * 1024):
+        """初始化缓存。"""
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[tuple, Tuple[List[str], int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(source: Path, target: Path) -> Optional[tuple]:
+        """两侧都是普通文件时返回缓存键，否则返回 None（不缓存）。"""
+        try:
+            s_st = os.stat(source)
+            t_st = os.stat(target)
+        except OSError:
+            return None
+        if not (stat.S_ISREG(s_st.st_mode) and stat.S_ISREG(t_st.st_mode)):
+            return None
+        return (os.fspath(source), os.fspath(target),
+                s_st.st_dev, s_st.st_ino, s_st.st_size, s_st.st_mtime_ns,
+                t_st.st_dev, t_st.st_ino, t_st.st_size, t_st.st_mtime_ns)
+
+    def iter_diff(self, source: Path, target: Path, max_bytes: int = MAX_BYTES,
+                  max_lines: int = MAX_LINES) -> Iterator[str]:
+        """与 DiffViewer.iter_diff 相同，命中时直接从内存输出，未命中时边输出边缓存完整结果。"""
+        key = self.key(source, target)
+        if key is not None:
+            key += (max_bytes, max_lines)
+            with self._lock:
+                cached = self._entries.get(key)
+                if cached is not None:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                else:
+                    self.misses += 1
+            if cached is not None:
+                yield from cached[0]
+                return
+
+        lines = []
+        size = 0
+        for line in DiffViewer.iter_diff(source, target, max_bytes=max_bytes, max_lines=max_lines):
+            yield line
+            if key is not None and size <= self.max_bytes:
+                lines.append(line)
+                size += len(line)
+        if key is not None:
+            self._store(key, lines, size)
+
+    def _store(self, key: tuple, lines: List[str], size: int) -> None:
+        if size > self.max_bytes or self.max_entries <= 0:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[key] = (lines, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._bytes -= evicted
+                self.evictions += 1
+
+    def clear(self) -> None:
+        """清空缓存（计数器保留）。"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        """返回命中/未命中计数及当前占用，用于调整上限。"""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                    "entries": len(self._entries), "bytes": self._bytes,
+                    "max_entries": self.max_entries, "max_bytes": self.max_bytes}
@@ -0,0 +1,287 @@
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import struct
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from .cache import ScanCache
+
+logger = logging.getLogger(__name__)
+
+# inotify 事件掩码 (linux/inotify.h)
+IN_ATTRIB = 0x00000004
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = (IN_ATTRIB | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+              | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR)
+_EVENT_HEADER = struct.Struct("iIII")
+
+class InotifyWatcher:
+    """基于 inotify（通过 ctypes 调用 libc）的目录监视器，仅适用于 Linux。"""
+    def __init__(self):
+        """初始化 inotify 实例，不可用时抛出 OSError。"""
+        libc_name = ctypes.util.find_library("c") or "libc.so.6"
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(self._libc, "inotify_init1"):
+            raise OSError("inotify is not available / inotify 不可用")
+        self._libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self._libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        self._fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+        self._paths: Dict[int, Set[str]] = {}
+        self._wds: Dict[str, int] = {}
+
+    def add(self, path: str) -> None:
+        """监视目录（已监视时忽略）。"""
+        if path in self._wds:
+            return
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            logger.warning(f"Cannot watch {path} / 无法监视 {path}: {os.strerror(err)}")
+            return
+        self._wds[path] = wd
+        self._paths.setdefault(wd, set()).add(path)
+
+    def discard(self, path: str) -> None:
+        """停止监视目录。"""
+        wd = self._wds.pop(path, None)
+        if wd is None:
+            return
+        paths = self._paths.get(wd, set())
+        paths.discard(path)
+        if not paths:
+            self._paths.pop(wd, None)
+            self._libc.inotify_rm_watch(self._fd, wd)
+
+    def watched(self) -> Set[str]:
+        """返回当前监视的目录集合。"""
+        return set(self._wds)
+
+    def read(self, timeout: float) -> Set[str]:
+        """等待事件（最多 timeout 秒），返回发生变化的目录集合。"""
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if not ready:
+            return set()
+
+        changed = set()
+        while True:
+            try:
+                data = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset + _EVENT_HEADER.size <= len(data):
+                wd, mask, _cookie, length = _EVENT_HEADER.unpack_from(data, offset)
+                offset += _EVENT_HEADER.size + length
+                paths = self._paths.get(wd, set())
+                changed.update(paths)
+                if mask & IN_IGNORED:
+                    for path in paths:
+                        self._wds.pop(path, None)
+                    self._paths.pop(wd, None)
+        return changed
+
+    def close(self) -> None:
+        """关闭 inotify 文件描述符。"""
+        os.close(self._fd)
+
+class PollingWatcher:
+    """可移植的轮询监视器：定期比较目录的 (mtime, inode) 签名。"""
+    def __init__(self, interval: float = 1.0):
+        """初始化监视器。"""
+        self.interval = interval
+        self._sigs: Dict[str, Optional[Tuple[int, int]]] = {}
+
+    @staticmethod
+    def _signature(path: str) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_ino
+
+    def add(self, path: str) -> None:
+        """监视目录（已监视时忽略）。"""
+        if path not in self._sigs:
+            self._sigs[path] = self._signature(path)
+
+    def discard(self, path: str) -> None:
+        """停止监视目录。"""
+        self._sigs.pop(path, None)
+
+    def watched(self) -> Set[str]:
+        """返回当前监视的目录集合。"""
+        return set(self._sigs)
+
+    def read(self, timeout: float) -> Set[str]:
+        """等待一个轮询周期（不超过 timeout 秒），返回签名发生变化的目录集合。"""
+        time.sleep(min(timeout, self.interval))
+        changed = set()
+        for path, old in list(self._sigs.items()):
+            sig = self._signature(path)
+            if sig != old:
+                self._sigs[path] = sig
+                changed.add(path)
+        return changed
+
+    def close(self) -> None:
+        """轮询监视器无需释放资源。"""
+        pass
+
+def create_watcher(poll_interval: float = 1.0):
+    """优先使用 inotify，不可用时回退到轮询。"""
+    try:
+        return InotifyWatcher()
+    except (OSError, AttributeError) as e:
+        logger.info(f"inotify unavailable, falling back to polling / inotify 不可用，改用轮询: {e}")
+        return PollingWatcher(poll_interval)
+
+class WatchDaemon:
+    """
+    文件系统监视守护线程。
+    监视 dotfiles 仓库中的包目录和已部署目标所在的目录，增量更新 ScanCache 中的包状态：
+    源目录变化时重新扫描对应的包，目标目录变化时只重新检测受影响的文件。
+    """
+    def __init__(self, cache: ScanCache, on_change: Callable[[List[str]], None] = None,
+                 watcher=None, debounce: float = 0.2):
+        """初始化守护线程（调用 start() 后开始监视）。"""
+        self.cache = cache
+        self.on_change = on_change
+        self.watcher = watcher or create_watcher()
+        self.debounce = debounce
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        # 被监视的源目录 -> 包名；被监视的目标目录 -> 受影响的 (包名, 包内相对目录)
+        # 只保存名称，处理事件时再到缓存中查找当前的包（缓存中的包会被重新扫描替换）
+        self._sources: Dict[str, Set[str]] = {}
+        self._targets: Dict[str, List[Tuple[str, str]]] = {}
+        # 代替尚不存在的目标目录被监视的祖先目录；计算监视集合所依据的 {包名: 包内目录}
+        self._proxies: Set[str] = set()
+        self._layout: Optional[Dict[str, Tuple[str, ...]]] = None
+
+    def start(self) -> None:
+        """在后台线程中开始监视。"""
+        self._rebuild()
+        self._thread = threading.Thread(target=self._run, name="dotkeeper-watch", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """停止监视并等待线程退出。"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.watcher.close()
+
+    def run_forever(self) -> None:
+        """在当前线程中监视，直到 stop() 或 KeyboardInterrupt。"""
+        self._rebuild()
+        self._run()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            changed = self.watcher.read(timeout=0.5)
+            if not changed:
+                continue
+            # 合并短时间内的连续事件
+            deadline = time.monotonic() + self.debounce
+            while time.monotonic() < deadline:
+                changed |= self.watcher.read(timeout=max(0.0, deadline - time.monotonic()))
+            try:
+                self._process(changed)
+            except Exception:
+                logger.exception("Watch update failed / 监视更新失败")
+
+    def _process(self, changed: Set[str]) -> None:
+        """根据变化的目录更新缓存并通知。"""
+        rescan = set()
+        dirs = []
+        for path in changed:
+            rescan |= self._sources.get(path, set())
+            dirs.extend(self._targets.get(path, ()))
+
+        updated = set()
+        if str(self.cache.service.config.dotfiles_dir) in changed:
+            # 仓库根目录变化意味着新增或删除了包，整体重新扫描
+            before = {pkg.name for pkg in self.cache.packages()}
+            self.cache.invalidate()
+            after = {pkg.name for pkg in self.cache.packages()}
+            updated |= before | after
+            rescan = after
+        elif rescan:
+            self.cache.invalidate(rescan)
+            self.cache.packages()
+            updated |= rescan
+        dirs = [(name, rel_dir) for name, rel_dir in dirs if name not in rescan]
+        updated |= self.cache.redetect(dirs)
+
+        # 目录的增删会改变需要监视的集合
+        self._rebuild(changed)
+        if updated and self.on_change:
+            self.on_change(sorted(updated))
+
+    def _rebuild(self, changed: Optional[Set[str]] = None) -> None:
+        """
+        根据当前缓存的包重新计算需要监视的目录（按目录计算，不逐个访问文件）。
+        给出 changed 时，只有包的目录结构变化、代替不存在目录的祖先发生变化，
+        或被监视的目标目录被删除时才重新计算。
+        """
+        packages = self.cache.packages()
+        layout = {pkg.name: tuple(pkg.dirs()) for pkg in packages}
+        if (changed is not None and layout == self._layout and not (changed & self._proxies)
+                and all(os.path.isdir(path) for path in changed if path in self._targets)):
+            return
+
+        sources: Dict[str, Set[str]] = {}
+        targets: Dict[str, List[Tuple[str, str]]] = {}
+        proxies: Set[str] = set()
+        target_root = self.cache.service.config.target_root
+
+        # 仓库根目录本身也要监视，以发现新增或删除的包
+        sources[str(self.cache.service.config.dotfiles_dir)] = set()
+        for pkg in packages:
+            for dirpath in self._package_dirs(pkg):
+                sources.setdefault(dirpath, set()).add(pkg.name)
+            for rel_dir in layout[pkg.name]:
+                # 目标所在目录不存在时监视最近的已存在祖先，以便捕获目录创建
+                candidate = target_root / rel_dir
+                while not candidate.is_dir() and candidate != candidate.parent:
+                    candidate = candidate.parent
+                watch_dir = str(candidate)
+                if candidate != target_root / rel_dir:
+                    proxies.add(watch_dir)
+                targets.setdefault(watch_dir, []).append((pkg.name, rel_dir))
+
+        self._sources, self._targets, self._proxies, self._layout = sources, targets, proxies, layout
+
+        wanted = set(sources) | set(targets)
+        for path in self.watcher.watched() - wanted:
+            self.watcher.discard(path)
+        for path in wanted:
+            self.watcher.add(path)
+
+    @staticmethod
+    def _package_dirs(pkg) -> Set[str]:
+        """包内所有包含文件的目录及其祖先（直到包根目录）。"""
+        dirs = {str(pkg.root)}
+        for rel_dir in pkg.dirs():
+            parent = pkg.root / rel_dir
+            while str(parent) not in dirs:
+                dirs.add(str(parent))
+                parent = parent.parent
+        return dirs
@@ -1,10 +1,12 @@
 import argparse
+import os
 import sys
 import logging
+from pathlib import Path
 
 from core.config import AppConfig
-from core.service import DotfilesService
-from core.executor import Executor
+from core.service import DotfilesService, GIT_TIMEOUT
+from core.metrics import METRICS
 from gui.console import ConsoleUI
 
 # 设置日志
@@ -20,6 +22,20 @@ def setup_parser() -> argparse.ArgumentParser:
     parser.add_argument("--dry-run", action="store_true", help="仅显示计划不执行 (空跑)")
     parser.add_argument("--no-browser", action="store_true", help="Web 模式下不自动打开浏览器")
     parser.add_argument("--port", type=int, default=9012, help="Web 服务器端口")
+    parser.add_argument("--fold", action="store_true", help="部署时折叠目录 (目标目录不存在时只创建一个目录链接)")
+    parser.add_argument("--no-watch", action="store_true", help="Web 模式下不监视文件系统变化")
+    parser.add_argument("--no-journal", action="store_true", help="执行计划时不写入操作日志 (无法 resume / rollback)")
+    parser.add_argument("--no-index", action="store_true", help="禁用持久化扫描索引 (~/.cache/dotkeeper)")
+    parser.add_argument("--scan-workers", type=int, default=1, help="并发扫描线程数 (默认: 1，即串行)")
+    parser.add_argument("--apply-workers", type=int, default=1, help="并发执行操作的线程数 (默认: 1，即串行)")
+    parser.add_argument("--ignore-file", default=None,
+                        help="全局忽略规则文件 (默认: <dotfiles>/.dotkeeper-ignore；包内可另有 .dotkeeper-ignore)")
+    parser.add_argument("--no-default-ignores", action="store_true",
+                        help="不使用内置忽略规则 (编辑器交换文件、__pycache__ 等)")
+    parser.add_argument("--binaries-file", default=None,
+                        help="包名到可执行文件名的映射文件，用于判断程序是否已安装 (默认: <dotfiles>/.dotkeeper-binaries)")
+    parser.add_argument("--profile", action="store_true",
+                        help="采集各阶段耗时、文件系统调用与缓存命中等指标，结束时输出到 stderr (Web 模式见 /api/metrics)")
     
     subparsers = parser.add_subparsers(dest="command", required=False)
     
@@ -28,15 +44,49 @@ def setup_parser() -> argparse.ArgumentParser:
     
     # 部署命令
     deploy_parser = subparsers.add_parser("deploy", help="部署包")
-    deploy_parser.add_argument("package", help="包名")
+    deploy_parser.add_argument("packages", nargs="*", metavar="package", help="包名 (可指定多个)")
+    deploy_parser.add_argument("--all", action="store_true", help="部署所有包")
     
     # 恢复命令
     restore_parser = subparsers.add_parser("restore", help="恢复包 (撤销)")
-    restore_parser.add_argument("package", help="包名")
+    restore_parser.add_argument("packages", nargs="*", metavar="package", help="包名 (可指定多个)")
+    restore_parser.add_argument("--all", action="store_true", help="恢复所有包")
+
+    # 多目标部署命令
+    fanout_parser = subparsers.add_parser("fanout", help="把包并发部署到多个目标根目录 (仓库只扫描一次)")
+    fanout_parser.add_argument("packages", nargs="*", metavar="package", help="包名 (可指定多个)")
+    fanout_parser.add_argument("--all", action="store_true", help="部署所有包")
+    fanout_parser.add_argument("--targets", nargs="+", default=[], help="目标根目录列表")
+    fanout_parser.add_argument("--targets-file", default=None, help="每行一个目标根目录的文件 (# 开头为注释)")
+    fanout_parser.add_argument("--workers", type=int, default=None, help="进程数 (默认: CPU 核数)")
+    fanout_parser.add_argument("--report", default=None, help="把逐目标结果以 JSON 写入该文件")
 
     # 备份 .config 命令
-    subparsers.add_parser("backup-config", help="备份用户目录下的 .config 文件夹")
+    backup_parser = subparsers.add_parser("backup-config", help="备份用户目录下的 .config 文件夹")
+    backup_parser.add_argument("--mode", choices=["copy", "incremental", "archive"], default=None,
+                               help="备份方式: copy 完整复制，incremental 未变化的文件硬链接到上一个快照，archive 压缩归档 (默认: copy)")
+    backup_parser.add_argument("--compression", choices=["gz", "xz", "bz2"], default=None,
+                               help="归档模式的压缩方式 (默认: gz)")
+    backup_parser.add_argument("--split-size", default=None, help="归档分卷大小 (未压缩字节数，如 500M)")
+    backup_parser.add_argument("--split-count", type=int, default=None, help="每个归档分卷最多包含的条目数")
+
+    # 从 .config 归档恢复单个文件
+    restore_config_parser = subparsers.add_parser("restore-config", help="从 .config 归档中恢复单个文件")
+    restore_config_parser.add_argument("archive", help="归档清单路径 (<name>.index.json)")
+    restore_config_parser.add_argument("member", help="归档中的相对路径 (如 nvim/init.lua)")
+    restore_config_parser.add_argument("--output", default=None, help="输出路径 (默认: 恢复到 .config 下的原位置)")
     
+    # 同步命令
+    sync_parser = subparsers.add_parser("sync", help="git pull 并报告变更涉及的包与已部署链接")
+    sync_parser.add_argument("--timeout", type=float, default=None, help="git 命令超时秒数 (默认: 120)")
+
+    # 继续 / 回滚中断的计划
+    subparsers.add_parser("resume", help="继续执行最近一次中断的计划")
+    subparsers.add_parser("rollback", help="撤销最近一次执行的计划")
+
+    # 监视命令
+    subparsers.add_parser("watch", help="监视文件系统并实时显示包状态变化")
+
     # Web 服务命令
     subparsers.add_parser("web", help="启动 Web GUI")
 
@@ -48,13 +98,24 @@ def main():
     
     # argparse does not accept global options after subcommand (e.g. "backup-config --dry-run").
     # Normalize argv so global options can appear either before or after the subcommand.
-    known_commands = {"scan", "deploy", "restore", "backup-config", "web"}
+    known_commands = {"scan", "deploy", "restore", "fanout", "sync", "backup-config", "restore-config", "resume",
+                      "rollback", "watch", "web"}
     global_opts = {
         "--dry-run": 0,
         "--no-browser": 0,
+        "--no-index": 0,
+        "--no-journal": 0,
+        "--no-watch": 0,
+        "--fold": 0,
+        "--profile": 0,
+        "--no-default-ignores": 0,
         "--dotfiles": 1,
         "--target": 1,
         "--port": 1,
+        "--scan-workers": 1,
+        "--apply-workers": 1,
+        "--ignore-file": 1,
+        "--binaries-file": 1,
     }
 
     argv = sys.argv[1:]
@@ -103,7 +164,16 @@ def main():
     
     config = AppConfig(
         dotfiles_dir=args.dotfiles,
-        target_root=args.target
+        target_root=args.target,
+        scan_workers=args.scan_workers,
+        use_index=not args.no_index,
+        fold=args.fold,
+        apply_workers=args.apply_workers,
+        use_journal=not args.no_journal,
+        profile=args.profile,
+        ignore_file=args.ignore_file,
+        default_ignores=not args.no_default_ignores,
+        binaries_file=args.binaries_file
     )
     
     service = DotfilesService(config)
@@ -111,7 +181,7 @@ def main():
     try:
         if args.command == "web" or args.command is None:
             from gui.web_server import run_server
-            run_server(config, service, port=args.port, open_browser=not args.no_browser)
+            run_server(config, service, port=args.port, open_browser=not args.no_browser, watch=not args.no_watch)
             return
 
         # 命令行模式
@@ -121,53 +191,137 @@ def main():
             packages = service.scan_packages()
             ui.show_packages(packages)
             
-        elif args.command == "deploy":
-            packages = service.scan_packages()
-            pkg = next((p for p in packages if p.name == args.package), None)
-            if not pkg:
-                ui.show_error(f"Package '{args.package}' not found / 未找到包 '{args.package}'。")
+        elif args.command in ("deploy", "restore"):
+            if not args.packages and not args.all:
+                ui.show_error("Specify package names or --all / 请指定包名或 --all。")
                 sys.exit(1)
-            
-            plan = service.deploy(pkg)
-            ui.show_plan(plan)
-            if not plan.is_empty():
-                if args.dry_run:
-                    ui.show_message("\nThis was a dry-run. Use without --dry-run to apply. / 这是一个空跑。使用无 --dry-run 参数来执行。")
-                else:
-                    Executor.run(plan, dry_run=False)
-                    
-        elif args.command == "restore":
-            packages = service.scan_packages()
-            pkg = next((p for p in packages if p.name == args.package), None)
-            if not pkg:
-                ui.show_error(f"Package '{args.package}' not found / 未找到包 '{args.package}'。")
+
+            # 一次扫描所有指定的包，合并为一个计划
+            packages, missing = service.scan_selected(None if args.all else args.packages)
+            for name in missing:
+                ui.show_error(f"Package '{name}' not found / 未找到包 '{name}'。")
+            if missing:
+                sys.exit(1)
+
+            action = "link" if args.command == "deploy" else "unlink"
+            try:
+                plan = service.plan_batch(packages, action=action)
+            except ValueError as e:
+                ui.show_error(str(e))
                 sys.exit(1)
-            
-            plan = service.restore(pkg)
             ui.show_plan(plan)
             if not plan.is_empty():
                 if args.dry_run:
                     ui.show_message("\nThis was a dry-run. Use without --dry-run to apply. / 这是一个空跑。使用无 --dry-run 参数来执行。")
                 else:
-                    Executor.run(plan, dry_run=False)
+                    service.execute(plan, dry_run=False)
+
+        elif args.command == "fanout":
+            from core.fanout import FanoutDeployer
+
+            if not args.packages and not args.all:
+                ui.show_error("Specify package names or --all / 请指定包名或 --all。")
+                sys.exit(1)
+            targets = list(args.targets)
+            if args.targets_file:
+                with open(os.path.expanduser(args.targets_file), encoding="utf-8") as f:
+                    targets.extend(line.strip() for line in f if line.strip() and not line.lstrip().startswith("#"))
+            if not targets:
+                ui.show_error("Specify --targets or --targets-file / 请指定 --targets 或 --targets-file。")
+                sys.exit(1)
+
+            reports, missing = FanoutDeployer.run(config, targets, None if args.all else args.packages,
+                                                  dry_run=args.dry_run, workers=args.workers)
+            for name in missing:
+                ui.show_error(f"Package '{name}' not found / 未找到包 '{name}'。")
+            if missing:
+                sys.exit(1)
+            ui.show_fanout_report(reports)
+            if args.report:
+                import json
+                from dataclasses import asdict
+
+                with open(os.path.expanduser(args.report), "w", encoding="utf-8") as f:
+                    json.dump([asdict(report) for report in reports], f, indent=2)
+            if args.dry_run:
+                ui.show_message("\nThis was a dry-run. Use without --dry-run to apply. / 这是一个空跑。使用无 --dry-run 参数来执行。")
+            if any(report.status != "ok" for report in reports):
+                sys.exit(1)
+
+        elif args.command == "sync":
+            result = service.sync_remote(timeout=args.timeout or GIT_TIMEOUT)
+            for log in result.logs:
+                ui.show_message(log.rstrip())
+            if not result.ok:
+                sys.exit(1)
+            # 只扫描变更涉及的包（无法确定范围时扫描全部包）
+            names = None if result.full else list(result.package_changes())
+            packages, _ = service.scan_selected(names) if names != [] else ([], [])
+            if packages:
+                ui.show_packages(packages)
+            for name, dotfile in service.changed_links(result, packages):
+                ui.show_message(f"Changed content / 内容已变化: [{name}] {dotfile.target} -> {dotfile.source}")
+
+        elif args.command in ("resume", "rollback"):
+            if args.command == "resume":
+                logs = service.resume(dry_run=args.dry_run)
+            else:
+                logs = service.rollback(dry_run=args.dry_run)
+            # 执行日志已通过 logging 输出
+            if logs is None:
+                ui.show_message("No journaled plan to process. / 没有可处理的计划日志。")
+            elif args.dry_run:
+                ui.show_message("\nThis was a dry-run. Use without --dry-run to apply. / 这是一个空跑。使用无 --dry-run 参数来执行。")
+
+        elif args.command == "watch":
+            from core.cache import ScanCache
+            from core.watcher import WatchDaemon
+
+            cache = ScanCache(service)
+            ui.show_packages(cache.packages())
+
+            def on_change(names):
+                ui.show_packages([p for p in cache.packages() if p.name in names])
+
+            ui.show_message("Watching for changes (Ctrl+C to stop) / 正在监视变化 (Ctrl+C 停止)...")
+            try:
+                WatchDaemon(cache, on_change=on_change).run_forever()
+            except KeyboardInterrupt:
+                pass
 
         elif args.command == "backup-config":
-            plan, backup_path = service.backup_config_dir()
+            from core.backup import parse_size
+
+            plan, backup_path = service.backup_config_dir(mode=args.mode, compression=args.compression,
+                                                          max_bytes=parse_size(args.split_size),
+                                                          max_files=args.split_count)
             ui.show_plan(plan)
             if plan.is_empty():
                 ui.show_message(".config not found or nothing to backup. / 未找到 .config 或无可备份内容。")
             else:
                 if args.dry_run:
-                    Executor.run(plan, dry_run=True)
+                    service.execute(plan, dry_run=True)
                     ui.show_message("\nThis was a dry-run. Use without --dry-run to apply. / 这是一个空跑。使用无 --dry-run 参数来执行。")
                 else:
-                    Executor.run(plan, dry_run=False)
+                    service.execute(plan, dry_run=False)
                     if backup_path:
                         ui.show_message(f"Backup created at: {backup_path} / 备份位置: {backup_path}")
                     
+        elif args.command == "restore-config":
+            output = Path(os.path.expanduser(args.output)) if args.output else None
+            plan = service.restore_config_file(Path(args.archive), args.member, output)
+            ui.show_plan(plan)
+            if args.dry_run:
+                ui.show_message("\nThis was a dry-run. Use without --dry-run to apply. / 这是一个空跑。使用无 --dry-run 参数来执行。")
+            else:
+                service.execute(plan, dry_run=False)
+                    
     except Exception as e:
         logger.exception("An error occurred / 发生错误")
         sys.exit(1)
+    finally:
+        if args.profile:
+            print("\n".join(METRICS.report()), file=sys.stderr)
 
 if __name__ == "__main__":
     main()
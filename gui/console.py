@@ -17,8 +17,7 @@ class ConsoleUI(UserInterface):
                 FileState.MISSING: 0,
                 FileState.ORPHAN: 0
             }
-            for f in pkg.files:
-                file_stats[f.state] += 1
+            file_stats.update(pkg.state_counts())
             
             details = ", ".join([f"{k.value}:{v}" for k, v in file_stats.items() if v > 0])
             print(f"{idx:<3} {pkg.name:<20} {pkg.status:<15} {details}")
@@ -35,6 +34,18 @@ class ConsoleUI(UserInterface):
             print(f" - {op.dry_run()}")
         print("")
 
+    def show_fanout_report(self, reports) -> None:
+        """显示多目标部署的逐目标汇总。"""
+        print(f"\n{'Target / 目标':<40} {'Result / 结果':<8} {'Ops / 操作':>10} {'Time / 耗时':>12}  {'Before / 部署前'}")
+        print("-" * 100)
+        for report in reports:
+            details = ", ".join(f"{k}:{v}" for k, v in report.states.items())
+            print(f"{report.target_root:<40} {report.status:<8} {report.operations:>10} "
+                  f"{report.seconds * 1000:>9.1f} ms  {details}")
+            if report.error:
+                print(f"    {report.error}")
+        print("-" * 100)
+
     def confirm(self, message: str) -> bool:
         """请求确认。"""
         try:
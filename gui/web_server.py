@@ -1,27 +1,72 @@
+import gzip
 import json
 import http.server
-import socketserver
-import webbrowser
+import queue
+import threading
 import logging
 import sys
 import os
 from pathlib import Path
-from urllib.parse import urlparse, parse_qs
-from typing import Any
+from urllib.parse import urlparse, parse_qs, unquote
+from typing import Any, List
 
-from core.utils.diff import DiffViewer
 from core.config import AppConfig
 from core.service import DotfilesService
 from core.models import Package, FileState
-from core.executor import Executor
+from core.executor import OperationPlan
+from core.cache import ScanCache
+from core.watcher import WatchDaemon
+from core.backup import parse_size
+from core.metrics import METRICS
 
 logger = logging.getLogger(__name__)
 
+# 小于该字节数的响应不压缩
+GZIP_MIN_BYTES = 1024
+# 目录层级接口每页默认返回的条目数
+DIR_PAGE_SIZE = 200
+
+class EventHub:
+    """Server-Sent Events 广播器：每个订阅的连接持有一个队列。"""
+    def __init__(self):
+        """初始化广播器。"""
+        self._lock = threading.Lock()
+        self._subscribers: List[queue.Queue] = []
+
+    def subscribe(self) -> queue.Queue:
+        """订阅事件。"""
+        q = queue.Queue(maxsize=100)
+        with self._lock:
+            self._subscribers.append(q)
+        return q
+
+    def unsubscribe(self, q: queue.Queue) -> None:
+        """取消订阅。"""
+        with self._lock:
+            if q in self._subscribers:
+                self._subscribers.remove(q)
+
+    def publish(self, event: str, data: Any) -> None:
+        """向所有订阅者广播事件；跟不上的订阅者会丢弃事件。"""
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for q in subscribers:
+            try:
+                q.put_nowait((event, data))
+            except queue.Full:
+                pass
+
 class DotfilesHandler(http.server.SimpleHTTPRequestHandler):
     """处理 Dotfiles Web 请求的 HTTP 处理器。"""
-    def __init__(self, *args, config: AppConfig = None, service: DotfilesService = None, **kwargs):
+    def __init__(self, *args, config: AppConfig = None, service: DotfilesService = None,
+                 cache: ScanCache = None, apply_lock: threading.Lock = None,
+                 events: EventHub = None, **kwargs):
         self.config = config
         self.service = service
+        self.cache = cache or ScanCache(service)
+        # 请求并发处理，但对文件系统的修改串行执行
+        self.apply_lock = apply_lock or threading.Lock()
+        self.events = events or EventHub()
         # 设置静态文件服务目录
         static_dir = Path(__file__).parent / "static"
         super().__init__(*args, directory=str(static_dir), **kwargs)
@@ -34,14 +79,40 @@ class DotfilesHandler(http.server.SimpleHTTPRequestHandler):
         """处理 GET 请求。"""
         parsed = urlparse(self.path)
         if parsed.path == '/api/scan':
-            self.handle_api_scan()
+            query = parse_qs(parsed.query)
+            self.handle_api_scan(refresh=query.get('refresh', ['0'])[0] == '1',
+                                 compact=query.get('compact', ['0'])[0] == '1')
+        elif parsed.path == '/api/packages':
+            query = parse_qs(parsed.query)
+            self.handle_api_packages(refresh=query.get('refresh', ['0'])[0] == '1')
+        elif parsed.path.startswith('/api/packages/'):
+            # dir= 为空表示包根目录
+            query = parse_qs(parsed.query, keep_blank_values=True)
+            name = unquote(parsed.path[len('/api/packages/'):])
+            directory = query.get('dir', [None])[0]
+            if directory is None:
+                self.handle_api_package(name)
+            else:
+                try:
+                    offset = max(0, int(query.get('offset', ['0'])[0]))
+                    limit = max(1, int(query.get('limit', [str(DIR_PAGE_SIZE)])[0]))
+                except ValueError:
+                    self.send_api_error("offset and limit must be integers / offset 与 limit 必须是整数", code=400)
+                    return
+                self.handle_api_package_dir(name, directory, offset=offset, limit=limit)
+        elif parsed.path == '/api/events':
+            self.handle_api_events()
         elif parsed.path == '/api/config':
             self.handle_api_config()
+        elif parsed.path == '/api/diff/stats':
+            self.send_json(self.service.diff_cache.stats())
+        elif parsed.path == '/api/metrics':
+            self.handle_api_metrics()
         elif parsed.path == '/api/diff':
             query = parse_qs(parsed.query)
             source = query.get('source', [None])[0]
             target = query.get('target', [None])[0]
-            self.handle_api_diff(source, target)
+            self.handle_api_diff(source, target, stream=query.get('stream', ['0'])[0] == '1')
         else:
             super().do_GET()
 
@@ -63,15 +134,62 @@ class DotfilesHandler(http.server.SimpleHTTPRequestHandler):
         else:
             self.send_error(404, "Not Found")
 
-    def send_json(self, data: Any):
-        """发送 JSON 响应。"""
-        response = json.dumps(data).encode('utf-8')
+    def send_json(self, data: Any, etag: str = None):
+        """
+        发送 JSON 响应。
+        客户端接受 gzip 时压缩较大的响应；给出 etag 时附带 ETag 头（调用方负责先检查 not_modified）。
+        """
+        response = json.dumps(data, separators=(',', ':')).encode('utf-8')
         self.send_response(200)
         self.send_header('Content-type', 'application/json')
+        if etag:
+            self.send_header('ETag', etag)
+            # 每次都向服务器确认，未变化时由 304 复用浏览器缓存
+            self.send_header('Cache-Control', 'no-cache')
+        if len(response) >= GZIP_MIN_BYTES:
+            self.send_header('Vary', 'Accept-Encoding')
+            if self.accepts_gzip():
+                response = gzip.compress(response, compresslevel=6)
+                self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(response)))
+        self.end_headers()
+        self.wfile.write(response)
+
+    def handle_api_metrics(self):
+        """
+        以 Prometheus 文本格式输出指标。
+        未使用 --profile 时只有 Diff 缓存等组件始终维护的计数。
+        """
+        stats = self.service.diff_cache.stats()
+        response = METRICS.render(caches={"diff": (stats["hits"], stats["misses"])}).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-type', 'text/plain; version=0.0.4; charset=utf-8')
         self.send_header('Content-Length', str(len(response)))
         self.end_headers()
         self.wfile.write(response)
 
+    def accepts_gzip(self) -> bool:
+        """客户端是否接受 gzip 编码。"""
+        for part in self.headers.get('Accept-Encoding', '').split(','):
+            coding, _, params = part.strip().partition(';')
+            if coding.strip().lower() in ('gzip', '*') and params.replace(' ', '') != 'q=0':
+                return True
+        return False
+
+    def not_modified(self, etag: str) -> bool:
+        """If-None-Match 与 etag 匹配时发送 304 并返回 True。"""
+        header = self.headers.get('If-None-Match')
+        if not header:
+            return False
+        tags = {tag.strip().removeprefix('W/') for tag in header.split(',')}
+        if '*' not in tags and etag.removeprefix('W/') not in tags:
+            return False
+        self.send_response(304)
+        self.send_header('ETag', etag)
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        return True
+
     def send_api_error(self, message: str, code=400):
         """发送 API 错误响应。"""
         self.send_response(code)
@@ -80,10 +198,56 @@ class DotfilesHandler(http.server.SimpleHTTPRequestHandler):
         response = json.dumps({"status": "error", "message": message}).encode('utf-8')
         self.wfile.write(response)
 
+    def run_plan(self, plan: OperationPlan, dry_run: bool) -> List[str]:
+        """执行计划，并使受影响的包缓存失效。"""
+        if dry_run:
+            return self.service.execute(plan, dry_run=True)
+        with self.apply_lock:
+            try:
+                return self.service.execute(plan, dry_run=False)
+            finally:
+                self.cache.invalidate_paths(p for op in plan for p in op.affected_paths())
+
     def handle_api_sync(self):
-        """处理同步请求。"""
-        logs = self.service.sync_remote()
-        self.send_json({"status": "success", "logs": logs})
+        """
+        处理同步请求：git pull 后只更新变更涉及的包，并返回指向已变化内容的已部署链接。
+        """
+        with self.apply_lock:
+            result = self.service.sync_remote()
+        names, links = self.cache.apply_sync(result)
+        if names or result.full:
+            self.events.publish('update', {"packages": names, "generation": self.cache.generation})
+        self.send_json({
+            "status": "success" if result.ok else "error",
+            "logs": result.logs,
+            "before": result.before,
+            "after": result.after,
+            "packages": names,
+            "changed_links": [{"package": name, "source": str(f.source), "target": str(f.target)}
+                              for name, f in links],
+        })
+
+    def handle_api_events(self):
+        """以 Server-Sent Events 推送包状态变化，直到客户端断开。"""
+        q = self.events.subscribe()
+        try:
+            self.send_response(200)
+            self.send_header('Content-type', 'text/event-stream')
+            self.send_header('Cache-Control', 'no-cache')
+            self.end_headers()
+            while True:
+                try:
+                    event, data = q.get(timeout=15)
+                    chunk = f"event: {event}\ndata: {json.dumps(data)}\n\n"
+                except queue.Empty:
+                    # 心跳，同时用于发现已断开的连接
+                    chunk = ": keepalive\n\n"
+                self.wfile.write(chunk.encode('utf-8'))
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            self.events.unsubscribe(q)
 
     def handle_api_config(self):
         """处理配置获取请求。"""
@@ -93,9 +257,32 @@ class DotfilesHandler(http.server.SimpleHTTPRequestHandler):
         }
         self.send_json(data)
 
-    def handle_api_scan(self):
-        """处理扫描请求。"""
-        packages = self.service.scan_packages()
+    def handle_api_scan(self, refresh: bool = False, compact: bool = False):
+        """
+        处理扫描请求。ETag 由缓存的 generation 生成，内容未变化时返回 304。
+        compact=True 时只发送一次 dotfiles_dir / target_root，包路径相对 dotfiles_dir，
+        每个文件为 [rel_path, state]：源文件为 dotfiles_dir/path/rel_path，目标为 target_root/rel_path。
+        """
+        generation, packages = self.cache.snapshot(refresh=refresh)
+        etag = f'"scan-{self.cache.epoch}-{generation}-{"c" if compact else "f"}"'
+        if self.not_modified(etag):
+            return
+
+        if compact:
+            self.send_json({
+                "dotfiles_dir": str(self.config.dotfiles_dir),
+                "target_root": str(self.config.target_root),
+                "generation": generation,
+                "packages": [{
+                    "name": pkg.name,
+                    "status": pkg.status,
+                    "is_installed": pkg.is_installed,
+                    "path": os.path.relpath(pkg.root, self.config.dotfiles_dir),
+                    "files": [[rel, state.value] for rel, state in pkg.entries()]
+                } for pkg in packages]
+            }, etag=etag)
+            return
+
         # 序列化包数据
         data = []
         for pkg in packages:
@@ -105,7 +292,7 @@ class DotfilesHandler(http.server.SimpleHTTPRequestHandler):
                     "source": str(f.source),
                     "target": str(f.target),
                     "state": f.state.value,
-                    "rel_path": str(f.source.relative_to(pkg.root))
+                    "rel_path": f.rel_path
                 })
             data.append({
                 "name": pkg.name,
@@ -114,71 +301,185 @@ class DotfilesHandler(http.server.SimpleHTTPRequestHandler):
                 "path": str(pkg.root),
                 "files": files
             })
-        self.send_json(data)
+        self.send_json(data, etag=etag)
+
+    @staticmethod
+    def state_counts(pkg) -> dict:
+        """按状态统计文件数（直接统计包的状态列）。"""
+        return {state.value: count for state, count in pkg.state_counts().items()}
+
+    def handle_api_packages(self, refresh: bool = False):
+        """包摘要列表：只包含各状态的文件数，不包含文件本身。"""
+        generation, packages = self.cache.snapshot(refresh=refresh)
+        etag = f'"packages-{self.cache.epoch}-{generation}"'
+        if self.not_modified(etag):
+            return
+        self.send_json([{
+            "name": pkg.name,
+            "status": pkg.status,
+            "is_installed": pkg.is_installed,
+            "path": str(pkg.root),
+            "total": len(pkg.files),
+            "counts": self.state_counts(pkg)
+        } for pkg in packages], etag=etag)
+
+    def package_or_404(self, name: str):
+        """返回 (generation, 包)；包不存在时发送 404 并返回 (None, None)。"""
+        generation, pkg = self.cache.package_snapshot(name)
+        if pkg is None:
+            self.send_api_error("Package not found", code=404)
+        return generation, pkg
+
+    def handle_api_package(self, name: str):
+        """单个包的全部文件（紧凑格式，同 /api/scan?compact=1 中的一项）。"""
+        generation, pkg = self.package_or_404(name)
+        if pkg is None:
+            return
+        etag = f'"package-{self.cache.epoch}-{generation}"' if generation is not None else None
+        if etag and self.not_modified(etag):
+            return
+        self.send_json({
+            "dotfiles_dir": str(self.config.dotfiles_dir),
+            "target_root": str(self.config.target_root),
+            "name": pkg.name,
+            "status": pkg.status,
+            "is_installed": pkg.is_installed,
+            "path": os.path.relpath(pkg.root, self.config.dotfiles_dir),
+            "counts": self.state_counts(pkg),
+            "files": [[rel, state.value] for rel, state in pkg.entries()]
+        }, etag=etag)
+
+    def handle_api_package_dir(self, name: str, directory: str, offset: int = 0, limit: int = DIR_PAGE_SIZE):
+        """
+        包内某一目录层级的直接子项（按需展开）：子目录附带各状态文件数，文件附带状态。
+        子目录在前、文件在后，各自按名称排序，并按 offset / limit 分页。
+        """
+        generation, pkg = self.package_or_404(name)
+        if pkg is None:
+            return
+        prefix = directory.strip('/')
+        prefix = prefix + '/' if prefix else ''
+
+        dirs = {}
+        files = []
+        for rel, state in pkg.entries():
+            if not rel.startswith(prefix):
+                continue
+            head, sep, _ = rel[len(prefix):].partition('/')
+            if sep:
+                counts = dirs.setdefault(head, {})
+                counts[state.value] = counts.get(state.value, 0) + 1
+            else:
+                files.append({"name": head, "type": "file", "state": state.value})
+
+        entries = [{"name": d, "type": "dir", "counts": dirs[d], "total": sum(dirs[d].values())}
+                   for d in sorted(dirs)]
+        entries += sorted(files, key=lambda e: e["name"])
+        offset = max(0, offset)
+        limit = max(1, limit)
+        self.send_json({
+            "package": pkg.name,
+            "dir": prefix.rstrip('/'),
+            "total": len(entries),
+            "offset": offset,
+            "limit": limit,
+            "entries": entries[offset:offset + limit]
+        })
 
-    def handle_api_diff(self, source: str, target: str):
-        """处理 Diff 请求。"""
+    def handle_api_diff(self, source: str, target: str, stream: bool = False):
+        """
+        处理 Diff 请求。
+        stream=True 时边生成边逐行发送 NDJSON（每行一个 JSON 字符串），不在内存中拼出完整结果；
+        响应不带 Content-Length，以关闭连接结束 (HTTP/1.0)。
+        """
         if not source or not target:
             self.send_api_error("Missing source or target param")
             return
         
-        diff = DiffViewer.get_diff(Path(source), Path(target))
-        self.send_json({"diff": diff})
-
-    def handle_api_deploy(self, data):
-        """处理部署请求。"""
-        pkg_name = data.get('package')
-        dry_run = data.get('dry_run', True)
-        strategy = data.get('strategy', 'skip')
-        
-        packages = self.service.scan_packages()
-        pkg = next((p for p in packages if p.name == pkg_name), None)
-        
-        if not pkg:
-            self.send_api_error("Package not found")
+        lines = self.service.iter_diff(Path(source), Path(target))
+        if not stream:
+            self.send_json({"diff": list(lines)})
             return
 
-        # 部署 = 链接
-        plan = self.service.deploy(pkg, conflict_strategy=strategy)
-        
-        logs = []
-        if not plan.is_empty():
-            logs = Executor.run(plan, dry_run=dry_run)
-            
-        self.send_json({"status": "success", "logs": logs, "dry_run": dry_run})
+        self.send_response(200)
+        self.send_header('Content-type', 'application/x-ndjson')
+        self.end_headers()
+        try:
+            batch = []
+            for line in lines:
+                batch.append(json.dumps(line) + "\n")
+                if len(batch) >= 256:
+                    self.wfile.write("".join(batch).encode('utf-8'))
+                    self.wfile.flush()
+                    batch = []
+            if batch:
+                self.wfile.write("".join(batch).encode('utf-8'))
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def handle_api_deploy(self, data):
+        """
+        处理部署请求。
+        接受单个 'package'、多个 'packages' 或 'all': true；所有包一次扫描、合并为一个计划执行。
+        """
+        self.handle_batch(data, action="link", strategy=data.get('strategy', 'skip'))
 
     def handle_api_restore(self, data):
-        """处理恢复请求。"""
-        pkg_name = data.get('package')
-        dry_run = data.get('dry_run', True)
+        """处理恢复请求（参数同部署）。"""
         # restore_strategy is ignored as restore now means UNLINK/UNDO
-        
-        packages = self.service.scan_packages()
-        pkg = next((p for p in packages if p.name == pkg_name), None)
-        
-        if not pkg:
-            self.send_api_error("Package not found")
+        self.handle_batch(data, action="unlink")
+
+    def handle_batch(self, data, action: str, strategy: str = 'backup'):
+        """为请求中的包生成合并计划并执行；包不存在或多个包声明同一目标时不做任何修改。"""
+        dry_run = data.get('dry_run', True)
+
+        # 规划前重新扫描这些包，避免基于过期状态做修改
+        if data.get('all'):
+            packages, missing = self.cache.packages(refresh=True), []
+        else:
+            names = data.get('packages') or ([data['package']] if data.get('package') else [])
+            if not names:
+                self.send_api_error("No package specified")
+                return
+            packages, missing = self.cache.rescan(names)
+
+        if missing:
+            self.send_api_error(f"Package not found: {', '.join(missing)}")
+            return
+
+        try:
+            # 部署 = 链接；恢复 = 取消链接 / 撤销
+            plan = self.service.plan_batch(packages, action=action, conflict_strategy=strategy)
+        except ValueError as e:
+            self.send_api_error(str(e), code=409)
             return
 
-        # 恢复 = 取消链接 / 撤销
-        plan = self.service.restore(pkg)
-        
         logs = []
         if not plan.is_empty():
-            logs = Executor.run(plan, dry_run=dry_run)
-            
-        self.send_json({"status": "success", "logs": logs, "dry_run": dry_run})
+            logs = self.run_plan(plan, dry_run)
+
+        self.send_json({"status": "success", "logs": logs, "dry_run": dry_run,
+                        "packages": [pkg.name for pkg in packages]})
 
     def handle_api_backup_config(self, data):
         """处理备份 ~/.config 请求。"""
         dry_run = data.get('dry_run', True)
+        mode = data.get('mode')
 
-        plan, backup_path = self.service.backup_config_dir()
+        try:
+            plan, backup_path = self.service.backup_config_dir(
+                mode=mode, compression=data.get('compression'),
+                max_bytes=parse_size(data.get('split_size')),
+                max_files=int(data['split_count']) if data.get('split_count') else None)
+        except ValueError as e:
+            self.send_api_error(str(e))
+            return
         logs = []
         if plan.is_empty():
             logs.append(".config not found or nothing to backup. / 未找到 .config 或无可备份内容。")
         else:
-            logs = Executor.run(plan, dry_run=dry_run)
+            # 备份只写入 .dotfiles_backup，受影响的包（如有）由 run_plan 按路径失效
+            logs = self.run_plan(plan, dry_run)
             if not dry_run and backup_path:
                 logs.append(f"Backup created at: {backup_path} / 备份位置: {backup_path}")
 
@@ -189,21 +490,39 @@ class DotfilesHandler(http.server.SimpleHTTPRequestHandler):
             "backup_path": str(backup_path) if backup_path else None
         })
 
-class ReusableTCPServer(socketserver.TCPServer):
+class ReusableThreadingHTTPServer(http.server.ThreadingHTTPServer):
     allow_reuse_address = True
+    daemon_threads = True
+
+def run_server(config: AppConfig, service: DotfilesService, port=9012, open_browser=True, watch=True):
+    """启动 Web 服务器。watch=True 时内嵌监视守护线程，通过 /api/events 推送变化。"""
+    # 所有请求线程共享同一个扫描缓存
+    cache = ScanCache(service)
+    apply_lock = threading.Lock()
+    events = EventHub()
+
+    daemon = None
+    if watch:
+        def on_change(names: List[str]):
+            events.publish('update', {"packages": names, "generation": cache.generation})
+        daemon = WatchDaemon(cache, on_change=on_change)
+        daemon.start()
 
-def run_server(config: AppConfig, service: DotfilesService, port=9012, open_browser=True):
-    """启动 Web 服务器。"""
     # 自定义处理器工厂
     def handler_factory(*args, **kwargs):
-        return DotfilesHandler(*args, config=config, service=service, **kwargs)
+        return DotfilesHandler(*args, config=config, service=service, cache=cache,
+                               apply_lock=apply_lock, events=events, **kwargs)
 
-    with ReusableTCPServer(("", port), handler_factory) as httpd:
+    with ReusableThreadingHTTPServer(("", port), handler_factory) as httpd:
         url = f"http://localhost:{port}"
         print(f"Serving Web GUI at {url}")
         if open_browser:
+            import webbrowser
             webbrowser.open(url)
         try:
             httpd.serve_forever()
         except KeyboardInterrupt:
             print("\nShutting down server.")
+        finally:
+            if daemon is not None:
+                daemon.stop()
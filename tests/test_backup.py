@@ -0,0 +1,77 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+from core.backup import ArchiveWriter, BackupStore, extract_archive_member, read_history
+from core.operations import BackupOperation, RestoreBackupOperation
+
+class ArchiveTest(unittest.TestCase):
+    """压缩归档的写入与单个条目的恢复。"""
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.base = Path(self._tmp.name)
+        self.src = self.base / "config"
+        self.src.mkdir()
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_restore_hardlinked_file(self):
+        (self.src / "a.conf").write_text("shared\n")
+        os.link(self.src / "a.conf", self.src / "b.conf")
+        archive = self.base / "backup"
+        index = ArchiveWriter(archive).write_tree(self.src)
+        self.assertEqual(index["files"]["b.conf"][2], "f")
+
+        for name in ("a.conf", "b.conf"):
+            dst = self.base / f"restored-{name}"
+            extract_archive_member(archive, name, dst)
+            self.assertEqual(dst.read_text(), "shared\n")
+
+class BackupStoreTest(unittest.TestCase):
+    """内容寻址的备份对象库与引用计数。"""
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.base = Path(self._tmp.name)
+        self.root = self.base / "objects"
+        self.store = BackupStore.at(self.root)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def objects(self) -> list:
+        return sorted(p for p in self.root.rglob("*") if p.is_file() and p.name != "refs.json")
+
+    def test_shared_blob_survives_releasing_one_ref(self):
+        entries = []
+        for name in ("a", "b"):
+            (self.base / name).write_text("same\n")
+            entries.append(self.store.store(self.base / name))
+        self.assertEqual(entries[0]["hash"], entries[1]["hash"])
+        self.assertEqual(len(self.objects()), 1)
+
+        self.store.restore(entries[0], self.base / "a")
+        self.assertEqual((self.base / "a").read_text(), "same\n")
+        self.assertEqual(len(self.objects()), 1)
+
+        self.store.restore(entries[1], self.base / "b")
+        self.assertEqual((self.base / "b").read_text(), "same\n")
+        self.assertEqual(self.objects(), [])
+
+    def test_backup_history_restores_latest(self):
+        target, backup = self.base / ".rc", self.base / "backups" / ".rc"
+        for content in ("first\n", "second\n"):
+            target.write_text(content)
+            BackupOperation(target, backup, self.root).apply()
+            self.assertFalse(target.exists())
+        self.assertEqual(len(read_history(backup)), 2)
+
+        RestoreBackupOperation(target, backup, self.root).apply()
+        self.assertEqual(target.read_text(), "second\n")
+        self.assertEqual(len(read_history(backup)), 1)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,64 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from core.config import AppConfig
+from core.service import DotfilesService
+
+class BatchPlanTest(unittest.TestCase):
+    """多个包合并为一个计划。"""
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        base = Path(self._tmp.name)
+        self.dots, self.home = base / "dots", base / "home"
+        for rel in ("zsh/.zshrc", "zsh/.config/shared.conf", "vim/.vimrc", "alt/.zshrc", "alt/.config/alt.conf"):
+            (self.dots / rel).parent.mkdir(parents=True, exist_ok=True)
+            (self.dots / rel).write_text(f"{rel}\n")
+        self.home.mkdir()
+        self.base = base
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def service(self, fold: bool = False) -> DotfilesService:
+        config = AppConfig(dotfiles_dir=str(self.dots), target_root=str(self.home),
+                           cache_dir=str(self.base / "cache"), fold=fold)
+        return DotfilesService(config)
+
+    def test_find_conflicts_reports_overlapping_targets(self):
+        service = self.service()
+        packages, missing = service.scan_selected(["zsh", "vim", "alt"])
+        self.assertEqual(missing, [])
+        self.assertEqual(service.find_conflicts(packages), {self.home / ".zshrc": ["zsh", "alt"]})
+
+        with self.assertRaises(ValueError):
+            service.plan_batch(packages)
+        self.assertFalse((self.home / ".zshrc").exists())
+
+    def test_merged_plan(self):
+        service = self.service()
+        packages, missing = service.scan_selected(["zsh", "vim", "nope", "vim"])
+        self.assertEqual(([p.name for p in packages], missing), (["zsh", "vim"], ["nope"]))
+        service.execute(service.plan_batch(packages), dry_run=False)
+        for rel in (".zshrc", ".vimrc", ".config/shared.conf"):
+            self.assertTrue((self.home / rel).is_symlink(), rel)
+
+        packages, _ = service.scan_selected(["zsh", "vim"])
+        self.assertTrue(service.plan_batch(packages).is_empty())
+        service.execute(service.plan_batch(packages, action="unlink"), dry_run=False)
+        self.assertFalse((self.home / ".vimrc").is_symlink())
+        self.assertEqual((self.home / ".vimrc").read_text(), "vim/.vimrc\n")
+
+    def test_fold_keeps_shared_dirs_unfolded(self):
+        (self.dots / "alt" / ".zshrc").unlink()
+        service = self.service(fold=True)
+        packages, _ = service.scan_selected(["zsh", "alt"])
+        service.execute(service.plan_batch(packages), dry_run=False)
+        config_dir = self.home / ".config"
+        self.assertFalse(config_dir.is_symlink())
+        self.assertTrue((config_dir / "shared.conf").is_symlink())
+        self.assertTrue((config_dir / "alt.conf").is_symlink())
+
+if __name__ == "__main__":
+    unittest.main()
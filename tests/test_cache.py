@@ -0,0 +1,55 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from core.cache import ScanCache
+from core.config import AppConfig
+from core.service import DotfilesService
+
+class InvalidatePathsTest(unittest.TestCase):
+    """按被修改的目标路径只标记相关的包失效。"""
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        base = Path(self._tmp.name)
+        self.dots, self.home = base / "dots", base / "home"
+        for rel in ("a/.rc", "a/.config/app/a.conf", "b/.brc", "b/.config/b.conf"):
+            (self.dots / rel).parent.mkdir(parents=True, exist_ok=True)
+            (self.dots / rel).write_text(f"{rel}\n")
+        self.home.mkdir()
+        config = AppConfig(dotfiles_dir=str(self.dots), target_root=str(self.home),
+                           cache_dir=str(base / "cache"))
+        self.cache = ScanCache(DotfilesService(config))
+        self.cache.packages()
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def invalidated(self, *rel_paths) -> set:
+        self.cache.invalidate_paths(self.home / rel for rel in rel_paths)
+        dirty = set(self.cache._dirty)
+        self.cache.packages()
+        return dirty
+
+    def test_targets_and_ancestors(self):
+        self.assertEqual(self.invalidated(".rc"), {"a"})
+        self.assertEqual(self.invalidated(".config/b.conf"), {"b"})
+        # 祖先目录（例如折叠链接）被修改时，其下有目标的包都失效
+        self.assertEqual(self.invalidated(".config/app"), {"a"})
+        self.assertEqual(self.invalidated(".config"), {"a", "b"})
+        self.assertEqual(self.invalidated(".other", ".config/other.conf"), set())
+
+    def test_index_follows_rescan(self):
+        self.assertEqual(self.invalidated(".rc"), {"a"})
+        (self.dots / "a" / ".local").mkdir()
+        (self.dots / "a" / ".local" / "x").write_text("x\n")
+        (self.dots / "b" / ".rc").write_text("b\n")
+        self.cache.rescan(["a"])
+        self.assertEqual(self.invalidated(".local/x"), {"a"})
+        # b 尚未重新扫描，其新文件还不在缓存中
+        self.assertEqual(self.invalidated(".rc"), {"a"})
+        self.cache.rescan(["b"])
+        self.assertEqual(self.invalidated(".rc"), {"a", "b"})
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,49 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+from core.config import AppConfig
+from core.detector import StateDetector
+from core.models import FileState
+from core.service import DotfilesService
+
+class RelativePathsTest(unittest.TestCase):
+    """以相对路径配置 dotfiles 与目标目录时，折叠部署的检测结果与绝对路径一致。"""
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self._cwd = os.getcwd()
+        base = Path(self._tmp.name)
+        (base / "dots" / "a" / ".config").mkdir(parents=True)
+        (base / "dots" / "a" / ".config" / "a.conf").write_text("a\n")
+        (base / "home").mkdir()
+        os.chdir(base)
+
+    def tearDown(self):
+        os.chdir(self._cwd)
+        self._tmp.cleanup()
+
+    def service(self) -> DotfilesService:
+        config = AppConfig(dotfiles_dir="dots", target_root="home", cache_dir="cache", fold=True)
+        return DotfilesService(config)
+
+    def test_folded_package(self):
+        service = self.service()
+        service.execute(service.deploy(service.scan_package("a")), dry_run=False)
+        self.assertTrue(Path("home/.config").is_symlink())
+
+        service = self.service()
+        package = service.scan_package("a")
+        self.assertEqual([f.state for f in package.files], [FileState.LINKED])
+        self.assertTrue(service.deploy(package).is_empty())
+        self.assertFalse(service.restore(package).is_empty())
+
+    def test_real_dir_is_absolute(self):
+        os.symlink("dots/a", "link")
+        detector = StateDetector()
+        self.assertEqual(detector.real_dir("home"), os.path.realpath("home"))
+        self.assertEqual(detector.real_dir("link/.config"), os.path.realpath("dots/a/.config"))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,140 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+from core.utils.diff import DiffCache, DiffViewer
+
+class FileDiffTest(unittest.TestCase):
+    """文件 diff 的快速路径与上限。"""
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.base = Path(self._tmp.name)
+        self.source, self.target = self.base / "source", self.base / "target"
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_identical_files_produce_no_output(self):
+        self.source.write_text("same\n")
+        self.target.write_text("same\n")
+        self.assertEqual(DiffViewer.get_diff(self.source, self.target), [])
+
+    def test_text_diff(self):
+        self.source.write_text("a\nb\n")
+        self.target.write_text("a\nc\n")
+        lines = DiffViewer.get_diff(self.source, self.target)
+        self.assertIn("+b", [line.rstrip("\n") for line in lines])
+        self.assertIn("-c", [line.rstrip("\n") for line in lines])
+
+    def test_binary_and_large_files_are_summarized(self):
+        self.source.write_bytes(b"\0\1\2")
+        self.target.write_bytes(b"\0\1\3")
+        self.assertEqual(len(DiffViewer.get_diff(self.source, self.target)), 1)
+        self.assertTrue(DiffViewer.get_diff(self.source, self.target)[0].startswith("Binary files differ"))
+
+        self.source.write_text("x" * 100)
+        self.target.write_text("y" * 100)
+        lines = DiffViewer.get_diff(self.source, self.target, max_bytes=10)
+        self.assertEqual(len(lines), 1)
+        self.assertIn("too large", lines[0])
+
+    def test_output_is_truncated(self):
+        self.source.write_text("".join(f"s{i}\n" for i in range(100)))
+        self.target.write_text("".join(f"t{i}\n" for i in range(100)))
+        lines = DiffViewer.get_diff(self.source, self.target, max_lines=10)
+        self.assertEqual(len(lines), 11)
+        self.assertIn("truncated", lines[-1])
+
+class DirDiffTest(unittest.TestCase):
+    """递归目录 diff。"""
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        base = Path(self._tmp.name)
+        self.source, self.target = base / "source", base / "target"
+        for root in (self.source, self.target):
+            (root / "sub").mkdir(parents=True)
+            (root / "same.conf").write_text("same\n")
+            (root / "sub" / "edited.conf").write_text(f"{root.name}\n")
+        (self.source / "new.conf").write_text("new\n")
+        (self.source / "newdir" / "deep").mkdir(parents=True)
+        (self.source / "newdir" / "deep" / "x").write_text("x\n")
+        (self.target / "old.conf").write_text("old\n")
+        os.symlink("a", self.source / "link")
+        os.symlink("b", self.target / "link")
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_compare_dirs(self):
+        for workers in (1, 4):
+            result = DiffViewer.compare_dirs(self.source, self.target, workers=workers)
+            # 整个新增的目录只列出目录本身
+            self.assertEqual(result.added, ["new.conf", "newdir"])
+            self.assertEqual(result.removed, ["old.conf"])
+            self.assertEqual(result.changed, ["link", "sub/edited.conf"])
+            self.assertEqual(result.identical, 1)
+
+    def test_same_size_different_content(self):
+        (self.source / "same.conf").write_text("SAME\n")
+        os.utime(self.source / "same.conf", ns=(1, 1))
+        result = DiffViewer.compare_dirs(self.source, self.target)
+        self.assertIn("same.conf", result.changed)
+
+    def test_iter_diff_summary_then_file_diffs(self):
+        lines = DiffViewer.get_diff(self.source, self.target)
+        self.assertTrue(lines[0].startswith("Directories differ"))
+        self.assertIn("Only in target: old.conf", lines)
+        self.assertTrue(any(line.startswith("Symlinks differ") for line in lines))
+        self.assertIn("+source", [line.rstrip("\n") for line in lines])
+
+class DiffCacheTest(unittest.TestCase):
+    """以两侧文件签名为键的 diff 缓存。"""
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.base = Path(self._tmp.name)
+        self.source, self.target = self.base / "source", self.base / "target"
+        self.source.write_text("a\nb\n")
+        self.target.write_text("a\nc\n")
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_hit_and_invalidation(self):
+        cache = DiffCache()
+        first = list(cache.iter_diff(self.source, self.target))
+        self.assertEqual(list(cache.iter_diff(self.source, self.target)), first)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+        # 修改任一侧都会改变键
+        self.source.write_text("a\nchanged\n")
+        changed = list(cache.iter_diff(self.source, self.target))
+        self.assertNotEqual(changed, first)
+        self.assertEqual(changed, DiffViewer.get_diff(self.source, self.target))
+        self.assertEqual(cache.misses, 2)
+
+    def test_limits(self):
+        cache = DiffCache(max_entries=1)
+        other = self.base / "other"
+        other.write_text("z\n")
+        list(cache.iter_diff(self.source, self.target))
+        list(cache.iter_diff(other, self.target))
+        self.assertEqual((cache.stats()["entries"], cache.evictions), (1, 1))
+
+        # 超过总字节上限的结果不缓存
+        cache = DiffCache(max_bytes=10)
+        list(cache.iter_diff(self.source, self.target))
+        self.assertEqual(cache.stats()["entries"], 0)
+
+    def test_directories_are_not_cached(self):
+        (self.base / "d1").mkdir()
+        (self.base / "d2").mkdir()
+        cache = DiffCache()
+        list(cache.iter_diff(self.base / "d1", self.base / "d2"))
+        self.assertEqual(cache.stats()["entries"], 0)
+
+if __name__ == "__main__":
+    unittest.main()
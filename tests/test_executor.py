@@ -0,0 +1,81 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+from core.executor import Executor, OperationPlan
+from core.operations import BackupOperation, MkdirOperation, RemoveOperation, SymlinkOperation
+
+class ExecutorGraphTest(unittest.TestCase):
+    """按路径依赖关系并发执行计划。"""
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        base = Path(self._tmp.name)
+        self.dots, self.home = base / "dots", base / "home"
+        (self.dots / "pkg" / ".config").mkdir(parents=True)
+        self.home.mkdir()
+        self.backups = base / "backup"
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_dependencies_follow_paths(self):
+        config = self.home / ".config"
+        ops = [RemoveOperation(self.home / ".rc"), SymlinkOperation(self.dots / "pkg" / ".rc", self.home / ".rc"),
+               SymlinkOperation(self.dots / "a.conf", config / "a.conf"),
+               SymlinkOperation(self.dots / "b.conf", config / "b.conf"),
+               RemoveOperation(config)]
+        nodes, deps = Executor.build_graph(ops)
+        index = {id(op): i for i, op in enumerate(nodes)}
+        remove_rc, link_rc, link_a, link_b, remove_config = (index[id(op)] for op in ops)
+
+        # 每个父目录只插入一个创建节点，且排在其下的操作之前
+        mkdirs = [i for i, op in enumerate(nodes) if isinstance(op, MkdirOperation)]
+        self.assertEqual(sorted(os.fspath(nodes[i].path) for i in mkdirs), sorted([os.fspath(config), os.fspath(self.home)]))
+        mkdir_config = next(i for i in mkdirs if nodes[i].path == config)
+        self.assertIn(mkdir_config, deps[link_a])
+        self.assertIn(mkdir_config, deps[link_b])
+
+        # 同一路径上的操作保持顺序；互不相关的操作之间没有依赖
+        self.assertIn(remove_rc, deps[link_rc])
+        self.assertNotIn(link_a, deps[link_b])
+        self.assertNotIn(remove_rc, deps[link_a])
+        # 作用于祖先目录的操作排在其子孙之后
+        self.assertTrue({link_a, link_b} <= deps[remove_config])
+
+    def test_parallel_run_matches_serial(self):
+        names = [f".file{i}" for i in range(20)]
+        for name in names:
+            (self.dots / "pkg" / ".config" / name).write_text(f"{name}\n")
+            if name.endswith(("0", "5")):
+                (self.home / ".config").mkdir(exist_ok=True)
+                (self.home / ".config" / name).write_text("local\n")
+        plan = OperationPlan()
+        for name in names:
+            target = self.home / ".config" / name
+            if target.exists():
+                plan.add(BackupOperation(target, self.backups / name))
+            plan.add(SymlinkOperation(self.dots / "pkg" / ".config" / name, target))
+
+        Executor.run(plan, dry_run=False, workers=8)
+        for name in names:
+            target = self.home / ".config" / name
+            self.assertTrue(target.is_symlink(), name)
+            self.assertEqual(target.read_text(), f"{name}\n")
+        self.assertEqual(sorted(os.listdir(self.backups)), [".file0", ".file10", ".file15", ".file5"])
+        self.assertEqual((self.backups / ".file5").read_text(), "local\n")
+
+    def test_failure_stops_dependents(self):
+        class Failing(RemoveOperation):
+            def apply(self):
+                raise OSError("boom")
+
+        target = self.home / ".rc"
+        plan = OperationPlan([Failing(target), SymlinkOperation(self.dots / "pkg" / ".rc", target)])
+        with self.assertRaises(OSError):
+            Executor.run(plan, dry_run=False, workers=4)
+        self.assertFalse(os.path.lexists(target))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,37 @@
+import logging
+import tempfile
+import unittest
+from pathlib import Path
+
+from core.config import AppConfig
+from core.fanout import FanoutDeployer
+
+class FanoutTest(unittest.TestCase):
+    """部署到多个目标根目录。"""
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.base = Path(self._tmp.name)
+        (self.base / "dots" / "pkg").mkdir(parents=True)
+        (self.base / "dots" / "pkg" / ".rc").write_text("rc\n")
+        self.targets = [str(self.base / "home1"), str(self.base / "home2")]
+        for target in self.targets:
+            Path(target).mkdir()
+        self.config = AppConfig(dotfiles_dir=str(self.base / "dots"), target_root=self.targets[0],
+                                cache_dir=str(self.base / "cache"))
+
+    def tearDown(self):
+        logging.disable(logging.NOTSET)
+        self._tmp.cleanup()
+
+    def test_in_process_keeps_caller_logging_level(self):
+        logging.disable(logging.CRITICAL)
+        reports, missing = FanoutDeployer.run(self.config, self.targets, dry_run=False, workers=1)
+        self.assertEqual(missing, [])
+        self.assertEqual([r.status for r in reports], ["ok", "ok"])
+        self.assertEqual(logging.root.manager.disable, logging.CRITICAL)
+        for target in self.targets:
+            self.assertEqual((Path(target) / ".rc").read_text(), "rc\n")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,86 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+from core.config import AppConfig
+from core.service import DotfilesService
+
+class FoldTest(unittest.TestCase):
+    """折叠部署中的展开（unfold）与重新折叠（refold）。"""
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        base = Path(self._tmp.name)
+        self.dots, self.home = base / "dots", base / "home"
+        for pkg, name in (("a", "a.conf"), ("b", "b.conf")):
+            (self.dots / pkg / ".config").mkdir(parents=True)
+            (self.dots / pkg / ".config" / name).write_text(f"{pkg}\n")
+        self.home.mkdir()
+        self.base = base
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def service(self, fold: bool) -> DotfilesService:
+        config = AppConfig(dotfiles_dir=str(self.dots), target_root=str(self.home), use_index=False,
+                           cache_dir=str(self.base / "cache"), fold=fold)
+        return DotfilesService(config)
+
+    def deploy(self, service: DotfilesService, name: str) -> None:
+        plan = service.deploy(service.scan_package(name))
+        service.execute(plan, dry_run=False)
+
+    def test_unfold_skips_ignored_entries(self):
+        (self.dots / "a" / ".config" / "debug.log").write_text("log\n")
+        (self.dots / "a" / ".dotkeeper-ignore").write_text("*.log\n")
+        service = self.service(fold=True)
+        self.deploy(service, "a")
+        self.assertTrue((self.home / ".config").is_symlink())
+
+        self.deploy(service, "b")
+        config_dir = self.home / ".config"
+        self.assertFalse(config_dir.is_symlink())
+        self.assertEqual(sorted(os.listdir(config_dir)), ["a.conf", "b.conf"])
+
+    def test_plain_deploy_unfolds_other_package(self):
+        self.deploy(self.service(fold=True), "a")
+        config_dir = self.home / ".config"
+        self.assertTrue(config_dir.is_symlink())
+
+        service = self.service(fold=False)
+        self.deploy(service, "b")
+        self.assertFalse(config_dir.is_symlink())
+        self.assertEqual(sorted(os.listdir(self.dots / "a" / ".config")), ["a.conf"])
+        self.assertEqual((config_dir / "a.conf").read_text(), "a\n")
+        self.assertEqual((config_dir / "b.conf").read_text(), "b\n")
+        for name in ("a", "b"):
+            self.assertEqual({f.state.value for f in service.scan_package(name).files}, {"linked"}, name)
+
+    def test_restore_folded_conflict_backup(self):
+        (self.home / ".config").write_text("user\n")
+        service = self.service(fold=True)
+        self.deploy(service, "a")
+        self.assertTrue((self.home / ".config").is_symlink())
+
+        service.execute(service.restore(service.scan_package("a")), dry_run=False)
+        self.assertFalse((self.home / ".config").is_symlink())
+        self.assertEqual((self.home / ".config").read_text(), "user\n")
+        self.assertEqual(sorted(os.listdir(self.dots / "a" / ".config")), ["a.conf"])
+
+    def test_rollback_refold(self):
+        self.deploy(self.service(fold=False), "a")
+        config_dir = self.home / ".config"
+        self.assertTrue((config_dir / "a.conf").is_symlink())
+
+        service = self.service(fold=True)
+        self.deploy(service, "a")
+        self.assertTrue(config_dir.is_symlink())
+
+        service.rollback(dry_run=False)
+        self.assertFalse(config_dir.is_symlink())
+        self.assertTrue((config_dir / "a.conf").is_symlink())
+        self.assertEqual((config_dir / "a.conf").read_text(), "a\n")
+
+if __name__ == "__main__":
+    unittest.main()
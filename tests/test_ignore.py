@@ -0,0 +1,66 @@
+import unittest
+
+from core.ignore import IgnoreRules, parse_patterns
+
+# GNU Stow 文档中默认的 .stow-local-ignore
+STOW_DEFAULT_IGNORE = r"""
+# Comments and blank lines are allowed.
+
+RCS
+.+,v
+
+CVS
+\.\#.+       # CVS conflict files / emacs lock files
+\.cvsignore
+
+\.svn
+_darcs
+\.hg
+
+\.git
+\.gitignore
+\.gitmodules
+
+.+~          # emacs backup files
+\#.*\#       # emacs autosave files
+
+^/README.*
+^/LICENSE.*
+^/COPYING
+"""
+
+class StowIgnoreTest(unittest.TestCase):
+    """.stow-local-ignore 的正则按 Stow 的规则匹配。"""
+
+    def setUp(self):
+        self.rules = IgnoreRules(parse_patterns(STOW_DEFAULT_IGNORE, regex=True))
+
+    def test_name_patterns(self):
+        for rel in (".git", "sub/.gitignore", "RCS", "file,v", ".#lock", "notes~", "#autosave#", "a/CVS"):
+            self.assertTrue(self.rules.match(rel), rel)
+        for rel in (".gitconfig", "RCSfile", "notes", ".bashrc"):
+            self.assertFalse(self.rules.match(rel), rel)
+
+    def test_path_patterns_anchor_at_package_root(self):
+        for rel in ("README", "README.md", "LICENSE.txt", "COPYING"):
+            self.assertTrue(self.rules.match(rel), rel)
+        for rel in (".config/app/README.md", "docs/LICENSE", "COPYING.old"):
+            self.assertFalse(self.rules.match(rel), rel)
+
+    def test_path_regex_matches_at_segment_boundary(self):
+        rules = IgnoreRules(["re:\\.config/app/cache"])
+        self.assertTrue(rules.match(".config/app/cache", is_dir=True))
+        self.assertTrue(rules.match("x/.config/app/cache"))
+        self.assertFalse(rules.match("x.config/app/cache"))
+        self.assertFalse(rules.match(".config/app/cached"))
+
+    def test_globs(self):
+        rules = IgnoreRules(["*.md", "/docs/", ".config/*/plugged/"])
+        self.assertTrue(rules.match("a/b.md"))
+        self.assertTrue(rules.match("docs", is_dir=True))
+        self.assertFalse(rules.match("docs"))
+        self.assertFalse(rules.match("sub/docs", is_dir=True))
+        self.assertTrue(rules.match(".config/nvim/plugged", is_dir=True))
+
+if __name__ == "__main__":
+    unittest.main()
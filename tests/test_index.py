@@ -0,0 +1,81 @@
+import os
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+from core.config import AppConfig
+from core.metrics import METRICS
+from core.models import FileState
+from core.service import DotfilesService
+
+class ScanIndexTest(unittest.TestCase):
+    """扫描索引缓存的 LINKED 状态在中间目录的软链接被改指后不应继续复用。"""
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.base = Path(self._tmp.name)
+        for repo in ("dots1", "dots2"):
+            (self.base / repo / "pkg").mkdir(parents=True)
+            (self.base / repo / "pkg" / ".rc").write_text(f"{repo}\n")
+        self.home = self.base / "home"
+        self.home.mkdir()
+        # 链接经过中间目录软链接 mid 指向仓库；仓库路径本身不变
+        self.dots = self.base / "dots1"
+        self.mid = self.base / "mid"
+        os.symlink(self.base / "dots1", self.mid)
+
+    def tearDown(self):
+        METRICS.enable(False)
+        METRICS.reset()
+        self._tmp.cleanup()
+
+    def age_home(self):
+        """把目标目录的 mtime 移出 racy 窗口，使其检测结果可以整体缓存。"""
+        old = time.time() - 3600
+        os.utime(self.home, (old, old))
+
+    def scan_state(self) -> FileState:
+        config = AppConfig(dotfiles_dir=str(self.dots), target_root=str(self.home),
+                           cache_dir=str(self.base / "cache"))
+        return DotfilesService(config).scan_package("pkg").files[0].state
+
+    def test_retargeted_intermediate_dir_link(self):
+        os.symlink(self.mid / "pkg" / ".rc", self.home / ".rc")
+        self.assertEqual(self.scan_state(), FileState.LINKED)
+        self.assertEqual(self.scan_state(), FileState.LINKED)
+
+        os.unlink(self.mid)
+        os.symlink(self.base / "dots2", self.mid)
+        self.assertEqual(self.scan_state(), FileState.CONFLICT)
+
+    def test_retargeted_intermediate_dir_link_unchanged_target_dir(self):
+        os.symlink(self.mid / "pkg" / ".rc", self.home / ".rc")
+        self.age_home()
+        self.assertEqual(self.scan_state(), FileState.LINKED)
+        self.assertEqual(self.scan_state(), FileState.LINKED)
+
+        os.unlink(self.mid)
+        os.symlink(self.base / "dots2", self.mid)
+        self.assertEqual(self.scan_state(), FileState.CONFLICT)
+
+    def test_unchanged_target_dir_skips_lstat(self):
+        os.symlink(self.dots / "pkg" / ".rc", self.home / ".rc")
+        self.age_home()
+        self.assertEqual(self.scan_state(), FileState.LINKED)
+        METRICS.reset()
+        METRICS.enable()
+        self.assertEqual(self.scan_state(), FileState.LINKED)
+        lookups = {dict(labels)["cache"]: dict(labels)["result"] for (name, labels) in METRICS._counters
+                   if name == "dotkeeper_cache_requests_total"}
+        # 整个目录命中，不再逐个 lstat 链接
+        self.assertEqual(lookups.get("scan_index_target_dir"), "hit")
+        self.assertNotIn("scan_index_target", lookups)
+
+        # 目录中条目的替换会改变目录签名
+        os.unlink(self.home / ".rc")
+        (self.home / ".rc").write_text("local\n")
+        self.assertEqual(self.scan_state(), FileState.CONFLICT)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+from core.config import AppConfig
+from core.executor import Executor, OperationPlan
+from core.journal import Journal
+from core.operations import RemoveOperation, SymlinkOperation
+from core.service import DotfilesService
+
+class JournalResumeTest(unittest.TestCase):
+    """中断 -> resume -> rollback 后应恢复到执行前的状态。"""
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        base = Path(self._tmp.name)
+        self.dots, self.home = base / "dots", base / "home"
+        (self.dots / "pkg").mkdir(parents=True)
+        self.home.mkdir()
+        (self.dots / "pkg" / ".rc").write_text("rc\n")
+        self.config = AppConfig(dotfiles_dir=str(self.dots), target_root=str(self.home),
+                                cache_dir=str(base / "cache"))
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_resume_keeps_first_undo_info(self):
+        target = self.home / ".rc"
+        os.symlink("/elsewhere", target)
+        plan = OperationPlan([RemoveOperation(target), SymlinkOperation(self.dots / "pkg" / ".rc", target)])
+
+        # 模拟在 RemoveOperation 执行后、记录完成前崩溃
+        journal = Journal.create(self.config, plan)
+        journal.begin(0, plan.operations[0])
+        plan.operations[0].apply()
+        journal.close()
+        self.assertFalse(os.path.lexists(target))
+
+        pending = Journal.latest(self.config, pending_only=True)
+        Executor.run(pending.plan(), dry_run=False, journal=pending)
+        self.assertEqual(target.resolve(), (self.dots / "pkg" / ".rc").resolve())
+
+        reloaded = Journal.latest(self.config)
+        self.assertEqual(reloaded.started[0], {"link": "/elsewhere"})
+        reloaded.rollback(dry_run=False)
+        self.assertEqual(os.readlink(target), "/elsewhere")
+
+    def test_rollback_interrupted_deploy_restores_backups(self):
+        (self.dots / "pkg" / ".other").write_text("other\n")
+        (self.home / ".rc").write_text("local\n")
+        service = DotfilesService(self.config)
+        plan = service.deploy(service.scan_package("pkg"))
+
+        def interrupt():
+            raise OSError("interrupted")
+
+        # 备份并链接 .rc、链接 .other 之后中断
+        plan.add(SymlinkOperation(self.dots / "pkg" / ".other", self.home / ".late"))
+        plan.operations[-1].apply = interrupt
+        with self.assertRaises(OSError):
+            service.execute(plan, dry_run=False)
+        self.assertTrue((self.home / ".rc").is_symlink())
+        self.assertTrue((self.home / ".other").is_symlink())
+        self.assertIsNotNone(Journal.latest(self.config, pending_only=True))
+
+        service.rollback(dry_run=False)
+        self.assertFalse((self.home / ".rc").is_symlink())
+        self.assertEqual((self.home / ".rc").read_text(), "local\n")
+        self.assertFalse(os.path.lexists(self.home / ".other"))
+        self.assertEqual(service.rollback(dry_run=True), None)
+
+    def test_load_ignores_repeated_bare_start(self):
+        target = self.home / ".rc"
+        os.symlink("/elsewhere", target)
+        plan = OperationPlan([RemoveOperation(target)])
+        journal = Journal.create(self.config, plan)
+        journal.begin(0, plan.operations[0])
+        journal.close()
+        with open(journal.path, "a", encoding="utf-8") as f:
+            f.write("S 0\n")
+        self.assertEqual(Journal.load(journal.path).started[0], {"link": "/elsewhere"})
+
+if __name__ == "__main__":
+    unittest.main()
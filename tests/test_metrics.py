@@ -0,0 +1,39 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from core.config import AppConfig
+from core.metrics import METRICS
+from core.service import DotfilesService
+
+class PhaseMetricsTest(unittest.TestCase):
+    """各阶段耗时不重复计入。"""
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        base = Path(self._tmp.name)
+        (base / "dots" / "pkg" / ".config").mkdir(parents=True)
+        (base / "dots" / "pkg" / ".rc").write_text("rc\n")
+        (base / "dots" / "pkg" / ".config" / "app.conf").write_text("app\n")
+        (base / "home").mkdir()
+        self.config = AppConfig(dotfiles_dir=str(base / "dots"), target_root=str(base / "home"),
+                                cache_dir=str(base / "cache"), use_index=False)
+        METRICS.reset()
+        METRICS.enable()
+
+    def tearDown(self):
+        METRICS.enable(False)
+        METRICS.reset()
+        self._tmp.cleanup()
+
+    def test_layout_walk_counted_once(self):
+        layout, _ = DotfilesService(self.config).package_layout()
+        self.assertEqual(len(layout[0][2]), 2)
+        phases = METRICS.phases()
+        self.assertEqual(phases["layout"][0], 1)
+        # 每个目录只计一次 walk
+        self.assertEqual(phases["walk"][0], 2)
+        self.assertLessEqual(phases["walk"][1], phases["layout"][1])
+
+if __name__ == "__main__":
+    unittest.main()
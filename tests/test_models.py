@@ -0,0 +1,49 @@
+import unittest
+from pathlib import Path
+
+from core.models import Dotfile, FileState, Package
+
+class PackageColumnsTest(unittest.TestCase):
+    """包的列式存储与 Dotfile 视图。"""
+
+    def setUp(self):
+        self.root, self.home = Path("/dots/pkg"), Path("/home/u")
+        self.package = Package.from_dirs("pkg", self.root, self.home, [
+            ("", [".rc"], [FileState.LINKED]),
+            (".config/app", ["a.conf", "b.conf"], [FileState.MISSING, FileState.CONFLICT]),
+        ])
+
+    def test_views(self):
+        files = self.package.files
+        self.assertEqual(len(files), 3)
+        self.assertEqual([f.rel_path for f in files], [".rc", ".config/app/a.conf", ".config/app/b.conf"])
+        self.assertEqual(files[-1].source, self.root / ".config/app/b.conf")
+        self.assertEqual(files[-1].target, self.home / ".config/app/b.conf")
+        self.assertEqual([f.state for f in files[1:]], [FileState.MISSING, FileState.CONFLICT])
+        self.assertEqual(self.package.state_counts(),
+                         {FileState.LINKED: 1, FileState.MISSING: 1, FileState.CONFLICT: 1})
+        self.assertEqual(list(self.package.entries())[1], (".config/app/a.conf", FileState.MISSING))
+
+    def test_state_assignment_writes_back(self):
+        view = self.package.files[1]
+        view.state = FileState.LINKED
+        self.assertEqual(self.package.files[1].state, FileState.LINKED)
+        self.assertEqual([f.rel_path for f in self.package.files_in_dirs([".config/app"])],
+                         [".config/app/a.conf", ".config/app/b.conf"])
+
+    def test_dotfiles_compare_with_views(self):
+        built = Package("pkg", self.root, files=[
+            Dotfile(self.root / ".rc", self.home / ".rc", FileState.LINKED),
+            Dotfile(self.root / ".config/app/a.conf", self.home / ".config/app/a.conf", FileState.MISSING),
+            Dotfile(self.root / ".config/app/b.conf", self.home / ".config/app/b.conf", FileState.CONFLICT),
+        ])
+        self.assertEqual(built, self.package)
+        self.assertEqual(built.target_root, self.home)
+
+        # 目标不符合 目标根目录/相对路径 规律的文件保留各自的路径
+        built.files.append(Dotfile(self.root / "x", Path("/elsewhere/x")))
+        self.assertEqual(built.files[-1].target, Path("/elsewhere/x"))
+        self.assertIn(("/elsewhere", ""), list(built.target_dirs()))
+
+if __name__ == "__main__":
+    unittest.main()
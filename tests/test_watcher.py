@@ -0,0 +1,61 @@
+import os
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+from core.cache import ScanCache
+from core.config import AppConfig
+from core.models import FileState
+from core.service import DotfilesService
+from core.watcher import PollingWatcher, WatchDaemon
+
+class WatchDaemonTest(unittest.TestCase):
+    """缓存中的包被重新扫描替换后，目标侧的变化仍应更新到当前缓存。"""
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        base = Path(self._tmp.name)
+        self.dots, self.home = base / "dots", base / "home"
+        (self.dots / "pkg" / ".config" / "app").mkdir(parents=True)
+        (self.dots / "pkg" / ".config" / "app" / "conf").write_text("conf\n")
+        (self.home / ".config" / "app").mkdir(parents=True)
+        self.target = self.home / ".config" / "app" / "conf"
+        os.symlink(self.dots / "pkg" / ".config" / "app" / "conf", self.target)
+        config = AppConfig(dotfiles_dir=str(self.dots), target_root=str(self.home), use_index=False)
+        self.cache = ScanCache(DotfilesService(config))
+        self.daemon = WatchDaemon(self.cache, watcher=PollingWatcher(interval=0.05), debounce=0.05)
+
+    def tearDown(self):
+        self.daemon.stop()
+        self._tmp.cleanup()
+
+    def state(self) -> FileState:
+        return self.cache.get("pkg").files[0].state
+
+    def wait_for(self, state: FileState) -> None:
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline and self.state() != state:
+            time.sleep(0.05)
+        self.assertEqual(self.state(), state)
+
+    def test_target_change_after_refresh(self):
+        self.daemon.start()
+        self.assertEqual(self.state(), FileState.LINKED)
+        # GUI 的刷新按钮：缓存中的包对象被整体替换
+        self.cache.packages(refresh=True)
+        os.unlink(self.target)
+        self.wait_for(FileState.MISSING)
+
+    def test_target_dir_created_later(self):
+        os.unlink(self.target)
+        os.rmdir(self.target.parent)
+        self.daemon.start()
+        self.assertEqual(self.state(), FileState.MISSING)
+        self.target.parent.mkdir()
+        time.sleep(0.3)
+        os.symlink(self.dots / "pkg" / ".config" / "app" / "conf", self.target)
+        self.wait_for(FileState.LINKED)
+
+if __name__ == "__main__":
+    unittest.main()